@@ -1,24 +1,35 @@
 # app.py
-from fastapi import FastAPI, HTTPException, Depends, File, UploadFile, Form, BackgroundTasks, Request, Query
+from fastapi import FastAPI, HTTPException, Depends, File, UploadFile, Form, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.exceptions import RequestValidationError
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional, Tuple
 import os
-import shutil
-import uuid
 import json
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import re
 import logging
 import tempfile
+import asyncio
+import zipfile
+import aiofiles.os
 
-from database import SessionLocal, engine, test_db_connection
+from database import SessionLocal, AsyncSessionLocal, engine, async_engine, get_async_db, test_db_connection
 import models
 import schemas
-from auth import create_access_token, get_password_hash, verify_password, get_current_user
-from ocr_service import process_document, extract_po_data
+from auth import create_access_token, get_password_hash, verify_password, get_current_user, get_current_user_from_header_or_query
+from ocr_service import extract_and_store_po_data, find_completed_ocr_result, find_completed_ocr_results, get_pages_ocr_id
+from ocr_extractors import EXTRACTOR_VERSION
+from audit_log import audit_log_writer
+from po_service import refresh_po_summary
+from normalization import NormalizationError, parse_amount, parse_quantity
+from upload_service import SUPPORTED_EXTENSIONS, UploadRejectedError, save_upload_file, spool_upload_file, save_zip_members
+from ocr_worker import submit_ocr_job, submit_ocr_jobs, start_ocr_pool, shutdown_ocr_pool, get_progress_queue, OCRQueueFullError
+from ocr_progress import progress_broker, make_progress_event, TERMINAL_STATUSES
 import config
 
 # ロギングの設定
@@ -56,19 +67,12 @@ app.add_middleware(
 # アップロードディレクトリの作成
 os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
 
-# 依存関係
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # 認証関連のエンドポイント
 @app.post("/api/auth/login", response_model=schemas.Token)
-def login(user_data: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == user_data.email).first()
-    if not user or not verify_password(user_data.password, user.password_hash):
+async def login(user_data: schemas.UserLogin, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(models.User).where(models.User.email == user_data.email))).scalars().first()
+    # bcryptの検証はCPUを使うため、イベントループの外で行う
+    if not user or not await run_in_threadpool(verify_password, user_data.password, user.password_hash):
         logger.warning(f"ログイン失敗: {user_data.email}")
         raise HTTPException(
             status_code=401,
@@ -82,9 +86,9 @@ def login(user_data: schemas.UserLogin, db: Session = Depends(get_db)):
     return {"token": access_token, "token_type": "bearer"}
 
 @app.post("/api/auth/register", response_model=schemas.User)
-def register_user(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register_user(user_data: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     # メールアドレスの重複チェック
-    db_user = db.query(models.User).filter(models.User.email == user_data.email).first()
+    db_user = (await db.execute(select(models.User).where(models.User.email == user_data.email))).scalars().first()
     if db_user:
         logger.warning(f"ユーザー登録失敗（メールアドレス重複）: {user_data.email}")
         raise HTTPException(
@@ -93,7 +97,7 @@ def register_user(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
         )
     
     # ユーザー作成
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await run_in_threadpool(get_password_hash, user_data.password)
     db_user = models.User(
         name=user_data.name,
         email=user_data.email,
@@ -101,19 +105,81 @@ def register_user(user_data: schemas.UserCreate, db: Session = Depends(get_db)):
         role=user_data.role
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     logger.info(f"ユーザー登録成功: {user_data.email}")
     return db_user
 
 # OCR関連のエンドポイント
+def _new_ocr_result(file_location: str, filename: str, content_hash: str, cached_result=None) -> models.OCRResult:
+    """
+    アップロードされたファイルのOCR結果レコードを作成します。
+    同じ内容の完了済みOCR結果があれば、その結果を引き継いだ完了済みのレコードにします。
+    """
+    if cached_result:
+        processed_data = json.loads(cached_result.processed_data) if cached_result.processed_data else {}
+        processed_data.update({
+            "file_path": file_location,
+            "original_filename": filename,
+            "reused_from": cached_result.ocr_id
+        })
+        return models.OCRResult(
+            status="completed",
+            raw_text=cached_result.raw_text,
+            processed_data=json.dumps(processed_data),
+            ocrresultscol1="default_value",
+            content_hash=content_hash,
+            extracted_data=cached_result.extracted_data,
+            extractor_version=cached_result.extractor_version,
+            page_count=cached_result.page_count,
+            pages_done=cached_result.pages_done,
+            # ページテキストは複製せず、元のOCR結果のものを参照する
+            pages_ocr_id=get_pages_ocr_id(cached_result)
+        )
+    # OCR結果レコード作成 - raw_textに整数値を設定
+    return models.OCRResult(
+        status="processing",
+        raw_text=0,  # 整数値として0を保存
+        processed_data=json.dumps({"file_path": file_location, "original_filename": filename}),
+        ocrresultscol1="default_value",  # ocrresultscol1フィールドを追加
+        content_hash=content_hash
+    )
+
+def _register_upload(db: Session, file_location: str, filename: str, content_hash: str) -> Tuple[int, str, Optional[int]]:
+    """
+    アップロードされたファイルのOCR結果レコードを作成します。
+    ocr_serviceの同期的な関数を使うため、非同期セッションの run_sync で呼び出します。
+
+    :return: (OCR結果のID, 処理状態, 再利用したOCR結果のID)
+    """
+    # 同じ内容のファイルのOCRが完了済みであれば、その結果を再利用する
+    cached_result = find_completed_ocr_result(db, content_hash)
+    ocr_result = _new_ocr_result(file_location, filename, content_hash, cached_result)
+    db.add(ocr_result)
+    db.flush()
+    
+    # コミット後に属性を読むと再読み込みが走るため、返す値はコミット前に取り出しておく
+    result = (ocr_result.ocr_id, ocr_result.status, cached_result.ocr_id if cached_result else None)
+    db.commit()
+    return result
+
+def _mark_upload_failed(db: Session, ocr_ids: List[int], error_message: str):
+    """
+    OCRジョブを投入できなかったOCR結果を失敗状態にします（非同期セッションの run_sync で呼び出す）
+    """
+    for ocr_result in db.query(models.OCRResult).filter(models.OCRResult.ocr_id.in_(ocr_ids)):
+        processed_data = json.loads(ocr_result.processed_data) if ocr_result.processed_data else {}
+        processed_data["error"] = error_message
+        ocr_result.processed_data = json.dumps(processed_data)
+        ocr_result.status = "failed"
+    db.commit()
+
 @app.post("/api/ocr/upload")
 async def upload_document(
     file: UploadFile = File(...),
     local_kw: Optional[str] = Query(None),  # local_kwクエリパラメータを追加
-    background_tasks: BackgroundTasks = BackgroundTasks(),
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     request: Request = None,  # リクエストオブジェクトを追加
 ):
     logger.info(f"Request query params: {request.query_params if request else 'N/A'}")
@@ -122,70 +188,57 @@ async def upload_document(
     try:
         # ファイル拡張子の確認
         file_ext = os.path.splitext(file.filename)[1].lower()
-        if file_ext not in ['.pdf', '.png', '.jpg', '.jpeg']:
+        if file_ext not in SUPPORTED_EXTENSIONS:
             logger.warning(f"サポートされていないファイル形式: {file_ext}")
             return JSONResponse(
                 status_code=400, 
                 content={"message": "サポートされていないファイル形式です。PDF, PNG, JPG, JPEGのみがサポートされています。"}
             )
         
-        # ユニークなファイル名生成
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        file_location = os.path.join(config.UPLOAD_FOLDER, unique_filename)
-        
-        logger.info(f"Saving file to: {file_location}")
-        
-        # ファイルの内容を読み取り
-        file_content = await file.read()
-
-        # ファイルを保存
-        with open(file_location, "wb") as buffer:
-            buffer.write(file_content)
+        # ファイルをチャンク単位で保存しながら形式・サイズの確認と内容のハッシュ計算を行う（同一内容のファイルは1つだけ保存）
+        try:
+            file_location, content_hash = await save_upload_file(file, file_ext)
+        except UploadRejectedError as e:
+            logger.warning(f"アップロードファイルを拒否しました: {file.filename}, {str(e)}")
+            return JSONResponse(status_code=e.status_code, content={"message": str(e)})
+        logger.info(f"Saved file to: {file_location}")
         
-        # OCR結果レコード作成 - raw_textに整数値を設定
-        ocr_result = models.OCRResult(
-            status="processing",
-            raw_text=0,  # 整数値として0を保存
-            processed_data=json.dumps({"file_path": file_location, "original_filename": file.filename}),
-            ocrresultscol1="default_value"  # ocrresultscol1フィールドを追加
+        ocr_id, status, reused_from = await db.run_sync(
+            _register_upload, file_location, file.filename, content_hash
         )
-        db.add(ocr_result)
-        db.commit()
-        db.refresh(ocr_result)
-        
         # ログを記録（ファイルアップロードのアクション）
-        log_entry = models.Log(
-            user_id=current_user.user_id,
-            action="ファイルアップロード",
-            processed_data=json.dumps({"file_name": file.filename, "ocr_id": ocr_result.ocr_id})
-        )
-        db.add(log_entry)
-        db.commit()
+        audit_log_writer.record(current_user.user_id, "ファイルアップロード", {"file_name": file.filename, "ocr_id": ocr_id})
+        logger.info(f"Created OCR result record with ID: {ocr_id}")
         
-        logger.info(f"Created OCR result record with ID: {ocr_result.ocr_id}")
+        if reused_from:
+            logger.info(f"OCR結果を再利用しました: ID={ocr_id}, 元のID={reused_from}")
+            return {
+                "ocrId": str(ocr_id),
+                "status": status
+            }
         
-        # バックグラウンドでOCR処理
-        if background_tasks:
-            background_tasks.add_task(
-                process_document,
-                file_path=file_location,  # ファイルパスは直接関数に渡す
-                ocr_id=ocr_result.ocr_id,
-                db=db
+        # OCRワーカープールでOCR処理（Webワーカーとは別プロセス・別セッションで実行）
+        try:
+            submit_ocr_job(file_location, ocr_id)
+        except OCRQueueFullError as e:
+            logger.warning(f"OCRジョブ受付上限: {str(e)}")
+            await db.run_sync(_mark_upload_failed, [ocr_id], str(e))
+            return JSONResponse(
+                status_code=503,
+                content={"message": "OCR処理が混み合っています。しばらくしてから再度アップロードしてください。"}
             )
-            logger.info(f"Added background task for OCR processing with file: {file_location}")
-        else:
-            # 開発環境用: OCRをスキップして直接完了状態にする
-            logger.info("No background tasks available, setting result to completed")
-            ocr_result.status = "completed"
-            ocr_result.raw_text = 0
-            ocr_result.processed_data = json.dumps({
-                "file_path": file_location,
-                "text_content": "Sample OCR text for development"
-            })
-            db.commit()
+        except Exception as e:
+            # 投入できなかったレコードが処理中のまま残らないよう、失敗として記録する
+            logger.error(f"OCRジョブ投入エラー: ID={ocr_id}, {str(e)}")
+            await db.run_sync(_mark_upload_failed, [ocr_id], f"OCRジョブの投入に失敗しました: {str(e)}")
+            return JSONResponse(
+                status_code=503,
+                content={"message": "OCR処理を開始できませんでした。しばらくしてから再度アップロードしてください。"}
+            )
+        logger.info(f"Submitted OCR job with file: {file_location}")
         
         return {
-            "ocrId": str(ocr_result.ocr_id), 
+            "ocrId": str(ocr_id), 
             "status": "processing"
         }
 
@@ -196,27 +249,308 @@ async def upload_document(
             content={"message": f"ファイルのアップロードに失敗しました: {str(e)}"}
         )
 
+def _register_bulk_uploads(db: Session, saved_files: List[dict]) -> List[Tuple[dict, int, str]]:
+    """
+    一括アップロードされたファイルのOCR結果レコードを1つのトランザクションで作成します。
+    ocr_serviceの同期的な関数を使うため、非同期セッションの run_sync で呼び出します。
+
+    :return: (保存したファイル, OCR結果のID, 処理状態) のリスト
+    """
+    try:
+        # 完了済みの結果を再利用できるファイルは1回のクエリでまとめて調べる
+        cached_results = find_completed_ocr_results(db, [item["content_hash"] for item in saved_files])
+        ocr_results = []
+        for item in saved_files:
+            cached_result = cached_results.get(item["content_hash"])
+            ocr_result = _new_ocr_result(item["file_path"], item["filename"], item["content_hash"], cached_result)
+            db.add(ocr_result)
+            ocr_results.append((item, ocr_result))
+        db.flush()
+        
+        registered = [(item, ocr_result.ocr_id, ocr_result.status) for item, ocr_result in ocr_results]
+        db.commit()
+        return registered
+    except Exception:
+        db.rollback()
+        raise
+
+@app.post("/api/ocr/upload/bulk")
+async def upload_documents_bulk(
+    files: List[UploadFile] = File(...),
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    複数のファイル、またはそれらをまとめたZIPアーカイブを一括でアップロードします。
+    OCR結果レコードは1つのトランザクションで作成し、OCRジョブもまとめて投入します。
+    """
+    logger.info(f"一括アップロード受付: ファイル数={len(files)}")
+    saved_files = []
+    rejected = []
+    
+    try:
+        for file in files:
+            file_ext = os.path.splitext(file.filename or "")[1].lower()
+            if file_ext == ".zip":
+                try:
+                    zip_location = await spool_upload_file(file, file_ext)
+                except UploadRejectedError as e:
+                    rejected.append({"filename": file.filename, "reason": str(e)})
+                    continue
+                try:
+                    # ZIPの展開とハッシュ計算はブロッキング処理のため、イベントループの外で行う
+                    members, skipped = await run_in_threadpool(
+                        save_zip_members, zip_location, config.BULK_UPLOAD_MAX_FILES - len(saved_files)
+                    )
+                except zipfile.BadZipFile:
+                    rejected.append({"filename": file.filename, "reason": "ZIPアーカイブを読み込めません"})
+                    continue
+                finally:
+                    await aiofiles.os.remove(zip_location)
+                saved_files.extend(members)
+                rejected.extend(skipped)
+            elif file_ext in SUPPORTED_EXTENSIONS:
+                if len(saved_files) >= config.BULK_UPLOAD_MAX_FILES:
+                    raise ValueError(f"一度にアップロードできるファイルは{config.BULK_UPLOAD_MAX_FILES}件までです")
+                try:
+                    file_location, content_hash = await save_upload_file(file, file_ext)
+                except UploadRejectedError as e:
+                    rejected.append({"filename": file.filename, "reason": str(e)})
+                    continue
+                saved_files.append({"filename": file.filename, "file_path": file_location, "content_hash": content_hash})
+            else:
+                rejected.append({"filename": file.filename, "reason": "サポートされていないファイル形式です"})
+    except ValueError as e:
+        logger.warning(f"一括アップロード拒否: {str(e)}")
+        return JSONResponse(status_code=400, content={"message": str(e)})
+    except Exception as e:
+        logger.error(f"一括アップロードのファイル保存エラー: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"message": f"ファイルのアップロードに失敗しました: {str(e)}"}
+        )
+    
+    if not saved_files:
+        return JSONResponse(
+            status_code=400,
+            content={"message": "OCRで処理できるファイルがありません。PDF, PNG, JPG, JPEGのみがサポートされています。", "rejected": rejected}
+        )
+    
+    try:
+        registered = await db.run_sync(_register_bulk_uploads, saved_files)
+    except Exception as e:
+        logger.error(f"一括アップロードのレコード作成エラー: {str(e)}")
+        return JSONResponse(
+            status_code=500,
+            content={"message": f"ファイルのアップロードに失敗しました: {str(e)}"}
+        )
+    
+    # ログは一括アップロード1回につき1行だけ記録する
+    audit_log_writer.record(current_user.user_id, "ファイル一括アップロード", {
+        "files": [{"file_name": item["filename"], "ocr_id": ocr_id} for item, ocr_id, _ in registered]
+    })
+    
+    jobs = [(item["file_path"], ocr_id) for item, ocr_id, status in registered if status == "processing"]
+    try:
+        submit_ocr_jobs(jobs)
+    except OCRQueueFullError as e:
+        logger.warning(f"OCRジョブ受付上限: {str(e)}")
+        job_ids = [ocr_id for _, ocr_id in jobs]
+        await db.run_sync(_mark_upload_failed, job_ids, str(e))
+        return JSONResponse(
+            status_code=503,
+            content={
+                "message": "OCR処理が混み合っています。しばらくしてから再度アップロードしてください。",
+                "failedOcrIds": [str(ocr_id) for ocr_id in job_ids]
+            }
+        )
+    except Exception as e:
+        # 投入済みのジョブも取り消されているため、全件を失敗として記録する
+        logger.error(f"OCRジョブ一括投入エラー: {str(e)}")
+        job_ids = [ocr_id for _, ocr_id in jobs]
+        await db.run_sync(_mark_upload_failed, job_ids, f"OCRジョブの投入に失敗しました: {str(e)}")
+        return JSONResponse(
+            status_code=503,
+            content={
+                "message": "OCR処理を開始できませんでした。しばらくしてから再度アップロードしてください。",
+                "failedOcrIds": [str(ocr_id) for ocr_id in job_ids]
+            }
+        )
+    
+    results = [
+        {
+            "ocrId": str(ocr_id),
+            "filename": item["filename"],
+            "status": status
+        }
+        for item, ocr_id, status in registered
+    ]
+    logger.info(f"一括アップロード完了: 登録={len(results)}, OCR投入={len(jobs)}, 対象外={len(rejected)}")
+    return {"results": results, "rejected": rejected}
+
 @app.get("/api/ocr/status/{ocr_id}")
 async def get_ocr_status(
     ocr_id: int,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    ocr_result = db.query(models.OCRResult).filter(models.OCRResult.ocr_id == ocr_id).first()
+    # ステータス確認にはテキストやメタデータは不要なため、必要な列だけを読み込む
+    ocr_result = await _query_ocr_progress(db, ocr_id)
     if not ocr_result:
         logger.warning(f"OCR結果が見つかりません: ID={ocr_id}")
         raise HTTPException(status_code=404, detail="指定されたOCR結果が見つかりません")
     
     logger.info(f"OCRステータス取得: ID={ocr_id}, ステータス={ocr_result.status}")
-    return {"ocrId": ocr_result.ocr_id, "status": ocr_result.status}
+    return make_progress_event(ocr_result.ocr_id, ocr_result.status, ocr_result.pages_done, ocr_result.page_count)
+
+@app.post("/api/ocr/status/batch")
+async def get_ocr_status_batch(
+    request_data: schemas.OCRStatusBatchRequest,
+    current_user: models.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    複数のOCR結果の状態・ページ進捗・抽出結果の準備状況を1回のクエリでまとめて返します
+    """
+    ocr_ids = list(dict.fromkeys(request_data.ocrIds))
+    if len(ocr_ids) > config.OCR_STATUS_BATCH_MAX_IDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"一度に指定できるOCR IDは{config.OCR_STATUS_BATCH_MAX_IDS}件までです"
+        )
+    if not ocr_ids:
+        return {"results": [], "notFound": []}
+    
+    # 抽出結果の本文は読み込まず、保存済みかどうかだけをDB側で判定する
+    extraction_cached = and_(
+        models.OCRResult.extracted_data.isnot(None),
+        models.OCRResult.extractor_version == EXTRACTOR_VERSION
+    )
+    rows = (await db.execute(
+        select(
+            models.OCRResult.ocr_id,
+            models.OCRResult.status,
+            models.OCRResult.pages_done,
+            models.OCRResult.page_count,
+            extraction_cached.label("extraction_cached")
+        ).where(models.OCRResult.ocr_id.in_(ocr_ids))
+    )).all()
+    rows_by_id = {row.ocr_id: row for row in rows}
+    
+    results = []
+    for ocr_id in ocr_ids:
+        row = rows_by_id.get(ocr_id)
+        if row is None:
+            continue
+        result = make_progress_event(row.ocr_id, row.status, row.pages_done, row.page_count)
+        # 完了済みなら抽出結果を取得できる（保存済みでない場合は抽出APIの初回呼び出しで抽出される）
+        result["extractionReady"] = row.status == "completed"
+        result["extractionCached"] = bool(row.extraction_cached)
+        results.append(result)
+    not_found = [ocr_id for ocr_id in ocr_ids if ocr_id not in rows_by_id]
+    
+    logger.info(f"OCRステータス一括取得: 件数={len(ocr_ids)}, 未検出={len(not_found)}")
+    return {"results": results, "notFound": not_found}
+
+async def _query_ocr_progress(db: AsyncSession, ocr_id: int):
+    """
+    OCR結果の状態と進捗の列だけを読み込みます
+    """
+    return (await db.execute(
+        select(
+            models.OCRResult.ocr_id,
+            models.OCRResult.status,
+            models.OCRResult.pages_done,
+            models.OCRResult.page_count
+        ).where(models.OCRResult.ocr_id == ocr_id)
+    )).first()
+
+async def _read_ocr_progress_event(ocr_id: int) -> Optional[dict]:
+    """
+    進捗ストリームの定期確認用に、専用のセッションでOCR結果の状態を読み込みます
+    """
+    async with AsyncSessionLocal() as db:
+        ocr_result = await _query_ocr_progress(db, ocr_id)
+    if not ocr_result:
+        return None
+    return make_progress_event(ocr_result.ocr_id, ocr_result.status, ocr_result.pages_done, ocr_result.page_count)
+
+def _format_sse(event: dict) -> str:
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@app.get("/api/ocr/stream/{ocr_id}")
+async def stream_ocr_status(
+    ocr_id: int,
+    request: Request,
+    current_user: models.User = Depends(get_current_user_from_header_or_query),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    OCRの状態とページ単位の進捗を Server-Sent Events で配信します。
+    ブラウザの EventSource はAuthorizationヘッダーを送れないため、トークンは ?token= でも受け付けます。
+    認証と初期状態の読み込みは接続時の1回だけで、以降はワーカーからの進捗イベントを転送します。
+    別のWebワーカープロセスで受け付けたジョブなどイベントが届かない場合に備え、一定間隔でDBの状態も確認します。
+    """
+    # 初期状態を読む前に購読しておき、その間に届いたイベントを取りこぼさないようにする
+    queue = progress_broker.subscribe(ocr_id)
+    try:
+        ocr_result = await _query_ocr_progress(db, ocr_id)
+    finally:
+        # ストリーム中にDB接続を保持し続けないよう、ここでセッションを閉じる
+        await db.close()
+    if not ocr_result:
+        progress_broker.unsubscribe(ocr_id, queue)
+        logger.warning(f"OCR結果が見つかりません: ID={ocr_id}")
+        raise HTTPException(status_code=404, detail="指定されたOCR結果が見つかりません")
+    
+    initial_event = make_progress_event(ocr_result.ocr_id, ocr_result.status, ocr_result.pages_done, ocr_result.page_count)
+    logger.info(f"OCR進捗ストリーム開始: ID={ocr_id}, ステータス={ocr_result.status}")
+    
+    async def event_stream():
+        try:
+            last_event = initial_event
+            yield _format_sse(initial_event)
+            while last_event["status"] not in TERMINAL_STATUSES:
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=config.OCR_STREAM_FALLBACK_INTERVAL)
+                except asyncio.TimeoutError:
+                    event = await _read_ocr_progress_event(ocr_id)
+                    if event is None:
+                        break
+                    if event == last_event:
+                        # 接続を維持するためのコメント行
+                        yield ": keep-alive\n\n"
+                        continue
+                last_event = event
+                yield _format_sse(event)
+        finally:
+            progress_broker.unsubscribe(ocr_id, queue)
+            logger.info(f"OCR進捗ストリーム終了: ID={ocr_id}")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/api/ocr/extract/{ocr_id}")
 async def extract_order_data(
     ocr_id: int,
+    request: Request,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    ocr_result = db.query(models.OCRResult).filter(models.OCRResult.ocr_id == ocr_id).first()
+    # 抽出はOCR完了時にワーカーで実行済みのため、保存済みの抽出結果を主キーで読むだけにする
+    ocr_result = (await db.execute(
+        select(
+            models.OCRResult.ocr_id,
+            models.OCRResult.status,
+            models.OCRResult.extracted_data,
+            models.OCRResult.extractor_version
+        ).where(models.OCRResult.ocr_id == ocr_id)
+    )).first()
     if not ocr_result:
         logger.warning(f"OCR結果が見つかりません: ID={ocr_id}")
         raise HTTPException(status_code=404, detail="指定されたOCR結果が見つかりません")
@@ -225,20 +559,65 @@ async def extract_order_data(
         logger.warning(f"OCR処理が完了していません: ID={ocr_id}, ステータス={ocr_result.status}")
         raise HTTPException(status_code=400, detail="OCR処理がまだ完了していません")
     
-    # 発注書データの抽出
-    # OCR IDを渡して、extract_po_data関数でテキスト内容を取得
-    extracted_data = extract_po_data(ocr_id)
+    # 完了済みの抽出結果は抽出処理のバージョンが変わらない限り不変のため、ETagで再検証させる
+    # （バージョンを上げたときに古い抽出結果を使い続けないよう、毎回再検証させて304で応答する）
+    etag = f'"ocr-{ocr_id}-v{EXTRACTOR_VERSION}"'
+    cache_headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache"
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=cache_headers)
+    
+    if ocr_result.extracted_data and ocr_result.extractor_version == EXTRACTOR_VERSION:
+        extracted_data = json.loads(ocr_result.extracted_data)
+    else:
+        # 抽出前の結果や古いバージョンで抽出された結果は、ここで一度だけ抽出して保存する
+        logger.info(f"抽出結果を再計算します: ID={ocr_id}, 保存済みバージョン={ocr_result.extractor_version}")
+        extracted_data = await run_in_threadpool(_extract_and_store, ocr_id)
     
     logger.info(f"OCRデータ抽出: ID={ocr_id}")
-    return {"ocrId": ocr_result.ocr_id, "data": extracted_data}
+    return JSONResponse(
+        content={"ocrId": ocr_result.ocr_id, "data": extracted_data},
+        headers=cache_headers
+    )
+
+def _extract_and_store(ocr_id: int) -> dict:
+    """
+    抽出処理はCPUを使う同期処理のため、スレッドプール上で専用の同期セッションを使って実行します
+    """
+    db = SessionLocal()
+    try:
+        return extract_and_store_po_data(db, ocr_id)
+    finally:
+        db.close()
 
 # PO関連のエンドポイント
 @app.post("/api/po/register")
 async def register_po(
     po_data: schemas.POCreate,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    # 数量・単価・金額の文字列（"1,000" や "US$12.50" など）は登録時に一度だけ数値に正規化する
+    try:
+        total_amount = parse_amount(po_data.totalAmount, "totalAmount")
+        products = [
+            (
+                product,
+                parse_quantity(product.quantity, f"products[{index}].quantity"),
+                parse_amount(product.unitPrice, f"products[{index}].unitPrice"),
+                parse_amount(product.amount, f"products[{index}].amount")
+            )
+            for index, product in enumerate(po_data.products)
+        ]
+    except NormalizationError as e:
+        logger.warning(f"PO登録失敗（数値の形式エラー）: PO番号={po_data.poNumber}, {str(e)}")
+        raise HTTPException(
+            status_code=422,
+            detail={"message": f"数値の形式が正しくありません: {str(e)}", "field": e.field, "value": str(e.value)}
+        )
+    
     try:
         # POの作成
         po = models.PurchaseOrder(
@@ -246,37 +625,34 @@ async def register_po(
             customer_name=po_data.customer,
             po_number=po_data.poNumber,
             currency=po_data.currency,
-            total_amount=po_data.totalAmount,
+            total_amount=total_amount,
             payment_terms=po_data.paymentTerms,
             shipping_terms=po_data.terms,
             destination=po_data.destination,
             status="手配前"  # デフォルトステータス
         )
         db.add(po)
-        db.commit()
-        db.refresh(po)
+        # po_idを採番するためにINSERTだけ先に発行し、POと製品と集計データは1回のコミットで登録する
+        await db.flush()
         
         # 製品の登録
-        for product in po_data.products:
+        for product, quantity, unit_price, subtotal in products:
             order_item = models.OrderItem(
                 po_id=po.po_id,  # po_idに変更
                 product_name=product.name,  # フィールド名を修正
-                quantity=product.quantity,
-                unit_price=product.unitPrice,  # フィールド名を修正
-                subtotal=product.amount  # フィールド名を修正
+                quantity=quantity,
+                unit_price=unit_price,  # フィールド名を修正
+                subtotal=subtotal  # フィールド名を修正
             )
             db.add(order_item)
         
-        db.commit()
+        # 一覧用の集計データも同じトランザクションで作成する
+        await refresh_po_summary(db, po.po_id)
+        
+        await db.commit()
         
         # PO登録のログ記録
-        log_entry = models.Log(
-            user_id=current_user.user_id,
-            action="PO登録",
-            processed_data=json.dumps({"po_id": po.po_id, "po_number": po_data.poNumber, "customer": po_data.customer})
-        )
-        db.add(log_entry)
-        db.commit()
+        audit_log_writer.record(current_user.user_id, "PO登録", {"po_id": po.po_id, "po_number": po_data.poNumber, "customer": po_data.customer})
         
         logger.info(f"PO登録完了: ID={po.po_id}, PO番号={po_data.poNumber}, 顧客={po_data.customer}")
         return {"success": True, "poId": po.po_id}
@@ -285,42 +661,133 @@ async def register_po(
         logger.error(f"PO登録エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=f"POの登録に失敗しました: {str(e)}")
 
+# PO一覧の並び替えキーと対応する列
+PO_LIST_SORT_COLUMNS = {
+    "id": models.PurchaseOrder.po_id,
+    "createdAt": models.PurchaseOrder.created_at,
+    "status": models.PurchaseOrder.status,
+    "customer": models.PurchaseOrder.customer_name,
+    "poNumber": models.PurchaseOrder.po_number,
+    "acquisitionDate": models.Input.po_acquisition_date,
+    "etd": models.ShippingSchedule.etd,
+    "eta": models.ShippingSchedule.eta,
+}
+
+def _escape_like(value: str) -> str:
+    """
+    LIKEの前方一致検索用に、ワイルドカード文字をエスケープします
+    """
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _po_list_conditions(
+    status: Optional[List[str]],
+    customer: Optional[str],
+    po_number: Optional[str],
+    acquisition_from: Optional[date],
+    acquisition_to: Optional[date],
+    etd_from: Optional[date],
+    etd_to: Optional[date],
+    eta_from: Optional[date],
+    eta_to: Optional[date]
+) -> Tuple[list, bool, bool]:
+    """
+    PO一覧の絞り込み条件を作成します
+
+    :return: (WHERE句の条件のリスト, Inputとの結合が必要か, ShippingSchedulesとの結合が必要か)
+    """
+    conditions = []
+    if status:
+        conditions.append(models.PurchaseOrder.status.in_(status))
+    if customer:
+        conditions.append(models.PurchaseOrder.customer_name.like(f"{_escape_like(customer)}%", escape="\\"))
+    if po_number:
+        conditions.append(models.PurchaseOrder.po_number.like(f"{_escape_like(po_number)}%", escape="\\"))
+    
+    input_conditions = []
+    if acquisition_from:
+        input_conditions.append(models.Input.po_acquisition_date >= acquisition_from)
+    if acquisition_to:
+        input_conditions.append(models.Input.po_acquisition_date <= acquisition_to)
+    
+    shipping_conditions = []
+    if etd_from:
+        shipping_conditions.append(models.ShippingSchedule.etd >= etd_from)
+    if etd_to:
+        shipping_conditions.append(models.ShippingSchedule.etd <= etd_to)
+    if eta_from:
+        shipping_conditions.append(models.ShippingSchedule.eta >= eta_from)
+    if eta_to:
+        shipping_conditions.append(models.ShippingSchedule.eta <= eta_to)
+    
+    return conditions + input_conditions + shipping_conditions, bool(input_conditions), bool(shipping_conditions)
+
 # POの一覧取得
 @app.get("/api/po/list")
 async def get_po_list(
+    limit: int = Query(config.PO_LIST_DEFAULT_LIMIT, ge=1, le=config.PO_LIST_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    status: Optional[List[str]] = Query(None),
+    customer: Optional[str] = Query(None, max_length=255),
+    po_number: Optional[str] = Query(None, alias="poNumber", max_length=50),
+    acquisition_from: Optional[date] = Query(None, alias="acquisitionFrom"),
+    acquisition_to: Optional[date] = Query(None, alias="acquisitionTo"),
+    etd_from: Optional[date] = Query(None, alias="etdFrom"),
+    etd_to: Optional[date] = Query(None, alias="etdTo"),
+    eta_from: Optional[date] = Query(None, alias="etaFrom"),
+    eta_to: Optional[date] = Query(None, alias="etaTo"),
+    sort: str = Query("id", pattern="^(" + "|".join(PO_LIST_SORT_COLUMNS) + ")$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    """
+    POの一覧をページ単位で取得します。
+    ステータス（複数指定可）・顧客名とPO番号の前方一致・受領日/ETD/ETAの期間で絞り込み、指定したキーで並び替えます。
+    製品名・数量の合計などは書き込み時に更新される集計データ（POSummaries）から読み、入力情報・出荷情報は
+    selectinload でページ内のPOの分をまとめて読み込むため、クエリ数はPOの件数によらず一定です。
+    """
     try:
-        # POの一覧取得
-        po_list = db.query(models.PurchaseOrder).all()
+        conditions, join_input, join_shipping = _po_list_conditions(
+            status, customer, po_number, acquisition_from, acquisition_to, etd_from, etd_to, eta_from, eta_to
+        )
+        sort_column = PO_LIST_SORT_COLUMNS[sort]
+        # 絞り込みに使う場合は内部結合、並び替えだけに使う場合は情報のないPOも残すため外部結合にする
+        sort_by_input = sort_column.class_ is models.Input
+        sort_by_shipping = sort_column.class_ is models.ShippingSchedule
+        
+        def apply_joins(stmt, for_count: bool):
+            if join_input:
+                stmt = stmt.join(models.Input, models.Input.po_id == models.PurchaseOrder.po_id)
+            elif sort_by_input and not for_count:
+                stmt = stmt.outerjoin(models.Input, models.Input.po_id == models.PurchaseOrder.po_id)
+            if join_shipping:
+                stmt = stmt.join(models.ShippingSchedule, models.ShippingSchedule.po_id == models.PurchaseOrder.po_id)
+            elif sort_by_shipping and not for_count:
+                stmt = stmt.outerjoin(models.ShippingSchedule, models.ShippingSchedule.po_id == models.PurchaseOrder.po_id)
+            return stmt.where(*conditions)
+        
+        total = await db.scalar(apply_joins(select(func.count()).select_from(models.PurchaseOrder), for_count=True))
+        
+        # POの一覧取得（並び順が同じ値のPOはIDで順序を固定する）
+        sort_key = sort_column.desc() if order == "desc" else sort_column.asc()
+        # 製品名・数量の合計などは書き込み時に集計済みのPOSummariesから読む（製品の行は読み込まない）
+        rows = (await db.execute(
+            apply_joins(select(models.PurchaseOrder, models.POSummary), for_count=False)
+            .outerjoin(models.POSummary, models.POSummary.po_id == models.PurchaseOrder.po_id)
+            .options(
+                selectinload(models.PurchaseOrder.input_info),
+                selectinload(models.PurchaseOrder.shipping_schedule)
+            )
+            .order_by(sort_key, models.PurchaseOrder.po_id)
+            .limit(limit)
+            .offset(offset)
+        )).all()
         
         result = []
-        for po in po_list:
-            # 製品情報の取得
-            items = db.query(models.OrderItem).filter(models.OrderItem.po_id == po.po_id).all()
-            
-            # 追加情報の取得
-            input_info = db.query(models.Input).filter(models.Input.po_id == po.po_id).first()
-            shipping_info = db.query(models.ShippingSchedule).filter(models.ShippingSchedule.po_id == po.po_id).first()
-            
-            # 製品名の結合
-            product_names = ", ".join([item.product_name for item in items])
-            
-            # 数量の計算（エラー処理を追加）
-            total_quantity = 0
-            if items:
-                for item in items:
-                    try:
-                        # カンマを除去して数値に変換
-                        quantity_str = item.quantity or "0"
-                        if isinstance(quantity_str, str):
-                            quantity_str = quantity_str.replace(',', '')
-                        quantity_value = float(quantity_str)
-                        total_quantity += quantity_value
-                    except (ValueError, TypeError):
-                        # 変換できない場合は0として扱う
-                        logger.warning(f"数量変換エラー: '{item.quantity}'を数値に変換できません。ID={po.po_id}")
+        for po, summary in rows:
+            # 追加情報（読み込み済み）
+            input_info = po.input_info
+            shipping_info = po.shipping_schedule
             
             # 結果の作成
             po_info = {
@@ -328,17 +795,17 @@ async def get_po_list(
                 "status": po.status,
                 "acquisitionDate": input_info.po_acquisition_date if input_info else None,
                 "organization": input_info.organization if input_info else None,
-                "invoice": "完了" if input_info and input_info.invoice_number else "",
-                "payment": "完了" if input_info and input_info.payment_status == "completed" else "",
-                "booking": "完了" if shipping_info else "",
+                "invoice": "完了" if summary and summary.has_invoice else "",
+                "payment": "完了" if summary and summary.payment_completed else "",
+                "booking": "完了" if summary and summary.has_booking else "",
                 "manager": current_user.name,
                 "invoiceNumber": input_info.invoice_number if input_info else None,
                 "poNumber": po.po_number,
                 "customer": po.customer_name,
-                "productName": product_names,
-                "quantity": total_quantity,  
+                "productName": summary.product_names if summary else "",
+                "quantity": summary.total_quantity if summary else 0,  
                 "currency": po.currency,
-                "unitPrice": items[0].unit_price if items else None,
+                "unitPrice": summary.first_unit_price if summary else None,
                 "amount": po.total_amount,
                 "paymentTerms": po.payment_terms,
                 "terms": po.shipping_terms,
@@ -356,17 +823,11 @@ async def get_po_list(
             
             result.append(po_info)
         
-        # PO一覧取得のログ記録
-        log_entry = models.Log(
-            user_id=current_user.user_id,
-            action="PO一覧取得",
-            processed_data=json.dumps({"count": len(result)})
-        )
-        db.add(log_entry)
-        db.commit()
+        # PO一覧取得のログ記録（書き込みは audit_log_writer がまとめて行う）
+        audit_log_writer.record(current_user.user_id, "PO一覧取得", {"count": len(result), "offset": offset})
         
-        logger.info(f"PO一覧取得: {len(result)}件")
-        return {"success": True, "po_list": result}
+        logger.info(f"PO一覧取得: {len(result)}件（全{total}件, offset={offset}）")
+        return {"success": True, "po_list": result, "total": total, "limit": limit, "offset": offset}
     
     except Exception as e:
         logger.error(f"PO一覧取得エラー: {str(e)}")
@@ -377,20 +838,20 @@ async def get_po_list(
 async def get_po_products(
     po_id: int,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     特定のPOに関連する製品情報を取得する
     """
     try:
         # POの存在確認
-        po = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.po_id == po_id).first()
+        po = await db.get(models.PurchaseOrder, po_id)
         if not po:
             logger.warning(f"製品情報取得失敗（存在しないPO）: ID={po_id}")
             raise HTTPException(status_code=404, detail="指定されたPOが見つかりません")
         
         # 製品情報を取得
-        products = db.query(models.OrderItem).filter(models.OrderItem.po_id == po_id).all()
+        products = (await db.execute(select(models.OrderItem).where(models.OrderItem.po_id == po_id))).scalars().all()
         
         # 結果の整形
         result = []
@@ -405,14 +866,8 @@ async def get_po_products(
             }
             result.append(product_info)
         
-        # 製品情報取得のログ記録
-        log_entry = models.Log(
-            user_id=current_user.user_id,
-            action="製品情報取得",
-            processed_data=json.dumps({"po_id": po_id, "product_count": len(result)})
-        )
-        db.add(log_entry)
-        db.commit()
+        # 製品情報取得のログ記録（書き込みは audit_log_writer がまとめて行う）
+        audit_log_writer.record(current_user.user_id, "製品情報取得", {"po_id": po_id, "product_count": len(result)})
         
         logger.info(f"PO製品情報取得: PO ID={po_id}, 製品数={len(result)}")
         return {"success": True, "products": result}
@@ -428,10 +883,10 @@ async def update_po_status(
     po_id: int,
     status_data: schemas.StatusUpdate,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # POの取得
-    po = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.po_id == po_id).first()
+    po = await db.get(models.PurchaseOrder, po_id)
     if not po:
         logger.warning(f"PO更新失敗（存在しないPO）: ID={po_id}")
         raise HTTPException(status_code=404, detail="指定されたPOが見つかりません")
@@ -449,16 +904,11 @@ async def update_po_status(
     
     old_status = po.status
     po.status = status_data.status
-    db.commit()
+    
+    await db.commit()
     
     # ステータス更新のログ記録
-    log_entry = models.Log(
-        user_id=current_user.user_id,
-        action="POステータス更新",
-        processed_data=json.dumps({"po_id": po_id, "old_status": old_status, "new_status": status_data.status})
-    )
-    db.add(log_entry)
-    db.commit()
+    audit_log_writer.record(current_user.user_id, "POステータス更新", {"po_id": po_id, "old_status": old_status, "new_status": status_data.status})
     
     logger.info(f"POステータス更新: ID={po_id}, 旧ステータス={old_status}, 新ステータス={status_data.status}")
     return {"success": True, "status": po.status}
@@ -468,20 +918,20 @@ async def update_po_memo(
     po_id: int,
     memo_data: dict,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     POのメモを更新するエンドポイント
     """
     try:
         # POの取得
-        po = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.po_id == po_id).first()
+        po = await db.get(models.PurchaseOrder, po_id)
         if not po:
             logger.warning(f"POメモ更新失敗（存在しないPO）: ID={po_id}")
             raise HTTPException(status_code=404, detail="指定されたPOが見つかりません")
         
         # Input情報の取得または作成
-        input_info = db.query(models.Input).filter(models.Input.po_id == po_id).first()
+        input_info = (await db.execute(select(models.Input).where(models.Input.po_id == po_id))).scalars().first()
         if not input_info:
             # 入力情報がない場合は新規作成
             today_date = datetime.now().strftime("%Y-%m-%d")
@@ -496,26 +946,24 @@ async def update_po_memo(
                 booking_number="　"   # Noneの文字列を設定
             )
             db.add(input_info)
+            # 一覧の請求書・入金の表示が変わるため、集計データも同じトランザクションで更新する
+            await refresh_po_summary(db, po_id)
         else:
             # 既存の入力情報を更新
             input_info.memo = memo_data.get("memo", "")
         
-        db.commit()
+        await db.commit()
         
         # メモ更新のログ記録
-        log_entry = models.Log(
-            user_id=current_user.user_id,
-            action="POメモ更新",
-            processed_data=json.dumps({"po_id": po_id, "memo": memo_data.get("memo", "")})
-        )
-        db.add(log_entry)
-        db.commit()
+        audit_log_writer.record(current_user.user_id, "POメモ更新", {"po_id": po_id, "memo": memo_data.get("memo", "")})
         
         logger.info(f"POメモ更新: ID={po_id}")
         return {"success": True, "memo": input_info.memo}
     
+    except HTTPException:
+        raise  # HTTPExceptionはそのまま再送出
     except Exception as e:
-        db.rollback()  # エラーが発生した場合はロールバック
+        await db.rollback()  # エラーが発生した場合はロールバック
         logger.error(f"POメモ更新エラー: {str(e)}")
         raise HTTPException(status_code=500, detail=f"メモの更新に失敗しました: {str(e)}")
 
@@ -524,16 +972,16 @@ async def add_shipping_info(
     po_id: int,
     shipping_data: dict,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # POの取得
-    po = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.po_id == po_id).first()
+    po = await db.get(models.PurchaseOrder, po_id)
     if not po:
         logger.warning(f"出荷情報追加失敗（存在しないPO）: ID={po_id}")
         raise HTTPException(status_code=404, detail="指定されたPOが見つかりません")
     
     # すでに出荷情報がある場合は上書き
-    shipping_info = db.query(models.ShippingSchedule).filter(models.ShippingSchedule.po_id == po_id).first()
+    shipping_info = (await db.execute(select(models.ShippingSchedule).where(models.ShippingSchedule.po_id == po_id))).scalars().first()
     
     if not shipping_info:
         # 新規作成
@@ -566,16 +1014,13 @@ async def add_shipping_info(
     if shipping_info.booking_number and po.status == "手配中":
         po.status = "手配済"
     
-    db.commit()
+    # 一覧用の集計データ（ブッキングの表示）も同じトランザクションで更新する
+    await refresh_po_summary(db, po_id)
+    
+    await db.commit()
     
     # 出荷情報更新のログ記録
-    log_entry = models.Log(
-        user_id=current_user.user_id,
-        action="出荷情報更新",
-        processed_data=json.dumps({"po_id": po_id, "booking_number": shipping_info.booking_number})
-    )
-    db.add(log_entry)
-    db.commit()
+    audit_log_writer.record(current_user.user_id, "出荷情報更新", {"po_id": po_id, "booking_number": shipping_info.booking_number})
     
     logger.info(f"出荷情報追加/更新: PO ID={po_id}")
     return {"success": True, "shippingId": shipping_info.id}
@@ -631,31 +1076,42 @@ async def startup_event():
     os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
     os.makedirs(config.OCR_TEMP_FOLDER, exist_ok=True)
     
+    # 操作ログの書き込みタスクを起動
+    audit_log_writer.start()
+    
+    # OCRワーカープールと、ワーカーからの進捗イベントの受信スレッドを起動
+    start_ocr_pool()
+    progress_broker.start(asyncio.get_running_loop(), get_progress_queue())
+    
     # 初期データ投入（開発環境のみ）
     if config.DEV_MODE:
-        db = SessionLocal()
-        try:
-            # 開発用ユーザーが存在しない場合は作成
-            dev_user = db.query(models.User).filter(models.User.email == "dev@example.com").first()
-            if not dev_user:
-                logger.info("開発用ユーザーを作成します")
-                hashed_password = get_password_hash("devpass")
-                dev_user = models.User(
-                    name="開発ユーザー",
-                    email="dev@example.com",
-                    password_hash=hashed_password,
-                    role="admin"
-                )
-                db.add(dev_user)
-                db.commit()
-        except Exception as e:
-            logger.error(f"初期データ投入エラー: {e}")
-        finally:
-            db.close()
+        async with AsyncSessionLocal() as db:
+            try:
+                # 開発用ユーザーが存在しない場合は作成
+                dev_user = (await db.execute(select(models.User).where(models.User.email == "dev@example.com"))).scalars().first()
+                if not dev_user:
+                    logger.info("開発用ユーザーを作成します")
+                    hashed_password = get_password_hash("devpass")
+                    dev_user = models.User(
+                        name="開発ユーザー",
+                        email="dev@example.com",
+                        password_hash=hashed_password,
+                        role="admin"
+                    )
+                    db.add(dev_user)
+                    await db.commit()
+            except Exception as e:
+                logger.error(f"初期データ投入エラー: {e}")
 
 # シャットダウン時の処理
 @app.on_event("shutdown")
 async def shutdown_event():
+    # OCRジョブの完了待ちが猶予時間を超えてプロセスが強制終了されても失われないよう、先に操作ログを書き込む
+    await audit_log_writer.stop()
+    # 実行中のOCRジョブの完了を待ってからプールを停止（待つ間イベントループを止めないようスレッドで実行）
+    await run_in_threadpool(shutdown_ocr_pool)
+    progress_broker.stop()
+    await async_engine.dispose()
     logger.info("アプリケーション終了")
 
 # データベースからの削除機能
@@ -663,7 +1119,7 @@ async def shutdown_event():
 async def delete_purchase_orders(
     data: dict,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     選択されたPOを削除する
@@ -679,25 +1135,31 @@ async def delete_purchase_orders(
                 detail="削除するPOが指定されていません"
             )
         
-        # 各POを削除
+        # 削除対象のPOと関連データを1回のINクエリ（と関連データごとの1回ずつ）でまとめて読み込む
+        po_list = (await db.execute(
+            select(models.PurchaseOrder)
+            .where(models.PurchaseOrder.po_id.in_(ids))
+            .options(
+                selectinload(models.PurchaseOrder.items),
+                selectinload(models.PurchaseOrder.input_info),
+                selectinload(models.PurchaseOrder.shipping_schedule),
+                selectinload(models.PurchaseOrder.summary)
+            )
+        )).scalars().all()
+        
+        # 各POを削除（製品・入力情報・出荷情報・集計データもカスケードで削除される）
         deleted_count = 0
-        for po_id in ids:
-            po = db.query(models.PurchaseOrder).filter(models.PurchaseOrder.po_id == po_id).first()
-            if po:
-                db.delete(po)
-                deleted_count += 1
-                logger.info(f"PO削除: ID={po_id}")
-                
-                # 削除操作のログ記録
-                log_entry = models.Log(
-                    user_id=current_user.user_id,
-                    action="PO削除",
-                    processed_data=json.dumps({"po_id": po_id})
-                )
-                db.add(log_entry)
+        for po in po_list:
+            await db.delete(po)
+            deleted_count += 1
+            logger.info(f"PO削除: ID={po.po_id}")
         
         # 変更をコミット
-        db.commit()
+        await db.commit()
+        
+        # 削除操作のログ記録
+        for po in po_list:
+            audit_log_writer.record(current_user.user_id, "PO削除", {"po_id": po.po_id})
         
         logger.info(f"合計{deleted_count}件のPOを削除しました")
         return {
@@ -705,8 +1167,10 @@ async def delete_purchase_orders(
             "detail": f"{deleted_count}件のPOを削除しました"
         }
     
+    except HTTPException:
+        raise  # HTTPExceptionはそのまま再送出
     except Exception as e:
-        db.rollback()  # エラーが発生した場合はロールバック
+        await db.rollback()  # エラーが発生した場合はロールバック
         logger.error(f"PO削除エラー: {str(e)}")
         raise HTTPException(
             status_code=500,
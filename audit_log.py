@@ -0,0 +1,121 @@
+# audit_log.py - 操作ログ（Logs）のバッファリング書き込み
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+import config
+import models
+from database import AsyncSessionLocal
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+class AuditLogWriter:
+    """
+    操作ログをプロセス内にためておき、件数または経過時間のしきい値でまとめてINSERTします。
+    エンドポイントは record() でバッファに追加するだけで、ログのためのコミットを待ちません。
+    停止時（アプリケーションのシャットダウン時）には残りをすべて書き込みます。
+    """
+
+    def __init__(self, session_factory, batch_size: int, flush_interval: float, max_buffer: int):
+        """
+        :param session_factory: 非同期セッションを作成する関数
+        :param batch_size: この件数たまったらすぐに書き込む
+        :param flush_interval: 件数に達しなくても書き込む間隔（秒）
+        :param max_buffer: 書き込みに失敗し続けた場合にためておく件数の上限
+        """
+        self._session_factory = session_factory
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._max_buffer = max_buffer
+        self._buffer: List[Dict[str, Any]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+
+    def record(self, user_id: Optional[int], action: str, data: Optional[Dict[str, Any]] = None):
+        """
+        操作ログをバッファに追加します（イベントループ上で呼び出す）
+
+        :param user_id: 操作したユーザーのID
+        :param action: 操作の種類
+        :param data: 操作の内容（JSONとして保存する）
+        """
+        self._buffer.append({
+            "user_id": user_id,
+            "action": action,
+            "processed_data": json.dumps(data) if data is not None else None
+        })
+        if len(self._buffer) >= self._batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self):
+        """
+        定期的に書き込むタスクを起動します
+        """
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info("操作ログの書き込みタスク起動")
+
+    async def stop(self):
+        """
+        書き込みタスクを停止し、バッファに残っている操作ログをすべて書き込みます
+        """
+        task, self._task = self._task, None
+        if task is not None:
+            # 書き込み中にキャンセルすると取り出した分が失われるため、キャンセルせずにループを抜けさせる
+            self._stopping = True
+            self._wakeup.set()
+            await task
+        await self.flush()
+        logger.info("操作ログの書き込みタスク停止")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """
+        バッファの操作ログを1回のINSERTでまとめて書き込みます。
+        失敗した場合はバッファに戻し、次回の書き込みで再試行します。
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            rows, self._buffer = self._buffer, []
+            try:
+                async with self._session_factory() as db:
+                    await db.execute(insert(models.Log), rows)
+                    await db.commit()
+                logger.debug(f"操作ログ書き込み: {len(rows)}件")
+            except Exception as e:
+                logger.error(f"操作ログの書き込みエラー（{len(rows)}件を再試行します）: {str(e)}")
+                self._buffer = rows + self._buffer
+                overflow = len(self._buffer) - self._max_buffer
+                if overflow > 0:
+                    # メモリを使い続けないよう古いものから捨てる（内容はアプリケーションログに残す）
+                    dropped, self._buffer = self._buffer[:overflow], self._buffer[overflow:]
+                    logger.error(f"操作ログを{overflow}件破棄しました: {json.dumps(dropped, ensure_ascii=False)}")
+
+# アプリケーションで共有する書き込み処理
+audit_log_writer = AuditLogWriter(
+    AsyncSessionLocal,
+    batch_size=config.AUDIT_LOG_BATCH_SIZE,
+    flush_interval=config.AUDIT_LOG_FLUSH_INTERVAL,
+    max_buffer=config.AUDIT_LOG_MAX_BUFFER
+)
@@ -3,12 +3,14 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 import logging
 
-from database import get_db
+from database import get_async_db
 import models
 import config
 
@@ -20,6 +22,8 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # トークン認証の設定
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login")
+# Authorizationヘッダーがなくてもエラーにしない設定（クエリパラメータのトークンも受け付けるエンドポイント用）
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/auth/login", auto_error=False)
 
 # パスワードのハッシュ化
 def get_password_hash(password: str) -> str:
@@ -38,9 +42,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 # 開発環境用のユーザー取得
-def get_dev_user(db: Session):
+async def get_dev_user(db: AsyncSession):
     # データベースから最初のユーザーを取得
-    dev_user = db.query(models.User).first()
+    dev_user = (await db.execute(select(models.User).limit(1))).scalars().first()
     
     # ユーザーが存在しない場合は新規作成
     if not dev_user:
@@ -48,21 +52,21 @@ def get_dev_user(db: Session):
         dev_user = models.User(
             name="開発ユーザー",
             email="dev@example.com",
-            password_hash=get_password_hash("devpass"),
+            password_hash=await run_in_threadpool(get_password_hash, "devpass"),
             role="admin"
         )
         db.add(dev_user)
-        db.commit()
-        db.refresh(dev_user)
+        await db.commit()
+        await db.refresh(dev_user)
     
     return dev_user
 
 # 現在のユーザーを取得
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     # 開発環境モードの場合は認証をバイパス
     if config.DEV_MODE:
         logger.debug("開発モード: 認証をバイパスします")
-        return get_dev_user(db)
+        return await get_dev_user(db)
     
     # 本番環境の通常の認証ロジック
     credentials_exception = HTTPException(
@@ -86,9 +90,28 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         logger.error(f"JWT検証エラー: {e}")
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = (await db.execute(select(models.User).where(models.User.email == email))).scalars().first()
     if user is None:
         logger.warning(f"指定されたメールアドレスのユーザーが見つかりません: {email}")
         raise credentials_exception
     
-    return user
\ No newline at end of file
+    return user
+
+# 現在のユーザーを取得（Authorizationヘッダーまたはクエリパラメータのトークン）
+async def get_current_user_from_header_or_query(
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+    token: Optional[str] = Query(None, description="Authorizationヘッダーを送れないクライアント（EventSource）用のトークン"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    ブラウザの EventSource はヘッダーを付けられないため、SSEのエンドポイントでは ?token= でも認証できるようにします。
+    ヘッダーのトークンがあればそちらを優先します。
+    """
+    token = header_token or token
+    if not token and not config.DEV_MODE:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="認証情報が無効です",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return await get_current_user(token, db)
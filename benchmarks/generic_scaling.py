@@ -0,0 +1,85 @@
+# benchmarks/generic_scaling.py - 汎用抽出の処理時間がテキスト長に比例することを確認する回帰ベンチマーク
+import os
+import sys
+import time
+import random
+import argparse
+import logging
+import statistics
+from typing import List, Tuple
+
+# リポジトリ直下のモジュールをインポートできるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr_extractors import extract_generic_data
+
+logger = logging.getLogger("generic_scaling")
+
+def make_synthetic_text(pages: int, seed: int = 0) -> str:
+    """
+    複数ページのOCR結果を模した、数字の多い合成テキストを作成します。
+    製品見出しや "Total" の後ろに数量（kg/mt）が現れないため、旧実装ではバックトラックが最も多くなる入力です。
+
+    :param pages: ページ数
+    :param seed: 乱数シード
+    :return: 合成テキスト
+    """
+    rng = random.Random(seed)
+    parts = []
+    for page in range(1, pages + 1):
+        parts.append(f"\n--- Page {page} ---\n")
+        parts.append(f"Product {chr(65 + page % 26)} lot {rng.randint(1, 99999)} ")
+        parts.append(" ".join(str(rng.randint(0, 10**6)) for _ in range(60)) + "\n")
+        parts.append("Total " + " ".join(f"{rng.randint(0, 9999)},{rng.randint(100, 999)}.{rng.randint(10, 99)}" for _ in range(40)) + "\n")
+        parts.append(f"Grade X{page} " + "1234567890" * 30 + "\n")
+        parts.append("Remarks: " + " ".join(rng.choice(["USD", "lot", "no.", "item", "price", "12.5", "3,400"]) for _ in range(80)) + "\n")
+    return "".join(parts)
+
+def measure(pages_list: List[int], repeat: int) -> List[Tuple[int, int, float]]:
+    """
+    ページ数ごとに汎用抽出の処理時間（中央値）を測定します
+
+    :return: (ページ数, 文字数, 秒) のリスト
+    """
+    results = []
+    for pages in pages_list:
+        text = make_synthetic_text(pages)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            extract_generic_data(text)
+            timings.append(time.perf_counter() - start)
+        results.append((pages, len(text), statistics.median(timings)))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="汎用抽出の処理時間がテキスト長に比例するか確認します")
+    parser.add_argument("--pages", default="5,10,20,40,80,160", help="測定するページ数（カンマ区切り）")
+    parser.add_argument("--repeat", type=int, default=3, help="各サイズの測定回数")
+    parser.add_argument("--max-ratio", type=float, default=2.0,
+                        help="最大サイズと最小サイズの1文字あたり処理時間の比の上限（これを超えたら失敗）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # 抽出処理自体のログは測定の妨げになるため抑制する
+    logging.getLogger("ocr_extractors").setLevel(logging.WARNING)
+
+    pages_list = sorted(int(p) for p in args.pages.split(",") if p.strip())
+    results = measure(pages_list, args.repeat)
+
+    logger.info(f"{'pages':>6} {'chars':>10} {'ms':>10} {'us/KB':>10}")
+    for pages, chars, seconds in results:
+        logger.info(f"{pages:>6} {chars:>10} {seconds * 1000:>10.1f} {seconds * 1e6 / (chars / 1024):>10.1f}")
+
+    # 線形であれば1文字あたりの処理時間はサイズによらずほぼ一定になる
+    _, smallest_chars, smallest_seconds = results[0]
+    _, largest_chars, largest_seconds = results[-1]
+    ratio = (largest_seconds / largest_chars) / (smallest_seconds / smallest_chars)
+    logger.info(f"1文字あたり処理時間の比（最大/最小）: {ratio:.2f}（上限 {args.max_ratio:.2f}）")
+
+    if ratio > args.max_ratio:
+        logger.error("汎用抽出の処理時間がテキスト長に対して線形を超えて増加しています")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# benchmarks/run_benchmarks.py - フォーマット識別・抽出処理のベンチマーク
+#
+# benchmarks/corpus の OCRテキスト（*.txt）と正解データ（同名の *.json）、および合成した長文テキストに対して
+# identify_po_format と各抽出関数を実行し、処理時間のパーセンタイル・スループット・項目単位の正解率を出力します。
+# baseline.json のしきい値より遅くなった、または正解率が下がった場合は終了コード1で終了します。
+import os
+import sys
+import json
+import time
+import glob
+import argparse
+import logging
+from typing import Dict, Any, List, Tuple, Callable
+
+# リポジトリ直下のモジュールをインポートできるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ocr_extractors import (
+    FORMAT_SPECS, FORMAT_MIN_CONFIDENCE, identify_po_format,
+    extract_format1_data, extract_format2_data, extract_format3_data, extract_generic_data
+)
+from benchmarks.generic_scaling import make_synthetic_text
+
+logger = logging.getLogger("ocr_benchmark")
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCHMARK_DIR, "corpus")
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+# 計測対象の抽出関数
+EXTRACTORS: Dict[str, Callable[[str], Dict[str, Any]]] = {
+    "format1": extract_format1_data,
+    "format2": extract_format2_data,
+    "format3": extract_format3_data,
+    "generic": extract_generic_data
+}
+
+# 正解率の対象項目
+SCALAR_FIELDS = ["customer", "poNumber", "currency", "totalAmount", "paymentTerms", "terms", "destination"]
+PRODUCT_FIELDS = ["name", "quantity", "unitPrice", "amount"]
+
+def load_corpus(corpus_dir: str) -> List[Dict[str, Any]]:
+    """
+    コーパスのOCRテキストと正解データを読み込みます（正解データがないテキストは計測のみ行う）
+
+    :return: {"name", "text", "golden"} のリスト
+    """
+    cases = []
+    for text_path in sorted(glob.glob(os.path.join(corpus_dir, "*.txt"))):
+        name = os.path.splitext(os.path.basename(text_path))[0]
+        with open(text_path, "r", encoding="utf-8") as f:
+            text = f.read()
+        golden = None
+        golden_path = os.path.join(corpus_dir, f"{name}.json")
+        if os.path.exists(golden_path):
+            with open(golden_path, "r", encoding="utf-8") as f:
+                golden = json.load(f)
+        cases.append({"name": name, "text": text, "golden": golden})
+    return cases
+
+def make_long_format2_case(rows: int) -> Dict[str, Any]:
+    """
+    製品行が多数あるフォーマット2の長文テキストと、その正解データを作成します
+    """
+    lines = [
+        "Purchase Order",
+        "Supplier: Nippon Chemical Trading",
+        "Buyer: Synthetic Bulk Buyer",
+        "Purchase Order no: 880001",
+        "Commodity Description Quantity Unit Price Amount"
+    ]
+    products = []
+    total = 0.0
+    for i in range(rows):
+        quantity = 1000 + (i * 37) % 9000
+        unit_price = 1 + (i % 50) / 10
+        amount = quantity * unit_price
+        total += amount
+        letter = chr(65 + i % 26)
+        lines.append(f"{1000 + i} Product {letter} {quantity:,} kg US${unit_price:.2f} US${amount:,.2f}")
+        products.append({
+            "name": f"Product {letter}",
+            "quantity": f"{quantity:,}",
+            "unitPrice": f"{unit_price:.2f}",
+            "amount": f"{amount:,.2f}"
+        })
+    lines.extend([
+        f"Grand Total US$ {int(total):,}",
+        "Payment Terms: 60 days after B/L date",
+        "Incoterms: CIF Busan",
+        "Discharge Port: Busan, Korea"
+    ])
+    golden = {
+        "format": "format2",
+        "data": {
+            "customer": "Synthetic Bulk Buyer",
+            "poNumber": "880001",
+            "currency": "USD",
+            "products": products,
+            "totalAmount": f"{int(total):,}",
+            "paymentTerms": "60 days after B/L date",
+            "terms": "CIF Busan",
+            "destination": "Busan, Korea"
+        }
+    }
+    return {"name": f"synthetic_format2_{rows}rows", "text": "\n".join(lines) + "\n", "golden": golden}
+
+def make_synthetic_cases(rows: int, pages: int) -> List[Dict[str, Any]]:
+    """
+    非常に長いテキストのケースを作成します
+    """
+    return [
+        make_long_format2_case(rows),
+        # 数字が多く構造のない複数ページのテキスト（処理時間のみ計測）
+        {"name": f"synthetic_noise_{pages}pages", "text": make_synthetic_text(pages), "golden": None}
+    ]
+
+def percentile(values: List[float], pct: float) -> float:
+    """
+    最近傍順位法でパーセンタイルを求めます
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(-(-pct * len(ordered) // 100)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def extractor_for_format(format_name: str) -> str:
+    """
+    フォーマット名から、そのフォーマットを担当する抽出関数の名前を返します
+    """
+    return format_name if format_name in EXTRACTORS and format_name != "generic" else "generic"
+
+def route_format(format_name: str, confidence: float) -> str:
+    """
+    extract_po_data と同じ規則で、識別結果から使用されるフォーマットを決めます
+    """
+    return format_name if format_name in FORMAT_SPECS and confidence >= FORMAT_MIN_CONFIDENCE else "unknown"
+
+def _normalize(value: Any) -> str:
+    return str(value or "").strip()
+
+def score_fields(expected: Dict[str, Any], actual: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    抽出結果を正解データと項目単位で比較します。
+    正解より多く抽出された製品は、その項目数を誤りとして数えます。
+
+    :return: (正解した項目数, 項目数)
+    """
+    correct = 0
+    total = 0
+    for field in SCALAR_FIELDS:
+        total += 1
+        correct += _normalize(actual.get(field)) == _normalize(expected.get(field))
+
+    expected_products = expected.get("products", [])
+    actual_products = actual.get("products", [])
+    for i, product in enumerate(expected_products):
+        extracted = actual_products[i] if i < len(actual_products) else {}
+        for field in PRODUCT_FIELDS:
+            total += 1
+            correct += _normalize(extracted.get(field)) == _normalize(product.get(field))
+    total += max(0, len(actual_products) - len(expected_products)) * len(PRODUCT_FIELDS)
+    return correct, total
+
+def run_benchmark(cases: List[Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    """
+    全ケースに対して識別・抽出を実行し、処理時間と正解率を集計します
+
+    :param cases: load_corpus / make_synthetic_cases のケース
+    :param repeat: 各ケースの実行回数
+    :return: 集計結果
+    """
+    functions: Dict[str, Callable[[str], Any]] = {"identify_po_format": identify_po_format}
+    functions.update(EXTRACTORS)
+
+    timings: Dict[str, List[float]] = {name: [] for name in functions}
+    processed_chars: Dict[str, int] = {name: 0 for name in functions}
+    field_scores: Dict[str, List[int]] = {name: [0, 0] for name in EXTRACTORS}
+    identify_scores = [0, 0]
+    case_results = []
+
+    for case in cases:
+        text = case["text"]
+        golden = case["golden"]
+        case_result = {"name": case["name"], "chars": len(text), "latency_ms": {}}
+
+        for name, function in functions.items():
+            elapsed = []
+            output = None
+            for _ in range(repeat):
+                # アンカー索引は直前に走査したテキストの結果を使い回すため、毎回別の文字列オブジェクトを渡す
+                call_text = (text + " ")[:-1]
+                start = time.perf_counter()
+                output = function(call_text)
+                elapsed.append((time.perf_counter() - start) * 1000)
+            timings[name].extend(elapsed)
+            processed_chars[name] += len(text) * repeat
+            case_result["latency_ms"][name] = round(min(elapsed), 3)
+
+            if golden is None:
+                continue
+            if name == "identify_po_format":
+                routed = route_format(*output)
+                identify_scores[0] += routed == golden["format"]
+                identify_scores[1] += 1
+                case_result["identified"] = routed
+            elif name == extractor_for_format(golden["format"]):
+                correct, total = score_fields(golden["data"], output)
+                field_scores[name][0] += correct
+                field_scores[name][1] += total
+                case_result["accuracy"] = round(correct / total, 4) if total else 1.0
+
+        case_results.append(case_result)
+
+    summary = {}
+    for name, values in timings.items():
+        seconds = sum(values) / 1000
+        summary[name] = {
+            "p50_ms": round(percentile(values, 50), 3),
+            "p95_ms": round(percentile(values, 95), 3),
+            "p99_ms": round(percentile(values, 99), 3),
+            "docs_per_sec": round(len(values) / seconds, 1) if seconds > 0 else 0.0,
+            "kb_per_sec": round(processed_chars[name] / 1024 / seconds, 1) if seconds > 0 else 0.0
+        }
+        if name in field_scores and field_scores[name][1]:
+            correct, total = field_scores[name]
+            summary[name]["accuracy"] = round(correct / total, 4)
+    if identify_scores[1]:
+        summary["identify_po_format"]["accuracy"] = round(identify_scores[0] / identify_scores[1], 4)
+
+    return {"summary": summary, "cases": case_results}
+
+def check_regressions(summary: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """
+    集計結果をベースラインのしきい値と比較します
+
+    :param summary: run_benchmark の集計結果
+    :param baseline: {"max_p95_ms": {...}, "min_accuracy": {...}}
+    :return: 回帰の内容のリスト（回帰がなければ空）
+    """
+    regressions = []
+    for name, limit in baseline.get("max_p95_ms", {}).items():
+        measured = summary.get(name, {}).get("p95_ms")
+        if measured is not None and measured > limit:
+            regressions.append(f"{name}: p95 {measured:.3f}ms > 上限 {limit:.3f}ms")
+    for name, minimum in baseline.get("min_accuracy", {}).items():
+        measured = summary.get(name, {}).get("accuracy")
+        if measured is not None and measured < minimum:
+            regressions.append(f"{name}: 正解率 {measured:.4f} < 下限 {minimum:.4f}")
+    return regressions
+
+def make_baseline(summary: Dict[str, Any], latency_margin: float) -> Dict[str, Any]:
+    """
+    現在の計測結果からベースラインを作成します（処理時間は環境差を見込んで latency_margin 倍の余裕を持たせる）
+    """
+    return {
+        "max_p95_ms": {name: round(stats["p95_ms"] * latency_margin, 3) for name, stats in summary.items()},
+        "min_accuracy": {name: stats["accuracy"] for name, stats in summary.items() if "accuracy" in stats}
+    }
+
+def print_summary(summary: Dict[str, Any]):
+    """
+    集計結果を表形式で出力します
+    """
+    print(f"{'function':<20} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'docs/s':>10} {'KB/s':>10} {'accuracy':>10}")
+    for name, stats in summary.items():
+        accuracy = f"{stats['accuracy']:.4f}" if "accuracy" in stats else "-"
+        print(f"{name:<20} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} {stats['p99_ms']:>10.3f} "
+              f"{stats['docs_per_sec']:>10.1f} {stats['kb_per_sec']:>10.1f} {accuracy:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="POフォーマット識別・抽出処理のベンチマーク")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="OCRテキストと正解データのディレクトリ")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="しきい値を定義したベースラインファイル")
+    parser.add_argument("--repeat", type=int, default=5, help="各ケースの実行回数")
+    parser.add_argument("--rows", type=int, default=2000, help="合成するフォーマット2の製品行数")
+    parser.add_argument("--pages", type=int, default=100, help="合成する数字の多いテキストのページ数")
+    parser.add_argument("--output", help="結果をJSONで保存するファイル")
+    parser.add_argument("--update-baseline", action="store_true", help="現在の結果でベースラインを更新する")
+    parser.add_argument("--latency-margin", type=float, default=3.0, help="ベースライン更新時の処理時間の余裕（倍率）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # 抽出処理自体のログは計測の妨げになるため抑制する
+    logging.getLogger("ocr_extractors").setLevel(logging.WARNING)
+
+    cases = load_corpus(args.corpus) + make_synthetic_cases(args.rows, args.pages)
+    logger.info(f"ケース数: {len(cases)}, 実行回数: {args.repeat}")
+
+    result = run_benchmark(cases, args.repeat)
+    print_summary(result["summary"])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        logger.info(f"結果を保存しました: {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(make_baseline(result["summary"], args.latency_margin), f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        logger.info(f"ベースラインを更新しました: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        logger.warning(f"ベースラインがないため比較を省略します: {args.baseline}")
+        return
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = check_regressions(result["summary"], baseline)
+    if regressions:
+        for regression in regressions:
+            logger.error(f"回帰: {regression}")
+        sys.exit(1)
+    logger.info("ベースラインからの回帰はありません")
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,83 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "1440
 UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", tempfile.gettempdir())
 OCR_TEMP_FOLDER = os.getenv("OCR_TEMP_FOLDER", tempfile.gettempdir())
 
+# アップロードファイルを読み込むチャンクサイズ（バイト）
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+# アップロードファイル1件あたりのサイズ上限（バイト、ZIPアーカイブ内の各ファイルにも適用）
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(50 * 1024 * 1024)))
+# 一括アップロードで1回に受け付けるファイル数の上限（ZIPアーカイブ内のファイルを含む）
+BULK_UPLOAD_MAX_FILES = int(os.getenv("BULK_UPLOAD_MAX_FILES", "100"))
+# 一括アップロードのZIPアーカイブの展開後の合計サイズの上限（バイト）
+BULK_UPLOAD_MAX_EXTRACTED_BYTES = int(os.getenv("BULK_UPLOAD_MAX_EXTRACTED_BYTES", str(500 * 1024 * 1024)))
+
+# OCRワーカープール設定
+# gunicornのWebワーカー数（startup.shの --workers と合わせる）。Webワーカーごとに専用のプロセスプールを持つ
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "2"))
+# 既定値はCPUコア数をWebワーカー数で割った値
+OCR_MAX_WORKERS = int(os.getenv("OCR_MAX_WORKERS", str(max(1, (os.cpu_count() or 2) // WEB_WORKERS))))
+# 実行待ちを含めて受け付けるOCRジョブの上限（超えた場合はアップロードを503で拒否）
+OCR_MAX_PENDING_JOBS = int(os.getenv("OCR_MAX_PENDING_JOBS", "50"))
+# 1ジョブ内でPDFページを並列処理するスレッド数（スレッドごとにtesseractが動くため、既定値は
+# Webワーカー数×ジョブ数×スレッド数がCPUコア数を超えない値）
+OCR_PAGE_WORKERS = int(os.getenv("OCR_PAGE_WORKERS", str(max(1, (os.cpu_count() or 2) // (OCR_MAX_WORKERS * WEB_WORKERS)))))
+# 一度に画像化してOCR_TEMP_FOLDERに置いておくページ数の上限（1ジョブあたりのメモリ・ディスク使用量を抑える）
+OCR_PAGE_WINDOW = int(os.getenv("OCR_PAGE_WINDOW", str(OCR_PAGE_WORKERS * 2)))
+# テキストレイヤーをOCRの代わりに使うための最小文字数（空白を除く）
+OCR_TEXT_LAYER_MIN_CHARS = int(os.getenv("OCR_TEXT_LAYER_MIN_CHARS", "30"))
+# pdftotextのタイムアウト（秒）
+OCR_TEXT_LAYER_TIMEOUT = int(os.getenv("OCR_TEXT_LAYER_TIMEOUT", "30"))
+
+# OCR前処理設定
+# PDFの画像変換時のDPI範囲と、目標とする画像の長辺ピクセル数（A4で約280dpi）
+OCR_MIN_DPI = int(os.getenv("OCR_MIN_DPI", "150"))
+OCR_MAX_DPI = int(os.getenv("OCR_MAX_DPI", "300"))
+OCR_TARGET_LONG_SIDE_PX = int(os.getenv("OCR_TARGET_LONG_SIDE_PX", "3300"))
+# 写真などの画像の長辺の上限（超える場合は縮小）
+OCR_MAX_IMAGE_SIDE = int(os.getenv("OCR_MAX_IMAGE_SIDE", "3500"))
+# 適応的二値化で周辺より暗いとみなす輝度差
+OCR_ADAPTIVE_THRESHOLD_OFFSET = int(os.getenv("OCR_ADAPTIVE_THRESHOLD_OFFSET", "15"))
+# この文字数（英数字）未満しか読み取れなかった場合に高DPIでの再試行を行う
+OCR_LOW_YIELD_CHARS = int(os.getenv("OCR_LOW_YIELD_CHARS", "20"))
+
+# OCRエンジン設定
+# "auto"（tesserocrがあれば使用）, "tesserocr", "pytesseract"
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto").lower()
+# ワーカー起動時に読み込んでおく言語モデル（"osd"は向き・文字体系検出用）
+OCR_WARM_UP_LANGS = os.getenv("OCR_WARM_UP_LANGS", "osd,eng,jpn,eng+jpn")
+
+# OCR言語設定
+# 文字体系を判定できないページで使う言語モデル
+OCR_DEFAULT_LANG = os.getenv("OCR_DEFAULT_LANG", "eng+jpn")
+# OSDに渡す縮小画像の長辺ピクセル数
+OCR_OSD_MAX_SIDE = int(os.getenv("OCR_OSD_MAX_SIDE", "2000"))
+# 文字体系・向きの判定結果を採用する信頼度の下限
+OCR_SCRIPT_MIN_CONF = float(os.getenv("OCR_SCRIPT_MIN_CONF", "1.5"))
+OCR_ORIENTATION_MIN_CONF = float(os.getenv("OCR_ORIENTATION_MIN_CONF", "2.0"))
+
+# OCR進捗設定
+# ページ単位の進捗をDBに書き込む最小間隔（秒）
+OCR_PROGRESS_DB_INTERVAL = float(os.getenv("OCR_PROGRESS_DB_INTERVAL", "2"))
+# 進捗ストリームで、進捗イベントが届かない間にDBから状態を確認する間隔（秒）
+OCR_STREAM_FALLBACK_INTERVAL = float(os.getenv("OCR_STREAM_FALLBACK_INTERVAL", "5"))
+# ステータス一括取得で1回に指定できるOCR IDの上限
+OCR_STATUS_BATCH_MAX_IDS = int(os.getenv("OCR_STATUS_BATCH_MAX_IDS", "200"))
+
+# PO一覧のページングの既定件数と上限件数
+PO_LIST_DEFAULT_LIMIT = int(os.getenv("PO_LIST_DEFAULT_LIMIT", "100"))
+PO_LIST_MAX_LIMIT = int(os.getenv("PO_LIST_MAX_LIMIT", "500"))
+
+# 操作ログ設定
+# この件数たまったらまとめて書き込む
+AUDIT_LOG_BATCH_SIZE = int(os.getenv("AUDIT_LOG_BATCH_SIZE", "100"))
+# 件数に達しなくても書き込む間隔（秒）
+AUDIT_LOG_FLUSH_INTERVAL = float(os.getenv("AUDIT_LOG_FLUSH_INTERVAL", "2"))
+# DBに書き込めない間にためておく件数の上限（超えた分は古いものからアプリケーションログに出力して破棄）
+AUDIT_LOG_MAX_BUFFER = int(os.getenv("AUDIT_LOG_MAX_BUFFER", "10000"))
+
+# 発注書データ抽出設定
+# 汎用抽出で1文書にかける時間の上限（ミリ秒、0なら無制限）
+EXTRACTION_TIME_BUDGET_MS = int(os.getenv("EXTRACTION_TIME_BUDGET_MS", "2000"))
+
 # 開発モード設定
 DEV_MODE = os.getenv("DEV_MODE", "True").lower() in ("true", "1", "t")
 
@@ -42,3 +119,11 @@ if DB_SSL_REQUIRED:
     DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?ssl=true"
 else:
     DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# APIエンドポイントで使用する非同期ドライバ（aiomysql）の接続URL
+# SSLはURLではなくdatabase.pyでSSLコンテキストを渡して有効にする
+ASYNC_DATABASE_URL = f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+# テストなどでは環境変数で接続先を差し替える（例: sqlite:///./test.db と sqlite+aiosqlite:///./test.db）
+DATABASE_URL = os.getenv("DATABASE_URL", DATABASE_URL)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", ASYNC_DATABASE_URL)
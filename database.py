@@ -1,30 +1,53 @@
 # database.py
+import ssl
 from sqlalchemy import create_engine, Text, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
 import pymysql
 
 # 設定ファイルから接続URL等を読み込む
-from config import DATABASE_URL
+from config import DATABASE_URL, ASYNC_DATABASE_URL, DB_SSL_REQUIRED
 
-# SQLAlchemyエンジン作成
-# Azure MySQLへの接続時のパフォーマンス最適化パラメータを追加
-engine = create_engine(
-    DATABASE_URL,
+# Azure MySQLへの接続時のパフォーマンス最適化パラメータ（同期・非同期エンジンで共通）
+POOL_OPTIONS = dict(
     pool_size=10,              # コネクションプールサイズ
     max_overflow=20,           # 最大オーバーフロー接続数
     pool_timeout=30,           # コネクション獲得待機時間（秒）
     pool_recycle=1800,         # 接続リサイクル時間（秒）- MySQLのwait_timeout未満に設定
     pool_pre_ping=True,        # 接続前に接続テスト実行
-    connect_args={
-        "ssl": {"ssl_mode": "required"}  # SSL接続を強制
-    },
-    poolclass=QueuePool       # プール管理クラス
 )
 
+# SQLAlchemyエンジン作成（OCRワーカーと初期化スクリプトで使用）
+if DATABASE_URL.startswith("sqlite"):
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+else:
+    engine = create_engine(
+        DATABASE_URL,
+        connect_args={
+            "ssl": {"ssl_mode": "required"}  # SSL接続を強制
+        },
+        poolclass=QueuePool,       # プール管理クラス
+        **POOL_OPTIONS
+    )
+
+# 非同期エンジン作成（APIエンドポイントで使用し、DBの応答待ちの間もイベントループを止めない）
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    # テスト用のaiosqlite
+    async_engine = create_async_engine(ASYNC_DATABASE_URL)
+else:
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        # aiomysqlはSSLの設定をSSLコンテキストで受け取る
+        connect_args={"ssl": ssl.create_default_context()} if DB_SSL_REQUIRED else {},
+        **POOL_OPTIONS
+    )
+
 # セッションローカルとベースの設定
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# コミット後に属性を読んでも再読み込み（非同期セッションでは暗黙のIOになる）が走らないようにする
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # 依存性注入のためのセッション取得関数
@@ -38,6 +61,13 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """
+    FastAPIの依存性注入で使用する非同期データベースセッション取得関数
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # データベース接続テスト関数
 def test_db_connection():
     """
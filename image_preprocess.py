@@ -0,0 +1,116 @@
+# image_preprocess.py - OCR前の画像前処理
+import re
+import logging
+from typing import Optional
+
+from PIL import Image, ImageOps, ImageFilter, ImageChops
+
+import config
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+def choose_pdf_dpi(page_size: Optional[str]) -> int:
+    """
+    PDFのページサイズから画像変換時のDPIを決定します。
+    長辺がOCR_TARGET_LONG_SIDE_PX前後になるDPIを、OCR_MIN_DPI〜OCR_MAX_DPIの範囲で選びます。
+
+    :param page_size: pdfinfoの "Page size" の値（例: "595.276 x 841.89 pts (A4)"）
+    :return: DPI
+    """
+    match = re.match(r"\s*([\d.]+)\s*x\s*([\d.]+)\s*pts", page_size or "")
+    if not match:
+        return config.OCR_MAX_DPI
+
+    # 1pt = 1/72インチ
+    long_side_inch = max(float(match.group(1)), float(match.group(2))) / 72
+    if long_side_inch <= 0:
+        return config.OCR_MAX_DPI
+
+    dpi = int(config.OCR_TARGET_LONG_SIDE_PX / long_side_inch)
+    return max(config.OCR_MIN_DPI, min(config.OCR_MAX_DPI, dpi))
+
+def otsu_threshold(gray: Image.Image) -> int:
+    """
+    グレースケール画像のヒストグラムから大津の方法で二値化のしきい値を求めます
+    """
+    histogram = gray.histogram()[:256]
+    total = sum(histogram)
+    sum_all = sum(i * count for i, count in enumerate(histogram))
+
+    sum_background = 0
+    weight_background = 0
+    best_threshold = 127
+    best_variance = 0.0
+    for i, count in enumerate(histogram):
+        weight_background += count
+        if weight_background == 0:
+            continue
+        weight_foreground = total - weight_background
+        if weight_foreground == 0:
+            break
+        sum_background += i * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = i
+    return best_threshold
+
+def binarize(gray: Image.Image) -> Image.Image:
+    """
+    スキャン画像のように照明が均一な画像を大津の方法で二値化します
+    """
+    threshold = otsu_threshold(gray)
+    return gray.point(lambda p: 255 if p > threshold else 0)
+
+def binarize_adaptive(gray: Image.Image) -> Image.Image:
+    """
+    スマートフォンで撮影した画像のように明るさにむらがある画像を、周辺の平均輝度との差で二値化します
+    """
+    radius = max(8, min(gray.size) // 60)
+    local_mean = gray.filter(ImageFilter.BoxBlur(radius))
+    # 周辺より一定以上暗い画素だけを文字として残す
+    darkness = ImageChops.subtract(local_mean, gray)
+    return darkness.point(lambda p: 0 if p > config.OCR_ADAPTIVE_THRESHOLD_OFFSET else 255)
+
+def downscale(image: Image.Image) -> Image.Image:
+    """
+    長辺がOCR_MAX_IMAGE_SIDEを超える画像を縮小します
+    """
+    if max(image.size) <= config.OCR_MAX_IMAGE_SIDE:
+        return image
+    scale = config.OCR_MAX_IMAGE_SIDE / max(image.size)
+    new_size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+    logger.debug(f"画像を縮小: {image.size} -> {new_size}")
+    return image.resize(new_size, Image.LANCZOS)
+
+def preprocess_page_image(image: Image.Image) -> Image.Image:
+    """
+    PDFから変換したページ画像をOCR向けに前処理します（グレースケール化・二値化）
+
+    :param image: ページ画像
+    :return: 前処理済みの画像
+    """
+    gray = image if image.mode == "L" else image.convert("L")
+    return binarize(downscale(gray))
+
+def load_photo_for_ocr(file_path: str) -> Image.Image:
+    """
+    PNG/JPEG画像を読み込み、OCR向けに前処理します。
+    JPEGはdraftモードで必要な解像度だけデコードし、EXIFの回転情報も反映します。
+
+    :param file_path: 画像ファイルのパス
+    :return: 前処理済みの画像
+    """
+    with Image.open(file_path) as image:
+        if image.format == "JPEG" and max(image.size) > config.OCR_MAX_IMAGE_SIDE:
+            # DCTの縮小デコードでフル解像度の展開を避ける（要求サイズ以上の最小の縮尺が選ばれる）
+            scale = config.OCR_MAX_IMAGE_SIDE / max(image.size)
+            image.draft("L", (int(image.width * scale), int(image.height * scale)))
+        image = ImageOps.exif_transpose(image)
+        gray = image.convert("L")
+
+    gray = ImageOps.autocontrast(downscale(gray))
+    return binarize_adaptive(gray)
@@ -6,6 +6,7 @@ from sqlalchemy.exc import SQLAlchemyError
 from database import SessionLocal, engine
 import models
 from auth import get_password_hash
+from migrations import run_migrations
 import config
 
 # ロギング設定
@@ -15,11 +16,11 @@ logger = logging.getLogger(__name__)
 def init_db():
     """
     データベースの初期化処理
-    - テーブルの作成
+    - テーブルの作成と既存テーブルへの列・インデックスの追加
     - 初期ユーザーの作成
     """
-    # モデルからテーブルを作成
-    models.Base.metadata.create_all(bind=engine)
+    # モデルからテーブルを作成し、既存のテーブルを現在のモデルに合わせる
+    run_migrations(engine)
     logger.info("データベーステーブルを作成しました")
     
     # 初期ユーザーの作成
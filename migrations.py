@@ -0,0 +1,141 @@
+# migrations.py - 既存データベースへのスキーマ変更の適用
+import asyncio
+import logging
+from typing import List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from database import engine, async_engine, AsyncSessionLocal
+import models
+from po_service import backfill_po_summaries
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# create_all は既存のテーブルを変更しないため、既存テーブルに追加した列とインデックスはここで追加する
+# 既存テーブルに追加した列（テーブル名, 列名, 列定義）
+ADDED_COLUMNS: List[Tuple[str, str, str]] = [
+    ("OCRResults", "content_hash", "VARCHAR(64) NULL"),
+    ("OCRResults", "extracted_data", "TEXT NULL"),
+    ("OCRResults", "extractor_version", "VARCHAR(20) NULL"),
+    ("OCRResults", "page_count", "INT NULL"),
+    # 既存の行も 0 で埋める
+    ("OCRResults", "pages_done", "INT NOT NULL DEFAULT 0"),
+    ("OCRResults", "pages_ocr_id", "INT NULL"),
+]
+
+# 既存テーブルに追加したインデックス（テーブル名, インデックス名, 列）
+ADDED_INDEXES: List[Tuple[str, str, List[str]]] = [
+    ("OCRResults", "ix_OCRResults_content_hash", ["content_hash"]),
+    ("PurchaseOrders", "ix_purchaseorders_status_created_at", ["status", "created_at"]),
+    ("PurchaseOrders", "ix_purchaseorders_customer_name", ["customer_name"]),
+    ("ShippingSchedules", "ix_shippingschedules_etd_po_id", ["etd", "po_id"]),
+    ("ShippingSchedules", "ix_shippingschedules_eta_po_id", ["eta", "po_id"]),
+    ("Input", "ix_input_po_acquisition_date_po_id", ["po_acquisition_date", "po_id"]),
+]
+
+# 既存テーブルに追加した一意インデックス（テーブル名, インデックス名, 列）
+# PO一覧でPOごとに1件として結合するテーブル。既存のデータに重複がある場合は作成せずにエラーを記録する
+ADDED_UNIQUE_INDEXES: List[Tuple[str, str, str]] = [
+    ("Input", "ix_input_po_id", "po_id"),
+    ("ShippingSchedules", "ix_shippingschedules_po_id", "po_id"),
+]
+
+# 型を変更した列（テーブル名, 列名, 列定義, 変更後の小数桁数）
+# MySQLのINT列のままだと小数の数量が丸めて保存されるため、DECIMALに変更する
+CHANGED_COLUMNS: List[Tuple[str, str, str, int]] = [
+    ("OrderItems", "quantity", "DECIMAL(15,3) NOT NULL", 3),
+]
+
+def _add_missing_columns(bind: Engine):
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table, column, definition in ADDED_COLUMNS:
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column in existing:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+            logger.info(f"列を追加しました: {table}.{column}")
+
+def _add_missing_indexes(bind: Engine):
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table, name, columns in ADDED_INDEXES:
+            existing = {i["name"] for i in inspector.get_indexes(table)}
+            if name in existing:
+                continue
+            conn.execute(text(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"))
+            logger.info(f"インデックスを作成しました: {name}")
+
+def _add_missing_unique_indexes(bind: Engine):
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table, name, column in ADDED_UNIQUE_INDEXES:
+            existing = {i["name"] for i in inspector.get_indexes(table)}
+            if name in existing:
+                continue
+            # どの行を残すかは業務上の判断が必要なため、重複の削除は自動では行わない
+            duplicated = conn.execute(text(
+                f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL "
+                f"GROUP BY {column} HAVING COUNT(*) > 1 LIMIT 20"
+            )).scalars().all()
+            if duplicated:
+                logger.error(
+                    f"{table}.{column} に重複があるため一意インデックス {name} を作成できません。"
+                    f"重複を解消してから再実行してください: {column}={duplicated}"
+                )
+                continue
+            conn.execute(text(f"CREATE UNIQUE INDEX {name} ON {table} ({column})"))
+            logger.info(f"一意インデックスを作成しました: {name}")
+
+def _modify_changed_columns(bind: Engine):
+    if bind.dialect.name != "mysql":
+        # SQLiteは列の型を変更できないが、型に関係なく小数を保存できるため変更は不要
+        return
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table, column, definition, scale in CHANGED_COLUMNS:
+            current = next(c for c in inspector.get_columns(table) if c["name"] == column)
+            if getattr(current["type"], "scale", None) == scale:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} MODIFY {column} {definition}"))
+            logger.info(f"列の型を変更しました: {table}.{column} {definition}")
+
+def backfill_summaries() -> int:
+    """
+    集計データのないPO（POSummaries導入前に登録されたPO）の集計データを作成します。
+    Webワーカーが複数あると同じPOを同時に作成して主キーが重複するため、起動前のこの手順で1回だけ実行します。
+
+    :return: 作成した件数
+    """
+    async def _run():
+        try:
+            async with AsyncSessionLocal() as db:
+                return await backfill_po_summaries(db)
+        finally:
+            await async_engine.dispose()
+    return asyncio.run(_run())
+
+def run_migrations(bind: Engine = engine):
+    """
+    テーブルを作成し、既存のテーブルに不足している列・インデックスの追加と列の型の変更を行ってから、PO集計データの不足分を作成します。
+    適用済みの変更は確認して飛ばすため、何度実行しても問題ありません。
+
+    :param bind: 対象のデータベースエンジン
+    """
+    # 新しいテーブル（とそのインデックス）は create_all で作成する
+    models.Base.metadata.create_all(bind=bind)
+    # 列を追加してからインデックスを作成する
+    _add_missing_columns(bind)
+    _add_missing_indexes(bind)
+    _add_missing_unique_indexes(bind)
+    _modify_changed_columns(bind)
+    logger.info("スキーマの更新が完了しました")
+    # 読み取りモデルの不足分を作成する
+    backfill_summaries()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    logger.info("スキーマの更新を開始します...")
+    run_migrations()
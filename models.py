@@ -1,5 +1,6 @@
 # models.py　データベースモデルの定義
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, Float, Numeric, Date
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, Numeric, Date, LargeBinary, Index
+from sqlalchemy.dialects.mysql import MEDIUMBLOB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func, text
 
@@ -32,16 +33,47 @@ class PurchaseOrder(Base):
     created_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'))
     updated_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'), server_onupdate=text('CURRENT_TIMESTAMP'))
 
+    # 関連データ（一覧取得では selectinload でまとめて読み込む。PO削除時は関連データも削除する）
+    items = relationship("OrderItem", back_populates="purchase_order", order_by="OrderItem.item_id", cascade="all, delete-orphan")
+    input_info = relationship("Input", back_populates="purchase_order", uselist=False, cascade="all, delete-orphan")
+    shipping_schedule = relationship("ShippingSchedule", back_populates="purchase_order", uselist=False, cascade="all, delete-orphan")
+    summary = relationship("POSummary", back_populates="purchase_order", uselist=False, cascade="all, delete-orphan")
+
+    # PO一覧の絞り込み・並び替え用（ステータス別の新着順、顧客名の前方一致）
+    __table_args__ = (
+        Index("ix_purchaseorders_status_created_at", "status", "created_at"),
+        Index("ix_purchaseorders_customer_name", "customer_name"),
+    )
+
 class OrderItem(Base):
     __tablename__ = "OrderItems"
 
     item_id = Column(Integer, primary_key=True, index=True)
     po_id = Column(Integer, ForeignKey("PurchaseOrders.po_id"))
     product_name = Column(String(255), nullable=False)
-    quantity = Column(Integer, nullable=False)
+    quantity = Column(Numeric(15, 3), nullable=False)  # 登録時に normalization で正規化した数量
     unit_price = Column(Numeric(10, 2), nullable=False)
     subtotal = Column(Numeric(10, 2), nullable=False)
 
+    purchase_order = relationship("PurchaseOrder", back_populates="items")
+
+class POSummary(Base):
+    """
+    PO一覧に表示する集計値（製品・入力情報・出荷情報の更新と同じトランザクションで po_service が更新する）
+    """
+    __tablename__ = "POSummaries"
+
+    po_id = Column(Integer, ForeignKey("PurchaseOrders.po_id"), primary_key=True)
+    product_names = Column(Text, nullable=False, default="")  # 製品名をカンマ区切りで結合したもの
+    total_quantity = Column(Numeric(18, 3), nullable=False, default=0)  # 製品の数量の合計（SQLで集計）
+    first_unit_price = Column(Numeric(10, 2), nullable=True)  # 最初の製品の単価
+    has_invoice = Column(Boolean, nullable=False, default=False)  # 請求書番号が登録済みか
+    payment_completed = Column(Boolean, nullable=False, default=False)  # 入金済みか
+    has_booking = Column(Boolean, nullable=False, default=False)  # 出荷情報（ブッキング）が登録済みか
+    updated_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'), server_onupdate=text('CURRENT_TIMESTAMP'))
+
+    purchase_order = relationship("PurchaseOrder", back_populates="summary")
+
 class ShippingSchedule(Base):
     __tablename__ = "ShippingSchedules"
 
@@ -57,6 +89,16 @@ class ShippingSchedule(Base):
     voyage_number = Column(String(50), nullable=False)
     container_size = Column(String(50), nullable=False)
 
+    purchase_order = relationship("PurchaseOrder", back_populates="shipping_schedule")
+
+    # PO一覧のETD・ETAでの絞り込み・並び替え用（po_idを含めて結合時にテーブルを読まずに済むようにする）
+    # POごとに1件（PO一覧で結合したときにPOが重複しないようにする）
+    __table_args__ = (
+        Index("ix_shippingschedules_etd_po_id", "etd", "po_id"),
+        Index("ix_shippingschedules_eta_po_id", "eta", "po_id"),
+        Index("ix_shippingschedules_po_id", "po_id", unique=True),
+    )
+
 class Log(Base):
     __tablename__ = "Logs"
 
@@ -74,6 +116,27 @@ class OCRResult(Base):
     processed_data = Column(Text, nullable=True)
     status = Column(String(50), nullable=False, default="手配前")
     ocrresultscol1 = Column(String(255), nullable=False, default="default_value") ## 3/31追加
+    content_hash = Column(String(64), nullable=True, index=True)  # アップロードファイルのSHA-256（重複OCRの再利用に使用）
+    extracted_data = Column(Text, nullable=True)  # OCR完了時に抽出した発注書データ（JSON）
+    extractor_version = Column(String(20), nullable=True)  # extracted_dataを作成した抽出処理のバージョン
+    page_count = Column(Integer, nullable=True)  # 総ページ数（OCR開始後に設定）
+    pages_done = Column(Integer, nullable=False, default=0)  # 処理済みのページ数
+    pages_ocr_id = Column(Integer, ForeignKey("OCRResults.ocr_id"), nullable=True)  # 再利用したOCR結果のうちページテキスト（OCRPages）を持つもののID
+
+class OCRPage(Base):
+    __tablename__ = "OCRPages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ocr_id = Column(Integer, ForeignKey("OCRResults.ocr_id"), nullable=False)
+    page_number = Column(Integer, nullable=False)
+    source = Column(String(20), nullable=False)  # "text_layer" または "ocr"
+    lang = Column(String(20), nullable=True)
+    char_count = Column(Integer, nullable=False, default=0)
+    text_compressed = Column(LargeBinary().with_variant(MEDIUMBLOB(), "mysql"), nullable=False)  # zlib圧縮したUTF-8テキスト
+
+    __table_args__ = (
+        Index("ix_ocrpages_ocr_id_page_number", "ocr_id", "page_number", unique=True),
+    )
 
 class Input(Base):
     __tablename__ = "Input"
@@ -89,3 +152,12 @@ class Input(Base):
     memo = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'))
     updated_at = Column(DateTime(timezone=True), server_default=text('CURRENT_TIMESTAMP'), server_onupdate=text('CURRENT_TIMESTAMP'))
+
+    purchase_order = relationship("PurchaseOrder", back_populates="input_info")
+
+    # PO一覧の受領日での絞り込み・並び替え用
+    # POごとに1件（PO一覧で結合したときにPOが重複しないようにする）
+    __table_args__ = (
+        Index("ix_input_po_acquisition_date_po_id", "po_acquisition_date", "po_id"),
+        Index("ix_input_po_id", "po_id", unique=True),
+    )
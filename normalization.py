@@ -0,0 +1,112 @@
+# normalization.py - OCR・画面入力由来の数値文字列の正規化
+import re
+import unicodedata
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from typing import Tuple, Union
+
+# 数値の前後に付くことのある通貨記号・通貨コード
+_CURRENCY_PATTERN = re.compile(r'^(?:US\$|USD|JPY|EUR|\$|¥|€)\s*|\s*(?:USD|JPY|EUR|円)$', re.IGNORECASE)
+# 数量の後ろに付くことのある単位
+_UNIT_PATTERN = re.compile(r'\s*(?:kg|kgs|mt|pcs|units?)$', re.IGNORECASE)
+# 先頭の符号（数値のパターンには含めず、負の値のエラーにするために記録する）
+_SIGN_PATTERN = re.compile(r'^([+-])\s*')
+# 3桁区切りのカンマ付き、またはカンマなしの非負の数値
+_NUMBER_PATTERN = re.compile(r'^(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?$')
+
+# 保存先の列の小数桁数（models の Numeric の scale と合わせる）
+QUANTITY_PLACES = 3
+AMOUNT_PLACES = 2
+
+class NormalizationError(ValueError):
+    """数値として解釈できない値が入力された場合に送出される例外"""
+
+    def __init__(self, field: str, value, reason: str):
+        super().__init__(f"{field}: '{value}' {reason}")
+        self.field = field
+        self.value = value
+        self.reason = reason
+
+def _strip_sign(text: str) -> Tuple[str, bool]:
+    """
+    先頭の符号を取り除きます
+
+    :return: (符号を除いた文字列, 負の符号が付いていたか)
+    """
+    match = _SIGN_PATTERN.match(text)
+    if not match:
+        return text, False
+    return text[match.end():], match.group(1) == "-"
+
+def parse_decimal(
+    value: Union[str, int, float, Decimal, None],
+    field: str,
+    places: int,
+    max_digits: int,
+    allow_unit: bool = False
+) -> Decimal:
+    """
+    "1,000" や "US$12.50" のような文字列を Decimal に変換します。
+    全角数字は半角として扱い、小数は places 桁に四捨五入します。
+
+    :param value: 変換する値
+    :param field: エラーメッセージに使う項目名
+    :param places: 小数桁数
+    :param max_digits: 全体の桁数の上限（保存先の列の精度）
+    :param allow_unit: 数量の単位（kg, MT など）の付いた値を許可するか
+    :return: 正規化した値
+    :raises NormalizationError: 数値として解釈できない場合、負の値、桁数が上限を超える場合
+    """
+    if value is None:
+        raise NormalizationError(field, value, "は必須です")
+    if isinstance(value, bool):
+        raise NormalizationError(field, value, "は数値ではありません")
+    if isinstance(value, (int, Decimal)):
+        number = Decimal(value)
+    elif isinstance(value, float):
+        number = Decimal(str(value))
+    else:
+        text = unicodedata.normalize("NFKC", str(value)).strip()
+        # 符号は通貨記号の前（"-$5"）と後（"$-5"）のどちらにも付きうる
+        text, negative = _strip_sign(text)
+        text = _CURRENCY_PATTERN.sub("", text)
+        if allow_unit:
+            text = _UNIT_PATTERN.sub("", text)
+        text = text.strip()
+        if not negative:
+            text, negative = _strip_sign(text)
+        if not text:
+            raise NormalizationError(field, value, "は必須です")
+        if not _NUMBER_PATTERN.match(text):
+            raise NormalizationError(field, value, "は数値として解釈できません")
+        try:
+            number = Decimal(text.replace(",", ""))
+        except InvalidOperation:
+            raise NormalizationError(field, value, "は数値として解釈できません")
+        if negative:
+            number = -number
+
+    if not number.is_finite():
+        raise NormalizationError(field, value, "は数値として解釈できません")
+    if number < 0:
+        raise NormalizationError(field, value, "は0以上である必要があります")
+
+    # 四捨五入で桁が繰り上がる場合もあるため、丸めの前後で整数部の桁数を確認する
+    too_many_digits = f"は桁数が多すぎます（整数部{max_digits - places}桁まで）"
+    if number.adjusted() >= max_digits - places:
+        raise NormalizationError(field, value, too_many_digits)
+    number = number.quantize(Decimal(1).scaleb(-places), rounding=ROUND_HALF_UP)
+    if number.adjusted() >= max_digits - places:
+        raise NormalizationError(field, value, too_many_digits)
+    return number
+
+def parse_quantity(value, field: str = "quantity") -> Decimal:
+    """
+    数量を正規化します（"5,000 kg" のような単位付きの値も受け付ける）
+    """
+    return parse_decimal(value, field, QUANTITY_PLACES, max_digits=15, allow_unit=True)
+
+def parse_amount(value, field: str = "amount") -> Decimal:
+    """
+    単価・金額を正規化します（"US$12.50" のような通貨記号付きの値も受け付ける）
+    """
+    return parse_decimal(value, field, AMOUNT_PLACES, max_digits=10)
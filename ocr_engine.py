@@ -0,0 +1,180 @@
+# ocr_engine.py - OCRエンジンの抽象化
+import queue
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Optional, Tuple
+
+import pytesseract
+from PIL import Image
+
+import config
+
+# tesserocr（Tesseract APIのPythonバインディング）はインストールされている場合のみ使用する
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+class OCREngine(ABC):
+    """
+    OCRエンジンの共通インターフェース
+    """
+    name = "base"
+
+    @abstractmethod
+    def recognize(self, image: Image.Image, lang: str) -> str:
+        """
+        画像からテキストを認識します
+
+        :param image: 画像
+        :param lang: 言語モデル（例: "eng", "jpn", "eng+jpn"）
+        :return: 認識したテキスト
+        """
+
+    @abstractmethod
+    def detect_osd(self, image: Image.Image) -> Optional[Dict[str, Any]]:
+        """
+        向き・文字体系を検出します
+
+        :param image: 画像
+        :return: {"rotate", "orientation_conf", "script", "script_conf"}。検出できない場合はNone
+        """
+
+    def warm_up(self, langs):
+        """
+        指定した言語モデルを事前に読み込みます
+        """
+
+class PytesseractEngine(OCREngine):
+    """
+    pytesseract経由でtesseractコマンドを呼び出すエンジン（呼び出しごとにプロセスを起動する）
+    """
+    name = "pytesseract"
+
+    def recognize(self, image: Image.Image, lang: str) -> str:
+        return pytesseract.image_to_string(image, lang=lang)
+
+    def detect_osd(self, image: Image.Image) -> Optional[Dict[str, Any]]:
+        try:
+            osd = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT)
+        except pytesseract.TesseractError as e:
+            # 文字が少ないページなどではOSDが失敗する
+            logger.debug(f"OSDに失敗しました: {str(e)}")
+            return None
+        return {
+            "rotate": int(osd.get("rotate", 0)),
+            "orientation_conf": float(osd.get("orientation_conf", 0)),
+            "script": osd.get("script"),
+            "script_conf": float(osd.get("script_conf", 0))
+        }
+
+class TesserocrEngine(OCREngine):
+    """
+    tesserocrで言語モデルを読み込み済みのTesseract APIインスタンスを使い回すエンジン。
+    インスタンスはスレッドセーフではないため、言語ごとのプールから貸し出して使います。
+    """
+    name = "tesserocr"
+
+    def __init__(self, pool_size: int):
+        self._pool_size = max(1, pool_size)
+        self._pools: Dict[Tuple[str, int], queue.Queue] = {}
+        self._created: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, lang: str, psm: int):
+        key = (lang, psm)
+        with self._lock:
+            pool = self._pools.setdefault(key, queue.Queue())
+            try:
+                return pool.get_nowait()
+            except queue.Empty:
+                pass
+            if self._created.get(key, 0) < self._pool_size:
+                self._created[key] = self._created.get(key, 0) + 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            logger.info(f"Tesseract APIを初期化: lang={lang}, psm={psm}")
+            try:
+                return tesserocr.PyTessBaseAPI(lang=lang, psm=psm)
+            except Exception:
+                with self._lock:
+                    self._created[key] -= 1
+                raise
+        # プールの上限に達している場合は返却を待つ
+        return pool.get()
+
+    def _release(self, lang: str, psm: int, api):
+        api.Clear()
+        self._pools[(lang, psm)].put(api)
+
+    def recognize(self, image: Image.Image, lang: str) -> str:
+        api = self._acquire(lang, tesserocr.PSM.AUTO)
+        try:
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        finally:
+            self._release(lang, tesserocr.PSM.AUTO, api)
+
+    def detect_osd(self, image: Image.Image) -> Optional[Dict[str, Any]]:
+        api = self._acquire("osd", tesserocr.PSM.OSD_ONLY)
+        try:
+            api.SetImage(image)
+            osd = api.DetectOrientationScript()
+        except RuntimeError as e:
+            logger.debug(f"OSDに失敗しました: {str(e)}")
+            return None
+        finally:
+            self._release("osd", tesserocr.PSM.OSD_ONLY, api)
+
+        if not osd:
+            return None
+        # pytesseractの "Rotate" と同じく、正立させるための時計回りの回転角度に変換する
+        return {
+            "rotate": (360 - int(osd["orient_deg"])) % 360,
+            "orientation_conf": float(osd["orient_conf"]),
+            "script": osd["script_name"],
+            "script_conf": float(osd["script_conf"])
+        }
+
+    def warm_up(self, langs):
+        for lang in langs:
+            psm = tesserocr.PSM.OSD_ONLY if lang == "osd" else tesserocr.PSM.AUTO
+            self._release(lang, psm, self._acquire(lang, psm))
+
+_engine: Optional[OCREngine] = None
+_engine_lock = threading.Lock()
+
+def get_ocr_engine() -> OCREngine:
+    """
+    プロセス内で共有するOCRエンジンを取得します。
+    OCR_ENGINE が "auto" の場合、tesserocrがあればそれを使い、なければpytesseractを使います。
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            use_tesserocr = config.OCR_ENGINE in ("tesserocr", "auto")
+            if use_tesserocr and tesserocr is None:
+                # ページごとにtesseractのプロセスを起動するため遅くなる（startup.shでtesserocrをインストールする）
+                logger.warning("tesserocrがインストールされていないため、pytesseractを使用します")
+                use_tesserocr = False
+            _engine = TesserocrEngine(config.OCR_PAGE_WORKERS) if use_tesserocr else PytesseractEngine()
+            logger.info(f"OCRエンジン: {_engine.name}")
+        return _engine
+
+def warm_up_ocr_engine():
+    """
+    OCRエンジンに言語モデルを事前に読み込ませます（ワーカープロセスの起動時に呼び出す）
+    """
+    langs = [lang.strip() for lang in config.OCR_WARM_UP_LANGS.split(",") if lang.strip()]
+    try:
+        get_ocr_engine().warm_up(langs)
+        logger.info(f"OCRエンジンのウォームアップ完了: {langs}")
+    except Exception as e:
+        logger.error(f"OCRエンジンのウォームアップエラー: {str(e)}")
@@ -1,21 +1,71 @@
 # ocr_extractors.py
 import re
+import time
 import logging
-from typing import Dict, Any, Tuple, List
+from typing import Dict, Any, Tuple, List, Optional, Callable
 
 # ロギング設定
 logger = logging.getLogger(__name__)
 
-def identify_po_format(ocr_text: str) -> Tuple[str, float]:
+# 抽出処理のバージョン（抽出結果が変わる変更を行った場合は更新し、保存済みの抽出結果を再計算させる）
+EXTRACTOR_VERSION = "2"
+
+# フォーマット別の抽出を使う信頼度の下限（これ未満は汎用抽出を使う）
+FORMAT_MIN_CONFIDENCE = 0.4
+
+# 項目パターンの正規表現フラグ
+FIELD_FLAGS = re.IGNORECASE | re.MULTILINE
+
+# アンカーとして使う固定文字列の最小長（短すぎると候補位置が増えて効果がない）
+MIN_ANCHOR_LENGTH = 3
+
+# 抽出値の前後に残る区切り記号
+_EDGE_NOISE = re.compile(r'^[:\s]+|[:\s]+$')
+
+# 小文字化では英字にならないが、re.IGNORECASE では英字と一致する文字
+_ANCHOR_CASE_FIXES = str.maketrans({"ı": "i", "ſ": "s"})
+
+# 正規表現のメタ文字
+_REGEX_META = set(".^$*+?{}[]()|\\")
+
+def _clean_value(value: str) -> str:
     """
-    OCRで抽出したテキストからPOフォーマットを識別します
-    
-    :param ocr_text: OCRで抽出したテキスト
-    :return: (フォーマット名, 信頼度)
+    抽出値の前後の空白と区切り記号を取り除きます
+    """
+    return _EDGE_NOISE.sub('', value.strip())
+
+def _extract_loose_products(ocr_text: str) -> List[Dict[str, str]]:
+    """
+    表形式の行として取れない場合に、製品名・数量・価格を個別に拾って製品を構成します（フォーマット2用）
     """
-    # フォーマット判定のための特徴と重み
-    format_features = {
-        "format1": [
+    products = []
+    product_names = re.findall(r"Product ([A-Z])", ocr_text)
+    quantities = re.findall(r"(?<![\d,])([\d,]+)\s*kg", ocr_text)
+    prices = re.findall(r"US\$([\d,.]+)", ocr_text)
+
+    for i, name in enumerate(product_names):
+        if i < len(quantities) and i*2+1 < len(prices):
+            products.append({
+                "name": f"Product {name}",
+                "quantity": quantities[i],
+                "unitPrice": prices[i*2] if i*2 < len(prices) else "",
+                "amount": prices[i*2+1] if i*2+1 < len(prices) else ""
+            })
+    return products
+
+# POフォーマットの定義
+# 新しい顧客フォーマットは、ここに定義を追加するだけで識別・抽出の対象になります。
+#   label: ログ表示用の名前
+#   features: フォーマット判定用の (パターン, 重み)。大文字小文字を区別しない
+#   fields: 項目ごとの抽出パターン。先頭から順に試し、最初に値が取れたパターンを使う
+#   currency: {"pattern": 正規表現（大文字小文字を区別する）} または {"value": 固定値}
+#   product: 単一製品の項目パターン。name が取れた場合のみ name_format で整形して追加する
+#   product_rows: 表形式の製品行パターンと、項目ごとのグループ番号。先頭から順に試し、最初に行が取れたものを使う
+#   product_fallback: 製品が1件も取れなかった場合に呼び出す関数
+FORMAT_SPECS: Dict[str, Dict[str, Any]] = {
+    "format1": {
+        "label": "Buyer's Info",
+        "features": [
             (r"\(Buyer(?:'|')s Info\)", 10),  # 最も重要な特徴
             (r"ABC Company", 5),
             (r"Purchase Order:?\s*\d+", 5),
@@ -25,7 +75,58 @@ def identify_po_format(ocr_text: str) -> Tuple[str, float]:
             (r"Inco Terms:", 2),
             (r"Del Date:", 2)
         ],
-        "format2": [
+        "fields": {
+            "customer": [
+                r"ABC Company\s*(.*?)(?:\n|$)",
+                r"\(Buyer(?:'|')s Info\).*?([A-Za-z0-9\s]+Company)"
+            ],
+            "poNumber": [
+                r"Purchase Order(?::|Order|Number)?:?\s*(\d+)",
+                r"(?:PO|Order)(?:\s+No)?\.?:?\s*(\d+)"
+            ],
+            "totalAmount": [
+                r"TOTAL\s*([\d,.]+)",
+                r"Total:?\s*([\d,.]+)"
+            ],
+            "paymentTerms": [
+                r"Terms:\s*(.*?)(?:\n|$)",
+                r"Payment terms?:?\s*(.*?)(?:\n|$)",
+                r"Net Due within\s*(.*?)(?:\n|$)"
+            ],
+            "terms": [
+                r"Inco Terms:\s*(.*?)(?:\n|$)",
+                r"Shipping Terms:\s*(.*?)(?:\n|$)",
+                r"Delivery Terms:\s*(.*?)(?:\n|$)"
+            ],
+            "destination": [
+                r"Ship to:\s*(.*?)(?:\n|$)",
+                r"Destination:\s*(.*?)(?:\n|$)",
+                r"Delivery Address:\s*(.*?)(?:\n|$)"
+            ]
+        },
+        "currency": {"pattern": r"(USD|EUR|JPY|CNY)"},
+        "product": {
+            "name": [
+                r"Item:\s*(.*?)(?:\n|$)",
+                r"Product:?\s*(.*?)(?:\n|Quantity)"
+            ],
+            "quantity": [
+                r"Quantity:\s*([\d,.]+)\s*(?:KG|kg|MT|mt)",
+                r"Qty:?\s*([\d,.]+)\s*(?:KG|kg|MT|mt)"
+            ],
+            "unitPrice": [
+                r"Unit Price:\s*\$?\s*([\d,.]+)",
+                r"Unit Price:.*?per\s*.*?\$?\s*([\d,.]+)"
+            ],
+            "amount": [
+                r"EXT Price:\s*([\d,.]+)",
+                r"Amount:\s*([\d,.]+)"
+            ]
+        }
+    },
+    "format2": {
+        "label": "Purchase Order",
+        "features": [
             (r"Purchase Order\s*$", 10),  # 最も重要な特徴
             (r"Supplier:", 5),
             (r"Purchase Order no:?\s*\d+", 5),
@@ -36,27 +137,393 @@ def identify_po_format(ocr_text: str) -> Tuple[str, float]:
             (r"Commodity", 2),
             (r"Grand Total", 2)
         ],
-        "format3": [
+        "fields": {
+            "customer": [
+                r"Buyer:\s*(.*?)(?:\n|$)",
+                r"(?:Buyer|Customer|Client):\s*(.*?)(?:\n|$)"
+            ],
+            "poNumber": [
+                r"Purchase Order no:?\s*(\d+)",
+                r"PO (?:number|no\.?):\s*(\d+)"
+            ],
+            "totalAmount": [
+                r"Grand Total.*?US\$\s*([\d,]+)",
+                r"Total:?\s*US\$\s*([\d,]+)",
+                r"Total Amount:?\s*US\$\s*([\d,]+)"
+            ],
+            "paymentTerms": [
+                r"Payment Terms:\s*(.*?)(?:\n|$)",
+                r"Payment:?\s*(.*?)(?:\n|$)"
+            ],
+            "terms": [
+                r"Incoterms:\s*(.*?)(?:\n|$)",
+                r"(?:Shipping|Delivery) Terms:\s*(.*?)(?:\n|$)"
+            ],
+            "destination": [
+                r"Discharge Port:\s*(.*?)(?:\n|$)",
+                r"(?:Ship to|Destination|Delivery Address):\s*(.*?)(?:\n|$)"
+            ]
+        },
+        "currency": {"pattern": r"(USD|EUR|JPY|CNY)"},
+        # フォーマット2は複数製品の可能性が高いため、表形式の行から抽出する
+        "product_rows": [
+            {
+                "pattern": r"(?<![A-Za-z0-9])([A-Za-z0-9]+)\s+(Product [A-Za-z])\s+([\d,]+)\s*kg\s+US\$?([\d.]+)\s+US\$?([\d,.]+)",
+                "columns": {"name": 2, "quantity": 3, "unitPrice": 4, "amount": 5}
+            },
+            {
+                # 表形式でない場合は製品名の次の行から数量と価格を取る
+                "pattern": r"(Product [A-Za-z])[^\n]*\n[^\n]*?([\d,]+)\s*kg[^\n]*?(US\$[\d.]+)[^\n]*?(US\$[\d,.]+)",
+                "columns": {"name": 1, "quantity": 2, "unitPrice": 3, "amount": 4}
+            }
+        ],
+        "product_fallback": _extract_loose_products
+    },
+    "format3": {
+        "label": "ORDER CONFIMATION",
+        "features": [
             (r"(?:\/\/\/|///)ORDER CONFIMATION(?:\/\/\/|///)", 10),  # 最も重要な特徴
             (r"Contract Party\s*:", 5),
             (r"Order No\.", 5),
             (r"Grade [A-Z]", 3),
-            (r"Qt'y \(mt\)", 3), 
+            (r"Qt'y \(mt\)", 3),
             (r"PORT OF DISCHARGE", 3),
             (r"Payment term", 2),
             (r"TIME OF SHIPMENT", 2),
             (r"PORT OF LOADING", 2)
-        ]
+        ],
+        "fields": {
+            "customer": [
+                r"Contract Party\s*:\s*(.*?)(?:\n|$)",
+                r"B/L CONSIGNEE\s*:\s*(.*?)(?:\n|$)"
+            ],
+            "poNumber": [
+                r"Order No\.\s*(.*?)(?:\n|Grade|Origin)",
+                r"Buyers(?:'|')?\s+Order No\.\s*(.*?)(?:\n|Grade|$)"
+            ],
+            "totalAmount": [
+                r"TOTAL.*?USD\s*([\d,.]+)",
+                r"Total Amount\s*USD\s*([\d,.]+)",
+                r"Total Amount\s*([\d,.]+)"
+            ],
+            "paymentTerms": [
+                r"Payment term\s*\n?\s*(.*?)(?:\n|$)",
+                r"Payment\s*:\s*(.*?)(?:\n|$)"
+            ],
+            "terms": [
+                r"Term\s*(.*?)(?:\n|$)",
+                r"CIF\s+(.*?)(?:\n|PORT)"
+            ],
+            "destination": [
+                r"PORT OF DISCHARGE\s*(.*?)(?:\n|$)",
+                r"PORT OF\s*DISCHARGE\s*(.*?)(?:\n|Payment)"
+            ]
+        },
+        "currency": {"value": "USD"},  # フォーマット3ではUSDが明示的
+        "product": {
+            "name": [r"Grade\s+([A-Za-z0-9]+)"],
+            "quantity": [r"Qt'y\s*\(mt\)\s*([\d.]+)"],
+            "unitPrice": [r"Unit Price\s*\([^)]+\)\s*([\d,.]+)"],
+            "amount": [r"Total Amount\s*([\d,.]+)"]
+        },
+        "name_format": "Grade {}"
     }
-    
-    # 各フォーマットの一致スコアを計算
+}
+
+def _literal_prefix(pattern: str) -> str:
+    """
+    正規表現パターンの先頭にある、一致に必ず含まれる固定文字列を取り出します。
+    トップレベルに選択（|）を含むパターンは先頭が決まらないため空文字列を返します。
+
+    :param pattern: 正規表現パターン
+    :return: 固定文字列（取り出せない場合は空文字列）
+    """
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+            continue
+        if in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            return ""
+        i += 1
+
+    prefix = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            # \s や \d などの文字クラスはここで打ち切り、記号のエスケープだけを固定文字として扱う
+            if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+                break
+            literal, step = pattern[i + 1], 2
+        elif c in _REGEX_META:
+            break
+        else:
+            literal, step = c, 1
+
+        # 直後に量指定子がある文字は省略される可能性がある
+        quantifier = pattern[i + step:i + step + 1]
+        if quantifier in ("?", "*", "{"):
+            break
+        prefix.append(literal)
+        if quantifier == "+":
+            break
+        i += step
+    return "".join(prefix)
+
+class AnchorIndex:
+    """
+    各パターンの先頭の固定文字列（アンカー）がテキストのどこに現れるかを、テキストごとに1回だけ求める索引。
+    パターンはアンカーの出現位置でだけ照合すればよいため、パターンごとにテキスト全体を正規表現で検索せずに済みます。
+    走査はアンカーごとに str.find でテキストを1回ずつ読むため、計算量は O(アンカー数 × テキスト長) です。
+    """
+
+    def __init__(self, literals: List[str]):
+        # 他のアンカーを接頭辞に持つものは短い方にまとめる（アンカー数＝走査の回数を減らす）。
+        # これで同じ位置に一致するアンカーは高々1つになり、代替の正規表現でも1回の走査ですべての出現位置が取れる
+        self.anchors: List[str] = []
+        self._ids: Dict[str, int] = {}
+        for literal in sorted({literal.lower() for literal in literals}, key=len):
+            base = next((i for i, anchor in enumerate(self.anchors) if literal.startswith(anchor)), None)
+            if base is None:
+                base = len(self.anchors)
+                self.anchors.append(literal)
+            self._ids[literal] = base
+
+        self._regex = None
+        self._last: Optional[Tuple[str, List[List[int]]]] = None
+        if self.anchors:
+            alternation = "|".join(f"({re.escape(anchor)})" for anchor in self.anchors)
+            self._regex = re.compile(f"(?=(?:{alternation}))", re.IGNORECASE)
+
+    def anchor_id(self, literal: str) -> int:
+        """
+        固定文字列に対応するアンカーの番号を返します
+        """
+        return self._ids[literal.lower()]
+
+    def scan(self, text: str) -> List[List[int]]:
+        """
+        アンカーごとの出現位置を求めます
+
+        :param text: 対象テキスト
+        :return: アンカー番号ごとの出現位置のリスト
+        """
+        # フォーマット判定と抽出で同じテキストを続けて走査しないよう、直前の結果を使い回す
+        last = self._last
+        if last is not None and last[0] is text:
+            return last[1]
+
+        # アンカーごとにテキストを読み直すが、小文字化したテキストに対する str.find の方が
+        # すべてのアンカーをまとめた正規表現で1回走査するより大幅に速い。
+        # re.IGNORECASE は "ı" を "i"、"ſ" を "s" と同一視するため、小文字化の際に揃えておく
+        lowered = text.lower().translate(_ANCHOR_CASE_FIXES)
+        if len(lowered) == len(text):
+            positions = []
+            for anchor in self.anchors:
+                found = []
+                pos = lowered.find(anchor)
+                while pos >= 0:
+                    found.append(pos)
+                    pos = lowered.find(anchor, pos + 1)
+                positions.append(found)
+        else:
+            # 小文字化で文字数が変わる文字（"İ" など）を含む場合は、位置がずれるため正規表現で走査する
+            positions = [[] for _ in self.anchors]
+            if self._regex is not None:
+                for match in self._regex.finditer(text):
+                    positions[match.lastindex - 1].append(match.start())
+        self._last = (text, positions)
+        return positions
+
+class AnchoredPattern:
+    """
+    アンカー索引を使って照合する正規表現パターン。アンカーがあれば、その出現位置でだけ照合します。
+    """
+
+    def __init__(self, pattern: str, flags: int = FIELD_FLAGS):
+        self.pattern = pattern
+        self.regex = re.compile(pattern, flags)
+        literal = _literal_prefix(pattern)
+        self.literal = literal if len(literal) >= MIN_ANCHOR_LENGTH else ""
+        self.anchor: Optional[int] = None
+
+    def search(self, text: str, positions: List[List[int]]) -> Optional[re.Match]:
+        """
+        re.search と同じく、テキスト中で最も左にある一致を返します
+
+        :param text: 対象テキスト
+        :param positions: AnchorIndex.scan の結果
+        :return: 一致（なければNone）
+        """
+        if self.anchor is None:
+            return self.regex.search(text)
+        for pos in positions[self.anchor]:
+            match = self.regex.match(text, pos)
+            if match:
+                return match
+        return None
+
+def _extract_field(text: str, positions: List[List[int]], patterns: List[AnchoredPattern]) -> str:
+    """
+    パターンを先頭から順に試し、最初に取れた値を返します（extract_field_by_regex と同じ規則）
+    """
+    for field_pattern in patterns:
+        match = field_pattern.search(text, positions)
+        if match and match.group(1).strip():
+            return _clean_value(match.group(1))
+    return ""
+
+class CompiledFormat:
+    """
+    FORMAT_SPECS の1フォーマット分をコンパイルしたもの
+    """
+
+    def __init__(self, name: str, spec: Dict[str, Any]):
+        self.name = name
+        self.label = spec.get("label", name)
+        self.features = [(AnchoredPattern(pattern, re.IGNORECASE), weight) for pattern, weight in spec.get("features", [])]
+        self.total_weight = sum(weight for _, weight in self.features)
+        self.fields = {field: [AnchoredPattern(p) for p in patterns] for field, patterns in spec.get("fields", {}).items()}
+        self.currency_pattern = re.compile(spec["currency"]["pattern"]) if "pattern" in spec.get("currency", {}) else None
+        self.currency_value = spec.get("currency", {}).get("value", "")
+        self.product = {field: [AnchoredPattern(p) for p in patterns] for field, patterns in spec.get("product", {}).items()}
+        self.name_format = spec.get("name_format", "{}")
+        self.product_rows = [(re.compile(row["pattern"]), row["columns"]) for row in spec.get("product_rows", [])]
+        self.product_fallback: Optional[Callable[[str], List[Dict[str, str]]]] = spec.get("product_fallback")
+
+    def anchored_patterns(self) -> List[AnchoredPattern]:
+        """
+        アンカー索引の対象になる特徴パターンと項目パターンをすべて返します
+        """
+        patterns = [p for p, _ in self.features]
+        patterns.extend(p for field in self.fields.values() for p in field)
+        patterns.extend(p for field in self.product.values() for p in field)
+        return patterns
+
+    def extract(self, ocr_text: str, positions: Optional[List[List[int]]] = None) -> Dict[str, Any]:
+        """
+        テキストからこのフォーマットの項目を抽出します
+
+        :param ocr_text: OCRで抽出したテキスト
+        :param positions: AnchorIndex.scan の結果（省略時はここで走査する）
+        :return: 構造化されたデータ
+        """
+        if positions is None:
+            positions = _anchor_index.scan(ocr_text)
+
+        result = {
+            "customer": "",
+            "poNumber": "",
+            "currency": self.currency_value,
+            "products": [],
+            "totalAmount": "",
+            "paymentTerms": "",
+            "terms": "",
+            "destination": ""
+        }
+        for field, patterns in self.fields.items():
+            result[field] = _extract_field(ocr_text, positions, patterns)
+
+        if self.currency_pattern is not None:
+            currency_match = self.currency_pattern.search(ocr_text)
+            if currency_match:
+                result["currency"] = currency_match.group(1)
+
+        # 表形式の製品行
+        for row_regex, columns in self.product_rows:
+            for match in row_regex.finditer(ocr_text):
+                result["products"].append({
+                    field: match.group(group).replace("US$", "").strip() for field, group in columns.items()
+                })
+            if result["products"]:
+                break
+
+        # 単一製品の項目
+        if self.product:
+            product = {field: _extract_field(ocr_text, positions, patterns) for field, patterns in self.product.items()}
+            if product.get("name"):
+                product["name"] = self.name_format.format(product["name"])
+                result["products"].append(product)
+
+        if not result["products"] and self.product_fallback is not None:
+            result["products"].extend(self.product_fallback(ocr_text))
+
+        return result
+
+# コンパイル済みのフォーマット定義と、全フォーマット共通のアンカー索引
+_compiled_formats: Dict[str, CompiledFormat] = {}
+_anchor_index = AnchorIndex([])
+
+def compile_format_specs():
+    """
+    FORMAT_SPECS をコンパイルし、全フォーマット共通のアンカー索引を作り直します。
+    モジュール読み込み時に実行されます。実行中に FORMAT_SPECS を変更した場合は再度呼び出してください。
+    """
+    global _compiled_formats, _anchor_index
+    compiled = {name: CompiledFormat(name, spec) for name, spec in FORMAT_SPECS.items()}
+    patterns = [p for fmt in compiled.values() for p in fmt.anchored_patterns()]
+    index = AnchorIndex([p.literal for p in patterns if p.literal])
+    for p in patterns:
+        p.anchor = index.anchor_id(p.literal) if p.literal else None
+    _compiled_formats, _anchor_index = compiled, index
+    logger.debug(f"POフォーマット定義をコンパイル: {list(compiled)}, アンカー数: {len(index.anchors)}")
+
+def get_format_label(format_name: str) -> str:
+    """
+    フォーマットの表示名を返します
+    """
+    fmt = _compiled_formats.get(format_name)
+    return fmt.label if fmt else format_name
+
+def _feature_scores(ocr_text: str) -> Dict[str, int]:
+    """
+    全フォーマットの特徴パターンの一致スコアを求めます。
+    アンカー索引の走査は1回だけで、各パターンはアンカーの出現位置でだけ照合します。
+    """
+    positions = _anchor_index.scan(ocr_text)
     format_scores = {}
-    for format_name, features in format_features.items():
+    for format_name, fmt in _compiled_formats.items():
         score = 0
-        for pattern, weight in features:
-            if re.search(pattern, ocr_text, re.IGNORECASE):
+        for feature, weight in fmt.features:
+            if feature.search(ocr_text, positions) is not None:
                 score += weight
         format_scores[format_name] = score
+    return format_scores
+
+def score_po_formats(ocr_text: str) -> Dict[str, float]:
+    """
+    登録されているすべてのPOフォーマットについて、テキストとの一致度を求めます
+    
+    :param ocr_text: OCRで抽出したテキスト
+    :return: フォーマット名ごとの信頼度（0〜1）
+    """
+    format_scores = _feature_scores(ocr_text)
+    return {
+        format_name: format_scores[format_name] / fmt.total_weight if fmt.total_weight > 0 else 0.0
+        for format_name, fmt in _compiled_formats.items()
+    }
+
+def identify_po_format(ocr_text: str) -> Tuple[str, float]:
+    """
+    OCRで抽出したテキストからPOフォーマットを識別します
+    
+    :param ocr_text: OCRで抽出したテキスト
+    :return: (フォーマット名, 信頼度)
+    """
+    # 各フォーマットの一致スコアを計算
+    format_scores = _feature_scores(ocr_text)
     
     # 最も高いスコアのフォーマットを選択
     if all(score == 0 for score in format_scores.values()):
@@ -64,8 +531,8 @@ def identify_po_format(ocr_text: str) -> Tuple[str, float]:
         return "unknown", 0.0
     
     # 合計スコアを計算して信頼度を算出
-    total_possible_score = sum(weight for _, weight in format_features[max(format_scores, key=format_scores.get)])
     best_format = max(format_scores, key=format_scores.get)
+    total_possible_score = _compiled_formats[best_format].total_weight
     confidence = format_scores[best_format] / total_possible_score if total_possible_score > 0 else 0
     
     logger.info(f"識別したPOフォーマット: {best_format}, 信頼度: {confidence:.2f}, スコア: {format_scores}")
@@ -81,14 +548,22 @@ def extract_field_by_regex(ocr_text: str, patterns: List[str], default_value: st
     :return: 抽出された値または空文字列
     """
     for pattern in patterns:
-        match = re.search(pattern, ocr_text, re.IGNORECASE | re.MULTILINE)
+        match = re.search(pattern, ocr_text, FIELD_FLAGS)
         if match and match.group(1).strip():
-            value = match.group(1).strip()
             # 余計な記号を削除
-            value = re.sub(r'^[:\s]+|[:\s]+$', '', value)
-            return value
+            return _clean_value(match.group(1))
     return default_value
 
+def extract_format_data(format_name: str, ocr_text: str) -> Dict[str, Any]:
+    """
+    FORMAT_SPECS に定義したフォーマットでデータを抽出します
+
+    :param format_name: フォーマット名
+    :param ocr_text: OCRで抽出したテキスト
+    :return: 構造化されたデータ
+    """
+    return _compiled_formats[format_name].extract(ocr_text)
+
 def extract_format1_data(ocr_text: str) -> Dict[str, Any]:
     """
     フォーマット1（Buyer's Info）からデータを抽出します
@@ -96,91 +571,7 @@ def extract_format1_data(ocr_text: str) -> Dict[str, Any]:
     :param ocr_text: OCRで抽出したテキスト
     :return: 構造化されたデータ
     """
-    result = {
-        "customer": "",
-        "poNumber": "",
-        "currency": "",
-        "products": [],
-        "totalAmount": "",
-        "paymentTerms": "",
-        "terms": "",
-        "destination": ""
-    }
-    
-    # 顧客名の抽出
-    result["customer"] = extract_field_by_regex(ocr_text, [
-        r"ABC Company\s*(.*?)(?:\n|$)",
-        r"\(Buyer(?:'|')s Info\).*?([A-Za-z0-9\s]+Company)"
-    ])
-    
-    # PO番号の抽出
-    result["poNumber"] = extract_field_by_regex(ocr_text, [
-        r"Purchase Order(?::|Order|Number)?:?\s*(\d+)",
-        r"(?:PO|Order)(?:\s+No)?\.?:?\s*(\d+)"
-    ])
-    
-    # 通貨の抽出
-    currency_match = re.search(r"(USD|EUR|JPY|CNY)", ocr_text)
-    if currency_match:
-        result["currency"] = currency_match.group(1)
-    
-    # 製品情報の抽出
-    product_name = extract_field_by_regex(ocr_text, [
-        r"Item:\s*(.*?)(?:\n|$)",
-        r"Product:?\s*(.*?)(?:\n|Quantity)"
-    ])
-    
-    quantity = extract_field_by_regex(ocr_text, [
-        r"Quantity:\s*([\d,.]+)\s*(?:KG|kg|MT|mt)",
-        r"Qty:?\s*([\d,.]+)\s*(?:KG|kg|MT|mt)"
-    ])
-    
-    unit_price = extract_field_by_regex(ocr_text, [
-        r"Unit Price:\s*\$?\s*([\d,.]+)",
-        r"Unit Price:.*?per\s*.*?\$?\s*([\d,.]+)"
-    ])
-    
-    amount = extract_field_by_regex(ocr_text, [
-        r"EXT Price:\s*([\d,.]+)",
-        r"Amount:\s*([\d,.]+)"
-    ])
-    
-    if product_name:
-        result["products"].append({
-            "name": product_name,
-            "quantity": quantity,
-            "unitPrice": unit_price,
-            "amount": amount
-        })
-    
-    # 合計金額の抽出
-    result["totalAmount"] = extract_field_by_regex(ocr_text, [
-        r"TOTAL\s*([\d,.]+)",
-        r"Total:?\s*([\d,.]+)"
-    ])
-    
-    # 支払条件の抽出
-    result["paymentTerms"] = extract_field_by_regex(ocr_text, [
-        r"Terms:\s*(.*?)(?:\n|$)",
-        r"Payment terms?:?\s*(.*?)(?:\n|$)",
-        r"Net Due within\s*(.*?)(?:\n|$)"
-    ])
-    
-    # 出荷条件の抽出
-    result["terms"] = extract_field_by_regex(ocr_text, [
-        r"Inco Terms:\s*(.*?)(?:\n|$)",
-        r"Shipping Terms:\s*(.*?)(?:\n|$)",
-        r"Delivery Terms:\s*(.*?)(?:\n|$)"
-    ])
-    
-    # 配送先の抽出
-    result["destination"] = extract_field_by_regex(ocr_text, [
-        r"Ship to:\s*(.*?)(?:\n|$)",
-        r"Destination:\s*(.*?)(?:\n|$)",
-        r"Delivery Address:\s*(.*?)(?:\n|$)"
-    ])
-    
-    return result
+    return extract_format_data("format1", ocr_text)
 
 def extract_format2_data(ocr_text: str) -> Dict[str, Any]:
     """
@@ -189,101 +580,7 @@ def extract_format2_data(ocr_text: str) -> Dict[str, Any]:
     :param ocr_text: OCRで抽出したテキスト
     :return: 構造化されたデータ
     """
-    result = {
-        "customer": "",
-        "poNumber": "",
-        "currency": "",
-        "products": [],
-        "totalAmount": "",
-        "paymentTerms": "",
-        "terms": "",
-        "destination": ""
-    }
-    
-    # 顧客名（購入者）の抽出
-    result["customer"] = extract_field_by_regex(ocr_text, [
-        r"Buyer:\s*(.*?)(?:\n|$)",
-        r"(?:Buyer|Customer|Client):\s*(.*?)(?:\n|$)"
-    ])
-    
-    # PO番号の抽出
-    result["poNumber"] = extract_field_by_regex(ocr_text, [
-        r"Purchase Order no:?\s*(\d+)",
-        r"PO (?:number|no\.?):\s*(\d+)"
-    ])
-    
-    # 通貨の抽出
-    currency_match = re.search(r"(USD|EUR|JPY|CNY)", ocr_text)
-    if currency_match:
-        result["currency"] = currency_match.group(1)
-    
-    # 製品情報の抽出 - フォーマット2は複数製品の可能性が高い
-    # 表形式データの抽出
-    product_rows = re.findall(r"([A-Za-z0-9]+)\s+(Product [A-Za-z])\s+([\d,]+)\s*kg\s+US\$?([\d.]+)\s+US\$?([\d,.]+)", ocr_text)
-    
-    if product_rows:
-        for _, name, quantity, unit_price, amount in product_rows:
-            result["products"].append({
-                "name": name.strip(),
-                "quantity": quantity.strip(),
-                "unitPrice": unit_price.strip(),
-                "amount": amount.strip()
-            })
-    else:
-        # 表形式でない場合は別の方法で抽出
-        product_sections = re.findall(r"(Product [A-Za-z])[^\n]*\n[^\n]*?([\d,]+)\s*kg[^\n]*?(US\$[\d.]+)[^\n]*?(US\$[\d,.]+)", ocr_text)
-        
-        for name, quantity, unit_price, amount in product_sections:
-            result["products"].append({
-                "name": name.strip(),
-                "quantity": quantity.strip(),
-                "unitPrice": unit_price.replace("US$", "").strip(),
-                "amount": amount.replace("US$", "").strip()
-            })
-    
-    # 製品情報が抽出できない場合のフォールバック
-    if not result["products"]:
-        # 基本的な製品名、数量、価格の抽出
-        product_names = re.findall(r"Product ([A-Z])", ocr_text)
-        quantities = re.findall(r"([\d,]+)\s*kg", ocr_text)
-        prices = re.findall(r"US\$([\d,.]+)", ocr_text)
-        
-        # 抽出できた情報から製品を構成
-        for i, name in enumerate(product_names):
-            if i < len(quantities) and i*2+1 < len(prices):
-                result["products"].append({
-                    "name": f"Product {name}",
-                    "quantity": quantities[i],
-                    "unitPrice": prices[i*2] if i*2 < len(prices) else "",
-                    "amount": prices[i*2+1] if i*2+1 < len(prices) else ""
-                })
-    
-    # 合計金額の抽出
-    result["totalAmount"] = extract_field_by_regex(ocr_text, [
-        r"Grand Total.*?US\$\s*([\d,]+)",
-        r"Total:?\s*US\$\s*([\d,]+)",
-        r"Total Amount:?\s*US\$\s*([\d,]+)"
-    ])
-    
-    # 支払条件の抽出
-    result["paymentTerms"] = extract_field_by_regex(ocr_text, [
-        r"Payment Terms:\s*(.*?)(?:\n|$)",
-        r"Payment:?\s*(.*?)(?:\n|$)"
-    ])
-    
-    # 出荷条件の抽出
-    result["terms"] = extract_field_by_regex(ocr_text, [
-        r"Incoterms:\s*(.*?)(?:\n|$)",
-        r"(?:Shipping|Delivery) Terms:\s*(.*?)(?:\n|$)"
-    ])
-    
-    # 配送先の抽出
-    result["destination"] = extract_field_by_regex(ocr_text, [
-        r"Discharge Port:\s*(.*?)(?:\n|$)",
-        r"(?:Ship to|Destination|Delivery Address):\s*(.*?)(?:\n|$)"
-    ])
-    
-    return result
+    return extract_format_data("format2", ocr_text)
 
 def extract_format3_data(ocr_text: str) -> Dict[str, Any]:
     """
@@ -292,78 +589,117 @@ def extract_format3_data(ocr_text: str) -> Dict[str, Any]:
     :param ocr_text: OCRで抽出したテキスト
     :return: 構造化されたデータ
     """
-    result = {
-        "customer": "",
-        "poNumber": "",
-        "currency": "",
-        "products": [],
-        "totalAmount": "",
-        "paymentTerms": "",
-        "terms": "",
-        "destination": ""
-    }
-    
-    # 顧客名の抽出
-    result["customer"] = extract_field_by_regex(ocr_text, [
-        r"Contract Party\s*:\s*(.*?)(?:\n|$)",
-        r"B/L CONSIGNEE\s*:\s*(.*?)(?:\n|$)"
-    ])
-    
-    # PO番号の抽出
-    result["poNumber"] = extract_field_by_regex(ocr_text, [
-        r"Order No\.\s*(.*?)(?:\n|Grade|Origin)",
-        r"Buyers(?:'|')?\s+Order No\.\s*(.*?)(?:\n|Grade|$)"
-    ])
-    
-    # 通貨の抽出
-    result["currency"] = "USD"  # フォーマット3ではUSDが明示的
-    
-    # 製品情報の抽出
-    grade = extract_field_by_regex(ocr_text, [r"Grade\s+([A-Za-z0-9]+)"])
-    quantity = extract_field_by_regex(ocr_text, [r"Qt'y\s*\(mt\)\s*([\d.]+)"])
-    unit_price = extract_field_by_regex(ocr_text, [r"Unit Price\s*\([^)]+\)\s*([\d,.]+)"])
-    amount = extract_field_by_regex(ocr_text, [r"Total Amount\s*([\d,.]+)"])
-    
-    if grade:
-        result["products"].append({
-            "name": f"Grade {grade}",
-            "quantity": quantity,
-            "unitPrice": unit_price,
-            "amount": amount
+    return extract_format_data("format3", ocr_text)
+
+compile_format_specs()
+
+# 汎用抽出で1行として扱う最大文字数（これより長い行は折り返して、行単位のパターンの探索範囲を抑える）
+GENERIC_MAX_LINE_CHARS = 500
+
+# 製品見出しの後ろで数量・単価・金額を探す範囲（行数と文字数）
+PRODUCT_SECTION_MAX_LINES = 6
+PRODUCT_SECTION_MAX_CHARS = 2000
+
+# 表形式の製品行（行頭の品番から金額まで）
+_GENERIC_PRODUCT_ROW = re.compile(r"(?<![A-Za-z0-9])([A-Za-z0-9]+)\s+(Product [A-Za-z]|Grade [A-Za-z0-9]+)\s+([\d,]+)\s*(?:kg|mt)\s+(?:US\$)?([\d.]+)\s+(?:US\$)?([\d,.]+)")
+
+# セクション形式の製品見出し・数量・価格
+_PRODUCT_HEAD = re.compile(r"Product ([A-Za-z])\b|Grade ([A-Za-z0-9]+)|Item:")
+_PRODUCT_QUANTITY = re.compile(r"(?<![\d,])(\d[\d,]*)\s*(?:kg|mt|KG|MT)\b")
+_PRODUCT_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+class ExtractionDeadline:
+    """
+    1文書あたりの抽出時間の上限
+    """
+
+    def __init__(self, budget_ms: Optional[int]):
+        self._end = time.monotonic() + budget_ms / 1000 if budget_ms else None
+
+    def expired(self) -> bool:
+        return self._end is not None and time.monotonic() > self._end
+
+def _bound_line_length(text: str, max_chars: int = GENERIC_MAX_LINE_CHARS) -> str:
+    """
+    長すぎる行を max_chars 文字ごとに折り返します。
+    行単位のパターン（.*? が改行で止まるもの）の探索範囲が行の長さで抑えられるようにします。
+    """
+    lines = text.split("\n")
+    if all(len(line) <= max_chars for line in lines):
+        return text
+    wrapped = []
+    for line in lines:
+        if len(line) <= max_chars:
+            wrapped.append(line)
+        else:
+            wrapped.extend(line[i:i + max_chars] for i in range(0, len(line), max_chars))
+    return "\n".join(wrapped)
+
+def _section_end(text: str, start: int) -> int:
+    """
+    製品見出しの後ろで数量・価格を探す範囲の終端位置を返します
+    """
+    limit = min(len(text), start + PRODUCT_SECTION_MAX_CHARS)
+    end = start
+    for _ in range(PRODUCT_SECTION_MAX_LINES):
+        end = text.find("\n", end, limit)
+        if end < 0:
+            return limit
+        end += 1
+    return end
+
+def _scan_product_sections(ocr_text: str, deadline: ExtractionDeadline) -> List[Dict[str, str]]:
+    """
+    製品見出し（Product X / Grade X / Item:）ごとに、直後の数行から数量・単価・金額を順に拾います。
+    探索範囲を見出しの後ろの数行に限るため、処理時間はテキスト長に比例します。
+
+    :param ocr_text: OCRで抽出したテキスト
+    :param deadline: 抽出時間の上限
+    :return: 製品情報のリスト
+    """
+    products = []
+    pos = 0
+    while not deadline.expired():
+        head = _PRODUCT_HEAD.search(ocr_text, pos)
+        if not head:
+            break
+        pos = head.end()
+        section_end = _section_end(ocr_text, head.end())
+
+        quantity = _PRODUCT_QUANTITY.search(ocr_text, head.end(), section_end)
+        if not quantity:
+            continue
+        prices = []
+        for number in _PRODUCT_NUMBER.finditer(ocr_text, quantity.end(), section_end):
+            prices.append(number.group(0))
+            if len(prices) == 2:
+                pos = number.end()
+                break
+        if len(prices) < 2:
+            continue
+
+        if head.group(1):
+            name = f"Product {head.group(1)}"
+        elif head.group(2):
+            name = f"Grade {head.group(2)}"
+        else:
+            line_end = ocr_text.find("\n", head.end())
+            name = ocr_text[head.end():line_end if line_end >= 0 else len(ocr_text)].strip()
+        products.append({
+            "name": name or f"Unknown Product {len(products)+1}",
+            "quantity": quantity.group(1),
+            "unitPrice": prices[0],
+            "amount": prices[1]
         })
-    
-    # 合計金額の抽出
-    result["totalAmount"] = extract_field_by_regex(ocr_text, [
-        r"TOTAL.*?USD\s*([\d,.]+)",
-        r"Total Amount\s*USD\s*([\d,.]+)",
-        r"Total Amount\s*([\d,.]+)"
-    ])
-    
-    # 支払条件の抽出
-    result["paymentTerms"] = extract_field_by_regex(ocr_text, [
-        r"Payment term\s*\n?\s*(.*?)(?:\n|$)",
-        r"Payment\s*:\s*(.*?)(?:\n|$)"
-    ])
-    
-    # 出荷条件の抽出
-    result["terms"] = extract_field_by_regex(ocr_text, [
-        r"Term\s*(.*?)(?:\n|$)",
-        r"CIF\s+(.*?)(?:\n|PORT)"
-    ])
-    
-    # 配送先の抽出
-    result["destination"] = extract_field_by_regex(ocr_text, [
-        r"PORT OF DISCHARGE\s*(.*?)(?:\n|$)",
-        r"PORT OF\s*DISCHARGE\s*(.*?)(?:\n|Payment)"
-    ])
-    
-    return result
+    return products
 
-def extract_generic_data(ocr_text: str) -> Dict[str, Any]:
+def extract_generic_data(ocr_text: str, time_budget_ms: Optional[int] = None) -> Dict[str, Any]:
     """
-    一般的なPOフォーマットからデータを抽出します（フォーマットが特定できない場合）
+    一般的なPOフォーマットからデータを抽出します（フォーマットが特定できない場合）。
+    time_budget_ms を超えた場合は、その時点までに抽出できた項目だけを返します。
     
     :param ocr_text: OCRで抽出したテキスト
+    :param time_budget_ms: 1文書あたりの抽出時間の上限（ミリ秒、Noneなら無制限）
     :return: 構造化されたデータ
     """
     result = {
@@ -376,6 +712,8 @@ def extract_generic_data(ocr_text: str) -> Dict[str, Any]:
         "terms": "",
         "destination": ""
     }
+    deadline = ExtractionDeadline(time_budget_ms)
+    ocr_text = _bound_line_length(ocr_text)
     
     # 顧客名を抽出する複数の方法を試す
     customer_patterns = [
@@ -384,7 +722,7 @@ def extract_generic_data(ocr_text: str) -> Dict[str, Any]:
         r"Contract Party\s*:\s*(.*?)(?:\n|$)",
         r"B/L CONSIGNEE\s*:\s*(.*?)(?:\n|$)",
         r"ABC Company\s*(.*?)(?:\n|$)",
-        r"\(Buyer(?:'|')s Info\).*?([A-Za-z0-9\s]+Company)"
+        r"\(Buyer(?:'|')s Info\)[^\n]*?\n?[ \t]*([A-Za-z0-9 \t]+Company)"
     ]
     result["customer"] = extract_field_by_regex(ocr_text, customer_patterns)
     
@@ -402,49 +740,26 @@ def extract_generic_data(ocr_text: str) -> Dict[str, Any]:
     if currency_match:
         result["currency"] = currency_match.group(1)
     
-    # 製品情報の抽出（複数の方法を試す）
-    product_extracted = False
+    if deadline.expired():
+        logger.warning("汎用抽出が時間の上限に達したため、製品情報以降の抽出を省略します")
+        return result
     
+    # 製品情報の抽出（複数の方法を試す）
     # 方法1: 表形式データからの抽出
-    product_rows = re.findall(r"([A-Za-z0-9]+)\s+(Product [A-Za-z]|Grade [A-Za-z0-9]+)\s+([\d,]+)\s*(?:kg|mt)\s+(?:US\$)?([\d.]+)\s+(?:US\$)?([\d,.]+)", ocr_text)
-    if product_rows:
-        for _, name, quantity, unit_price, amount in product_rows:
-            result["products"].append({
-                "name": name.strip(),
-                "quantity": quantity.strip(),
-                "unitPrice": unit_price.strip(),
-                "amount": amount.strip()
-            })
-        product_extracted = True
+    for _, name, quantity, unit_price, amount in _GENERIC_PRODUCT_ROW.findall(ocr_text):
+        result["products"].append({
+            "name": name.strip(),
+            "quantity": quantity.strip(),
+            "unitPrice": unit_price.strip(),
+            "amount": amount.strip()
+        })
     
     # 方法2: セクション形式からの抽出
-    if not product_extracted:
-        product_sections = re.findall(r"(?:Product [A-Za-z]|Grade [A-Za-z0-9]+|Item:.*?).*?(\d+)(?:\s*|\n+)(?:kg|mt|KG|MT).*?(?:US\$|Unit Price:?\s*\$?)?\s*([\d,.]+).*?(?:US\$)?\s*([\d,.]+)", ocr_text, re.DOTALL)
-        if product_sections:
-            for i, (quantity, unit_price, amount) in enumerate(product_sections):
-                # 製品名の抽出を試みる
-                product_name = ""
-                name_match = re.search(r"(?:Product ([A-Z])|Grade ([A-Za-z0-9]+)|Item:\s*(.*?)(?:\n|$))", ocr_text)
-                if name_match:
-                    if name_match.group(1):
-                        product_name = f"Product {name_match.group(1)}"
-                    elif name_match.group(2):
-                        product_name = f"Grade {name_match.group(2)}"
-                    elif name_match.group(3):
-                        product_name = name_match.group(3)
-                else:
-                    product_name = f"Unknown Product {i+1}"
-                
-                result["products"].append({
-                    "name": product_name,
-                    "quantity": quantity.strip(),
-                    "unitPrice": unit_price.strip(),
-                    "amount": amount.strip()
-                })
-            product_extracted = True
+    if not result["products"]:
+        result["products"] = _scan_product_sections(ocr_text, deadline)
     
     # 方法3: 個別フィールドからの抽出
-    if not product_extracted:
+    if not result["products"] and not deadline.expired():
         product_name = extract_field_by_regex(ocr_text, [
             r"Item:\s*(.*?)(?:\n|$)",
             r"Product:?\s*(.*?)(?:\n|Quantity)",
@@ -477,6 +792,10 @@ def extract_generic_data(ocr_text: str) -> Dict[str, Any]:
                 "amount": amount
             })
     
+    if deadline.expired():
+        logger.warning("汎用抽出が時間の上限に達したため、合計金額以降の抽出を省略します")
+        return result
+    
     # 合計金額の抽出
     total_patterns = [
         r"(?:TOTAL|Total|Grand Total).*?(?:USD|US\$)?\s*([\d,.]+)",
@@ -507,4 +826,4 @@ def extract_generic_data(ocr_text: str) -> Dict[str, Any]:
     ]
     result["destination"] = extract_field_by_regex(ocr_text, destination_patterns)
     
-    return result
\ No newline at end of file
+    return result
@@ -0,0 +1,129 @@
+# ocr_progress.py - OCRジョブの進捗通知
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, Optional, Set
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# 処理が終了したことを表すステータス
+TERMINAL_STATUSES = ("completed", "failed")
+
+# 進捗イベントの送り先（ワーカープロセスと親プロセスで共有する multiprocessing.Queue）
+_sink = None
+
+def set_progress_sink(queue):
+    """
+    進捗イベントの送り先を設定します（ワーカープロセスの起動時と、プール起動時の親プロセスで呼び出す）
+    """
+    global _sink
+    _sink = queue
+
+def make_progress_event(ocr_id: int, status: str, pages_done: Optional[int] = None, page_count: Optional[int] = None) -> Dict[str, Any]:
+    """
+    進捗イベントを作成します（APIレスポンスと同じキー名を使う）
+    """
+    return {"ocrId": ocr_id, "status": status, "pagesDone": pages_done, "pageCount": page_count}
+
+def report_progress(ocr_id: int, status: str, pages_done: Optional[int] = None, page_count: Optional[int] = None):
+    """
+    OCRジョブの進捗を通知します。送り先がない場合や送信に失敗した場合は何もしません
+    （進捗はDBにも保存されるため、通知の欠落はストリーム側の定期確認で補われる）。
+
+    :param ocr_id: OCR結果のID
+    :param status: 処理状態
+    :param pages_done: 処理済みのページ数
+    :param page_count: 総ページ数
+    """
+    if _sink is None:
+        return
+    try:
+        _sink.put_nowait(make_progress_event(ocr_id, status, pages_done, page_count))
+    except Exception as e:
+        logger.debug(f"進捗通知に失敗しました: ID={ocr_id}, {str(e)}")
+
+class ProgressBroker:
+    """
+    ワーカープロセスから届いた進捗イベントを、イベントループ上でOCR IDごとの購読者に配信します
+    """
+
+    def __init__(self, subscriber_queue_size: int = 100):
+        self._subscriber_queue_size = subscriber_queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._source = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, loop: asyncio.AbstractEventLoop, source):
+        """
+        進捗イベントの受信スレッドを起動します
+
+        :param loop: 購読者がいるイベントループ
+        :param source: ワーカーと共有する multiprocessing.Queue
+        """
+        if self._thread is not None:
+            return
+        self._loop = loop
+        self._source = source
+        self._thread = threading.Thread(target=self._listen, name="ocr-progress-listener", daemon=True)
+        self._thread.start()
+        logger.info("OCR進捗の受信スレッド起動")
+
+    def stop(self):
+        """
+        受信スレッドを停止します
+        """
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        # 受信スレッドはブロッキングで待っているため、終了用の値を送って抜けさせる
+        self._source.put(None)
+        thread.join(timeout=5)
+        logger.info("OCR進捗の受信スレッド停止")
+
+    def _listen(self):
+        while True:
+            try:
+                event = self._source.get()
+            except (EOFError, OSError):
+                break
+            if event is None:
+                break
+            try:
+                self._loop.call_soon_threadsafe(self._publish, event)
+            except RuntimeError:
+                # イベントループが既に閉じている
+                break
+
+    def _publish(self, event: Dict[str, Any]):
+        for queue in self._subscribers.get(event["ocrId"], ()):
+            if queue.full():
+                # 遅い購読者は古いイベントを捨てる（最新の状態だけ届けば十分）
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def subscribe(self, ocr_id: int) -> asyncio.Queue:
+        """
+        OCR IDの進捗イベントを購読します（イベントループ上で呼び出す）
+
+        :param ocr_id: OCR結果のID
+        :return: 進捗イベントが届くキュー
+        """
+        queue = asyncio.Queue(maxsize=self._subscriber_queue_size)
+        self._subscribers.setdefault(ocr_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, ocr_id: int, queue: asyncio.Queue):
+        """
+        購読を解除します
+        """
+        subscribers = self._subscribers.get(ocr_id)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[ocr_id]
+
+# アプリケーションで共有するブローカー
+progress_broker = ProgressBroker()
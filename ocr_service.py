@@ -2,20 +2,371 @@
 import os
 import re
 import json
-from typing import Dict, Any, Tuple, List
+import time
+import zlib
+import tempfile
+import subprocess
+from collections import deque
+from typing import Dict, Any, Tuple, List, Optional, Callable
 import logging
-import pytesseract
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
 import models
-from ocr_extractors import identify_po_format, extract_format1_data, extract_format2_data, extract_format3_data, extract_generic_data
+import config
+from ocr_engine import get_ocr_engine
+from ocr_progress import report_progress
+from image_preprocess import choose_pdf_dpi, preprocess_page_image, load_photo_for_ocr
+from ocr_extractors import EXTRACTOR_VERSION, FORMAT_SPECS, FORMAT_MIN_CONFIDENCE, identify_po_format, score_po_formats, get_format_label, extract_format_data, extract_generic_data
 
 # ロギング設定
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+def extract_pdf_text_layer(file_path: str, page_number: int) -> str:
+    """
+    poppler（pdftotext）でPDFの1ページに埋め込まれたテキストレイヤーを取得します
+    
+    :param file_path: PDFファイルのパス
+    :param page_number: ページ番号（1始まり）
+    :return: テキストレイヤーの内容（取得できない場合は空文字列）
+    """
+    try:
+        completed = subprocess.run(
+            ["pdftotext", "-f", str(page_number), "-l", str(page_number), "-layout", "-enc", "UTF-8", file_path, "-"],
+            capture_output=True,
+            timeout=config.OCR_TEXT_LAYER_TIMEOUT
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"テキストレイヤー取得エラー: ページ {page_number}, {str(e)}")
+        return ""
+    
+    if completed.returncode != 0:
+        return ""
+    return completed.stdout.decode("utf-8", errors="replace")
+
+def has_usable_text_layer(text: str) -> bool:
+    """
+    テキストレイヤーがOCRの代わりに使える内容かどうかを判定します
+    
+    :param text: テキストレイヤーの内容
+    :return: 使用可能な場合はTrue
+    """
+    content = "".join(text.split())
+    if len(content) < config.OCR_TEXT_LAYER_MIN_CHARS:
+        return False
+    
+    # フォントのエンコーディング情報が欠けたPDFは文字化けするため、読める文字の割合で判定する
+    readable = sum(1 for c in content if c.isalnum() or c in ".,:;/()$%&#-'\"")
+    if "\ufffd" in content and content.count("\ufffd") / len(content) > 0.05:
+        return False
+    return readable / len(content) >= 0.6
+
+def _is_low_yield(text: str) -> bool:
+    """
+    OCR結果の文字数が少なすぎるかどうかを判定します（解像度不足の疑い）
+    """
+    return sum(1 for c in text if c.isalnum()) < config.OCR_LOW_YIELD_CHARS
+
+# OSDの判定結果のうち日本語として扱う文字体系
+JAPANESE_SCRIPTS = {"Japanese", "Han", "Hiragana", "Katakana"}
+
+def detect_osd(image: Image.Image) -> Optional[Dict[str, Any]]:
+    """
+    向き・文字体系の検出（OSD）を縮小画像に対して実行します
+    
+    :param image: 画像
+    :return: OSD結果（rotate, orientation_conf, script, script_conf）。検出できない場合はNone
+    """
+    thumbnail = image.copy()
+    thumbnail.thumbnail((config.OCR_OSD_MAX_SIDE, config.OCR_OSD_MAX_SIDE))
+    try:
+        return get_ocr_engine().detect_osd(thumbnail)
+    finally:
+        thumbnail.close()
+
+def choose_ocr_lang(osd: Optional[Dict[str, Any]]) -> str:
+    """
+    OSDで検出した文字体系からOCRに使う言語モデルを選びます
+    
+    :param osd: detect_osd の結果
+    :return: "eng", "jpn" または OCR_DEFAULT_LANG（判定できない場合）
+    """
+    if not osd or osd["script_conf"] < config.OCR_SCRIPT_MIN_CONF:
+        return config.OCR_DEFAULT_LANG
+    
+    script = osd.get("script")
+    if script == "Latin":
+        return "eng"
+    if script in JAPANESE_SCRIPTS:
+        return "jpn"
+    return config.OCR_DEFAULT_LANG
+
+def detect_text_lang(text: str) -> str:
+    """
+    テキストに含まれる文字からページの言語を判定します（テキストレイヤーのページ用）
+    
+    :param text: テキスト
+    :return: "eng", "jpn" または "eng+jpn"
+    """
+    japanese = sum(1 for c in text if "\u3040" <= c <= "\u30ff" or "\u4e00" <= c <= "\u9fff")
+    latin = sum(1 for c in text if c.isascii() and c.isalpha())
+    if japanese == 0:
+        return "eng"
+    if latin == 0:
+        return "jpn"
+    return "eng+jpn"
+
+def recognize_image(image: Image.Image) -> Tuple[str, str]:
+    """
+    前処理済みの画像をOCR処理します。
+    先にOSDで文字体系と向きを調べ、単一言語のページは軽い言語モデルだけで認識します。
+    
+    :param image: 前処理済みの画像
+    :return: (抽出されたテキスト, 使用した言語モデル)
+    """
+    engine = get_ocr_engine()
+    osd = detect_osd(image)
+    lang = choose_ocr_lang(osd)
+    
+    rotation = osd["rotate"] % 360 if osd else 0
+    if rotation and osd["orientation_conf"] >= config.OCR_ORIENTATION_MIN_CONF:
+        logger.info(f"画像の向きを補正します: {rotation}度")
+        with image.rotate(-rotation, expand=True) as rotated:
+            return engine.recognize(rotated, lang), lang
+    
+    return engine.recognize(image, lang), lang
+
+def _render_pdf_page(file_path: str, page_number: int, work_dir: str, dpi: int) -> List[str]:
+    """
+    PDFの1ページをグレースケール画像としてwork_dirに書き出します
+    """
+    return convert_from_path(
+        file_path,
+        dpi=dpi,
+        first_page=page_number,
+        last_page=page_number,
+        output_folder=work_dir,
+        output_file=f"page{page_number:05d}_{dpi}",
+        grayscale=True,
+        paths_only=True
+    )
+
+def _ocr_rendered_page(image_paths: List[str]) -> Tuple[str, str]:
+    """
+    書き出したページ画像を前処理してOCR処理し、画像ファイルを削除します
+    """
+    try:
+        with Image.open(image_paths[0]) as image:
+            return recognize_image(preprocess_page_image(image))
+    finally:
+        for image_path in image_paths:
+            try:
+                os.remove(image_path)
+            except OSError:
+                pass
+
+def ocr_pdf_page(file_path: str, page_number: int, work_dir: str, dpi: int) -> Dict[str, Any]:
+    """
+    PDFの1ページからテキストを取得します。
+    テキストレイヤーがあればそのまま使い、画像のみのページだけ画像変換してOCRを実行します。
+    
+    :param file_path: PDFファイルのパス
+    :param page_number: ページ番号（1始まり）
+    :param work_dir: 画像の一時出力先ディレクトリ
+    :param dpi: 画像変換時のDPI
+    :return: {"page", "text", "source"（"text_layer" または "ocr"）, "lang", "dpi", "elapsed_ms"}
+    """
+    started = time.monotonic()
+    
+    text_layer = extract_pdf_text_layer(file_path, page_number)
+    if has_usable_text_layer(text_layer):
+        logger.debug(f"ページ {page_number}: テキストレイヤーを使用")
+        return {
+            "page": page_number,
+            "text": text_layer,
+            "source": "text_layer",
+            "lang": detect_text_lang(text_layer),
+            "dpi": None,
+            "elapsed_ms": int((time.monotonic() - started) * 1000)
+        }
+    
+    # 画像はメモリに展開せずファイルに書き出し、OCR直前に開いて処理後すぐに削除する
+    page_text, lang = _ocr_rendered_page(_render_pdf_page(file_path, page_number, work_dir, dpi))
+    
+    # 小さな文字で読み取れなかった可能性があるため、最大DPIで一度だけ再試行する
+    if _is_low_yield(page_text) and dpi < config.OCR_MAX_DPI:
+        logger.info(f"ページ {page_number}: 読み取り文字数が少ないため {config.OCR_MAX_DPI}dpi で再OCRします")
+        retry_text, retry_lang = _ocr_rendered_page(_render_pdf_page(file_path, page_number, work_dir, config.OCR_MAX_DPI))
+        if len(retry_text.strip()) > len(page_text.strip()):
+            page_text, lang, dpi = retry_text, retry_lang, config.OCR_MAX_DPI
+    
+    return {
+        "page": page_number,
+        "text": page_text,
+        "source": "ocr",
+        "lang": lang,
+        "dpi": dpi,
+        "elapsed_ms": int((time.monotonic() - started) * 1000)
+    }
+
+def _map_in_order(executor: ThreadPoolExecutor, func, items, window: int):
+    """
+    同時に投入するタスク数をwindow件に制限しながら、結果を入力順に返すジェネレータ
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def ocr_pdf(file_path: str, on_page: Optional[Callable[[int, int], None]] = None) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    PDFの各ページを並列に処理し、ページ順に結合したテキストを返します。
+    テキストレイヤーを持つページはOCRを省略します。
+    画像化が必要なページは数ページずつOCR_TEMP_FOLDERに書き出して順次処理するため、
+    ページ数が増えてもメモリ使用量は一定に保たれます。
+    
+    :param file_path: PDFファイルのパス
+    :param on_page: ページの処理が終わるたびに (処理済みページ数, 総ページ数) で呼び出す関数（オプション）
+    :return: ("--- Page N ---" 区切りで結合されたテキスト, ページごとのテキストと処理情報)
+    """
+    pdf_info = pdfinfo_from_path(file_path)
+    page_count = pdf_info["Pages"]
+    dpi = choose_pdf_dpi(pdf_info.get("Page size"))
+    if on_page:
+        on_page(0, page_count)
+    
+    # pdftotext / pdftoppm / tesseract は別プロセスで動くため、スレッドでページ単位に並列化する
+    max_workers = max(1, min(config.OCR_PAGE_WORKERS, page_count))
+    window = max(max_workers, config.OCR_PAGE_WINDOW)
+    
+    raw_text = ""
+    pages = []
+    with tempfile.TemporaryDirectory(prefix="ocr_", dir=config.OCR_TEMP_FOLDER) as work_dir:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            page_results = _map_in_order(
+                executor,
+                lambda n: ocr_pdf_page(file_path, n, work_dir, dpi),
+                range(1, page_count + 1),
+                window
+            )
+            for page_result in page_results:
+                raw_text += f"\n--- Page {page_result['page']} ---\n{page_result['text']}"
+                pages.append(page_result)
+                logger.debug(f"ページ {page_result['page']} の処理完了（{page_result['source']}）")
+                if on_page:
+                    on_page(len(pages), page_count)
+    return raw_text, pages
+
+class OCRProcessingError(Exception):
+    """OCR処理の失敗を表す例外（メッセージはOCR結果のエラー情報として保存される）"""
+
+def run_ocr(file_path: str, on_page: Optional[Callable[[int, int], None]] = None) -> Tuple[str, List[Dict[str, Any]], str]:
+    """
+    ファイルの種類に応じてテキストを抽出します（DBへの保存は行わない）
+    
+    :param file_path: 処理するファイルのパス
+    :param on_page: ページの処理が終わるたびに (処理済みページ数, 総ページ数) で呼び出す関数（オプション）
+    :return: (テキスト, ページごとのテキストと処理情報, ファイル種別 "pdf" または "image")
+    :raises OCRProcessingError: 処理に失敗した場合
+    """
+    # ファイルの拡張子を取得
+    _, file_ext = os.path.splitext(file_path)
+    file_ext = file_ext.lower()
+    
+    # PDFの場合
+    if file_ext == '.pdf':
+        try:
+            # 各ページを並列に処理（テキストレイヤーのあるページはOCRを省略）
+            raw_text, pages = ocr_pdf(file_path, on_page)
+        except Exception as e:
+            raise OCRProcessingError(f"PDF処理エラー: {str(e)}") from e
+        return raw_text, pages, "pdf"
+    
+    # 画像の場合
+    if file_ext in ['.png', '.jpg', '.jpeg']:
+        # 画像は1ページとして扱い、PDFと同じように開始時点で総ページ数を通知する
+        if on_page:
+            on_page(0, 1)
+        try:
+            started = time.monotonic()
+            image = load_photo_for_ocr(file_path)
+            raw_text, lang = recognize_image(image)
+            pages = [{
+                "page": 1,
+                "text": raw_text,
+                "source": "ocr",
+                "lang": lang,
+                "dpi": None,
+                "elapsed_ms": int((time.monotonic() - started) * 1000)
+            }]
+            logger.debug("画像のOCR処理完了")
+        except Exception as e:
+            raise OCRProcessingError(f"画像処理エラー: {str(e)}") from e
+        if on_page:
+            on_page(1, 1)
+        return raw_text, pages, "image"
+    
+    # サポートされていないファイル形式
+    raise OCRProcessingError("サポートされていないファイル形式です")
+
+def _build_processed_data(file_path: str, pages: List[Dict[str, Any]], file_type: str) -> Dict[str, Any]:
+    """
+    OCR結果のメタデータを作成します（テキストはOCRPagesに保存するため含めない）
+    """
+    return {
+        "file_path": file_path,
+        "file_type": file_type,
+        "pages": [{key: value for key, value in page.items() if key != "text"} for page in pages],
+        "ocr_engine": get_ocr_engine().name
+    }
+
+def update_ocr_progress(db: Session, ocr_id: int, pages_done: int, page_count: int):
+    """
+    OCR結果の処理済みページ数を更新します（状態確認APIや進捗ストリームの定期確認で参照される）
+    
+    :param db: データベースセッション
+    :param ocr_id: OCR結果のID
+    :param pages_done: 処理済みのページ数
+    :param page_count: 総ページ数
+    """
+    db.execute(
+        update(models.OCRResult)
+        .where(models.OCRResult.ocr_id == ocr_id)
+        .values(pages_done=pages_done, page_count=page_count)
+    )
+    db.commit()
+
+def make_progress_callback(db: Session, ocr_id: int) -> Callable[[int, int], None]:
+    """
+    ページの処理が終わるたびに進捗を通知し、DBにも一定間隔で書き込むコールバックを作成します
+    
+    :param db: データベースセッション
+    :param ocr_id: OCR結果のID
+    :return: (処理済みページ数, 総ページ数) を受け取る関数
+    """
+    last_saved = [0.0]
+    
+    def on_page(pages_done: int, page_count: int):
+        report_progress(ocr_id, "processing", pages_done, page_count)
+        # 毎ページコミットするとDBの負荷になるため、最初と最後以外は間隔をあけて書き込む
+        now = time.monotonic()
+        if pages_done == 0 or pages_done == page_count or now - last_saved[0] >= config.OCR_PROGRESS_DB_INTERVAL:
+            try:
+                update_ocr_progress(db, ocr_id, pages_done, page_count)
+                last_saved[0] = now
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"OCR進捗の保存に失敗しました: ID={ocr_id}, {str(e)}")
+    
+    return on_page
+
 # OCR処理（Tesseractを使用）
 def process_document(file_path: str, ocr_id: int, db: Session):
     """
@@ -27,61 +378,23 @@ def process_document(file_path: str, ocr_id: int, db: Session):
     """
     try:
         logger.info(f"OCR処理開始: {file_path}")
-        
-        # ファイルの拡張子を取得
-        _, file_ext = os.path.splitext(file_path)
-        file_ext = file_ext.lower()
-        
-        raw_text = ""
-        
-        # PDFの場合
-        if file_ext == '.pdf':
-            try:
-                # PDFを画像に変換
-                images = convert_from_path(file_path)
-                
-                # 各ページをOCR処理
-                for i, image in enumerate(images):
-                    page_text = pytesseract.image_to_string(image, lang='eng+jpn')
-                    raw_text += f"\n--- Page {i+1} ---\n{page_text}"
-                    logger.debug(f"ページ {i+1} の処理完了")
-            except Exception as e:
-                logger.error(f"PDF処理エラー: {str(e)}")
-                update_ocr_result(db, ocr_id, "", "{}", "failed", f"PDF処理エラー: {str(e)}")
-                return
-        
-        # 画像の場合
-        elif file_ext in ['.png', '.jpg', '.jpeg']:
-            try:
-                image = Image.open(file_path)
-                raw_text = pytesseract.image_to_string(image, lang='eng+jpn')
-                logger.debug("画像のOCR処理完了")
-            except Exception as e:
-                logger.error(f"画像処理エラー: {str(e)}")
-                update_ocr_result(db, ocr_id, "", "{}", "failed", f"画像処理エラー: {str(e)}")
-                return
-        
-        else:
-            # サポートされていないファイル形式
-            logger.warning(f"サポートされていないファイル形式: {file_ext}")
-            update_ocr_result(db, ocr_id, "", "{}", "failed", "サポートされていないファイル形式です")
-            return
+        raw_text, pages, file_type = run_ocr(file_path, make_progress_callback(db, ocr_id))
         
         # OCR結果を保存
-        # 元のファイルパス情報も保存しておく
-        processed_data = {
-            "file_path": file_path,
-            "text_content": raw_text
-        }
-        # raw_textには長さを整数値として保存し、実際のテキストはprocessed_dataに保存
-        update_ocr_result(db, ocr_id, len(raw_text), json.dumps(processed_data), "completed")
+        # テキストはページ単位で圧縮してOCRPagesに保存し、processed_dataにはメタデータだけを持たせる
+        processed_data = _build_processed_data(file_path, pages, file_type)
+        # raw_textには長さを整数値として保存
+        update_ocr_result(db, ocr_id, len(raw_text), json.dumps(processed_data), "completed", pages=pages)
         logger.info(f"OCR処理完了: {file_path}")
         
+    except OCRProcessingError as e:
+        logger.error(str(e))
+        update_ocr_result(db, ocr_id, 0, "{}", "failed", str(e))
     except Exception as e:
         logger.error(f"OCR処理エラー: {str(e)}")
         update_ocr_result(db, ocr_id, 0, json.dumps({"error": str(e)}), "failed", str(e))
 
-def update_ocr_result(db: Session, ocr_id: int, raw_text_length: int, processed_data: str, status: str, error_message: str = None):
+def update_ocr_result(db: Session, ocr_id: int, raw_text_length: int, processed_data: str, status: str, error_message: str = None, pages: List[Dict[str, Any]] = None, extracted_data: Dict[str, Any] = None):
     """
     OCR結果を更新します
     
@@ -91,6 +404,8 @@ def update_ocr_result(db: Session, ocr_id: int, raw_text_length: int, processed_
     :param processed_data: 処理済みデータ（JSON文字列）
     :param status: 処理状態
     :param error_message: エラーメッセージ（オプション）
+    :param pages: ページごとのテキストと処理情報（オプション、OCRPagesに保存）
+    :param extracted_data: 抽出済みの発注書データ（オプション、抽出処理のバージョンと共に保存）
     """
     # OCRResultsテーブルのIDカラム名は ocr_id
     ocr_result = db.query(models.OCRResult).filter(models.OCRResult.ocr_id == ocr_id).first()
@@ -106,11 +421,111 @@ def update_ocr_result(db: Session, ocr_id: int, raw_text_length: int, processed_
             error_data["error"] = error_message
             ocr_result.processed_data = json.dumps(error_data)
         
+        if pages is not None:
+            save_ocr_pages(db, ocr_id, pages)
+            ocr_result.page_count = len(pages)
+            ocr_result.pages_done = len(pages)
+        
+        if extracted_data is not None:
+            ocr_result.extracted_data = json.dumps(extracted_data)
+            ocr_result.extractor_version = EXTRACTOR_VERSION
+        
         db.commit()
         logger.info(f"OCR結果更新: ID={ocr_id}, ステータス={status}")
+        report_progress(ocr_id, status, ocr_result.pages_done, ocr_result.page_count)
     else:
         logger.warning(f"OCR結果更新失敗: ID={ocr_id} が見つかりません")
 
+def save_ocr_pages(db: Session, ocr_id: int, pages: List[Dict[str, Any]]):
+    """
+    ページごとのテキストを圧縮してOCRPagesに保存します（コミットは呼び出し側で行う）
+    
+    :param db: データベースセッション
+    :param ocr_id: OCR結果のID
+    :param pages: ページごとのテキストと処理情報
+    """
+    db.query(models.OCRPage).filter(models.OCRPage.ocr_id == ocr_id).delete(synchronize_session=False)
+    db.add_all([
+        models.OCRPage(
+            ocr_id=ocr_id,
+            page_number=page["page"],
+            source=page["source"],
+            lang=page.get("lang"),
+            char_count=len(page["text"]),
+            text_compressed=zlib.compress(page["text"].encode("utf-8"))
+        )
+        for page in pages
+    ])
+
+def get_pages_ocr_id(ocr_result: models.OCRResult) -> int:
+    """
+    ページテキスト（OCRPages）を持つOCR結果のIDを返します。
+    重複アップロードで再利用したOCR結果はページテキストを複製せず、元のOCR結果のページを参照します。
+    
+    :param ocr_result: OCR結果
+    :return: OCRPagesの ocr_id
+    """
+    return ocr_result.pages_ocr_id or ocr_result.ocr_id
+
+def load_ocr_text(db: Session, ocr_result: models.OCRResult) -> str:
+    """
+    OCRPagesからページテキストを読み込み、"--- Page N ---" 区切りで結合して返します
+    
+    :param db: データベースセッション
+    :param ocr_result: OCR結果
+    :return: OCRテキスト
+    """
+    try:
+        metadata = json.loads(ocr_result.processed_data) if ocr_result.processed_data else {}
+    except json.JSONDecodeError:
+        logger.error(f"JSON解析エラー: ID={ocr_result.ocr_id}")
+        metadata = {}
+    
+    rows = db.query(models.OCRPage.page_number, models.OCRPage.text_compressed).filter(
+        models.OCRPage.ocr_id == get_pages_ocr_id(ocr_result)
+    ).order_by(models.OCRPage.page_number).all()
+    
+    if not rows:
+        # OCRPages導入前の結果はprocessed_dataにテキストを持っている
+        return metadata.get("text_content", "")
+    
+    page_texts = [(page_number, zlib.decompress(text_compressed).decode("utf-8")) for page_number, text_compressed in rows]
+    if metadata.get("file_type") == "image":
+        return page_texts[0][1]
+    return "".join(f"\n--- Page {page_number} ---\n{text}" for page_number, text in page_texts)
+
+def find_completed_ocr_result(db: Session, content_hash: str):
+    """
+    同じ内容のファイルに対する完了済みのOCR結果を検索します
+
+    :param db: データベースセッション
+    :param content_hash: ファイル内容のSHA-256
+    :return: 完了済みのOCR結果（存在しない場合はNone）
+    """
+    return db.query(models.OCRResult).filter(
+        models.OCRResult.content_hash == content_hash,
+        models.OCRResult.status == "completed"
+    ).order_by(models.OCRResult.ocr_id.desc()).first()
+
+def find_completed_ocr_results(db: Session, content_hashes: List[str]) -> Dict[str, models.OCRResult]:
+    """
+    複数のファイル内容に対する完了済みのOCR結果を1回のクエリで検索します
+
+    :param db: データベースセッション
+    :param content_hashes: ファイル内容のSHA-256のリスト
+    :return: SHA-256をキーとした完了済みのOCR結果（同じ内容が複数ある場合は最新のもの）
+    """
+    if not content_hashes:
+        return {}
+    results = db.query(models.OCRResult).filter(
+        models.OCRResult.content_hash.in_(set(content_hashes)),
+        models.OCRResult.status == "completed"
+    ).order_by(models.OCRResult.ocr_id.desc()).all()
+    completed = {}
+    for result in results:
+        completed.setdefault(result.content_hash, result)
+    return completed
+
 def extract_po_data(ocr_data) -> Dict[str, Any]:
     """
     OCRで抽出したテキストから発注書データを抽出します。
@@ -122,17 +537,15 @@ def extract_po_data(ocr_data) -> Dict[str, Any]:
     ocr_text = ""
     if isinstance(ocr_data, int):
         try:
-            # DBからOCR結果を取得し、processed_dataからテキストを抽出
+            # DBからOCR結果を取得し、OCRPagesからテキストを読み込む
             from database import SessionLocal
             db = SessionLocal()
-            ocr_result = db.query(models.OCRResult).filter(models.OCRResult.ocr_id == ocr_data).first()
-            if ocr_result and ocr_result.processed_data:
-                try:
-                    processed_data = json.loads(ocr_result.processed_data)
-                    ocr_text = processed_data.get("text_content", "")
-                except json.JSONDecodeError:
-                    logger.error(f"JSON解析エラー: {ocr_result.processed_data}")
-            db.close()
+            try:
+                ocr_result = db.query(models.OCRResult).filter(models.OCRResult.ocr_id == ocr_data).first()
+                if ocr_result:
+                    ocr_text = load_ocr_text(db, ocr_result)
+            finally:
+                db.close()
         except Exception as e:
             logger.error(f"OCRデータ取得エラー: {str(e)}")
     else:
@@ -144,18 +557,12 @@ def extract_po_data(ocr_data) -> Dict[str, Any]:
     logger.info(f"POフォーマット判定: {po_format}, 信頼度: {confidence:.2f}")
     
     # フォーマットに応じたデータ抽出
-    if po_format == "format1" and confidence >= 0.4:
-        logger.info("Format1 (Buyer's Info) のデータ抽出を実行します")
-        result = extract_format1_data(ocr_text)
-    elif po_format == "format2" and confidence >= 0.4:
-        logger.info("Format2 (Purchase Order) のデータ抽出を実行します")
-        result = extract_format2_data(ocr_text)
-    elif po_format == "format3" and confidence >= 0.4:
-        logger.info("Format3 (ORDER CONFIMATION) のデータ抽出を実行します")
-        result = extract_format3_data(ocr_text)
+    if po_format in FORMAT_SPECS and confidence >= FORMAT_MIN_CONFIDENCE:
+        logger.info(f"{po_format} ({get_format_label(po_format)}) のデータ抽出を実行します")
+        result = extract_format_data(po_format, ocr_text)
     else:
         logger.info("一般的なフォーマットでのデータ抽出を実行します")
-        result = extract_generic_data(ocr_text)
+        result = extract_generic_data(ocr_text, time_budget_ms=config.EXTRACTION_TIME_BUDGET_MS)
     
     # 結果の検証とクリーニング
     validate_and_clean_result(result)
@@ -267,23 +674,17 @@ def get_extraction_stats(ocr_text: str, result: Dict[str, Any]) -> Dict[str, Any
         "quality_assessment": analyze_extraction_quality(result)
     }
     
-    # フォーマット候補のスコアを取得
-    format_name, confidence = identify_po_format(ocr_text)
-    stats["format_candidates"][format_name] = confidence
-    
-    # その他の候補フォーマットもスコアリング
-    all_formats = ["format1", "format2", "format3", "unknown"]
-    for fmt in all_formats:
-        if fmt != format_name:
-            # ここでは簡易的に信頼度を0.0に設定していますが、
-            # 本来は各フォーマットごとに計算すべきです
-            stats["format_candidates"][fmt] = 0.0
+    # 登録されているすべてのフォーマットの信頼度を取得
+    stats["format_candidates"] = score_po_formats(ocr_text)
+    # フォーマット不明は候補として数値化できないため、従来どおり0.0とする
+    stats["format_candidates"]["unknown"] = 0.0
     
     return stats
 
 def process_ocr_with_enhanced_extraction(file_path: str, ocr_id: int, db: Session):
     """
-    拡張抽出機能を持つOCR処理を実行します
+    拡張抽出機能を持つOCR処理を実行します。
+    OCRの完了と同時に発注書データを抽出し、抽出処理のバージョンと共に保存します。
     
     :param file_path: 処理するファイルのパス
     :param ocr_id: OCR結果のID
@@ -293,47 +694,54 @@ def process_ocr_with_enhanced_extraction(file_path: str, ocr_id: int, db: Sessio
         logger.info(f"拡張OCR処理開始: {file_path}")
         
         # 基本的なOCR処理を実行
-        process_document(file_path, ocr_id, db)
-        
-        # OCR結果を取得
-        ocr_result = db.query(models.OCRResult).filter(models.OCRResult.ocr_id == ocr_id).first()
-        if not ocr_result or ocr_result.status != "completed":
-            logger.warning(f"OCR処理が完了していません: ID={ocr_id}")
-            return
-        
-        # processed_dataからテキスト内容を取得
-        processed_data = json.loads(ocr_result.processed_data)
-        ocr_text = processed_data.get("text_content", "")
-        
-        # PO情報の抽出
-        extracted_data = extract_po_data(ocr_text)
+        ocr_text, pages, file_type = run_ocr(file_path, make_progress_callback(db, ocr_id))
+        processed_data = _build_processed_data(file_path, pages, file_type)
         
-        # 抽出統計情報の取得
-        stats = get_extraction_stats(ocr_text, extracted_data)
-        
-        # 抽出結果と統計情報を含む完全な結果を保存
-        complete_result = {
-            "data": extracted_data,
-            "stats": stats,
-            "file_path": file_path,
-            "text_content": ocr_text  # テキスト内容を保持
-        }
+        # PO情報の抽出（失敗してもOCR結果は保存し、抽出は取得時に再実行する）
+        extracted_data = None
+        try:
+            started = time.monotonic()
+            extracted_data = extract_po_data(ocr_text)
+            
+            # 抽出統計情報の取得
+            stats = get_extraction_stats(ocr_text, extracted_data)
+            stats["extraction_time_ms"] = int((time.monotonic() - started) * 1000)
+            processed_data["stats"] = stats
+        except Exception as e:
+            logger.error(f"データ抽出エラー: ID={ocr_id}, {str(e)}")
         
-        # 結果の保存
-        ocr_result.processed_data = json.dumps(complete_result)
-        db.commit()
+        # OCR結果・ページテキスト・抽出結果を1回のコミットで保存
+        update_ocr_result(db, ocr_id, len(ocr_text), json.dumps(processed_data), "completed", pages=pages, extracted_data=extracted_data)
         
-        logger.info(f"拡張OCR処理完了: ID={ocr_id}, フォーマット={stats['format_candidates']}")
+        logger.info(f"拡張OCR処理完了: ID={ocr_id}, フォーマット={processed_data.get('stats', {}).get('format_candidates')}")
         
+    except OCRProcessingError as e:
+        logger.error(str(e))
+        update_ocr_result(db, ocr_id, 0, "{}", "failed", str(e))
     except Exception as e:
         logger.error(f"拡張OCR処理エラー: {str(e)}")
         try:
-            ocr_result = db.query(models.OCRResult).filter(models.OCRResult.ocr_id == ocr_id).first()
-            if ocr_result:
-                ocr_result.status = "failed"
-                processed_data = json.loads(ocr_result.processed_data) if ocr_result.processed_data and ocr_result.processed_data != "{}" else {}
-                processed_data["error"] = str(e)
-                ocr_result.processed_data = json.dumps(processed_data)
-                db.commit()
+            db.rollback()
+            update_ocr_result(db, ocr_id, 0, json.dumps({"file_path": file_path}), "failed", str(e))
         except Exception as inner_e:
             logger.error(f"エラー情報保存中にエラー発生: {str(inner_e)}")
+
+def extract_and_store_po_data(db: Session, ocr_id: int) -> Dict[str, Any]:
+    """
+    OCR結果から発注書データを抽出して保存します。
+    抽出前のOCR結果や、抽出処理のバージョンが古い結果に対して使用します。
+    
+    :param db: データベースセッション
+    :param ocr_id: OCR結果のID
+    :return: 抽出された発注書データ
+    """
+    ocr_result = db.query(models.OCRResult).filter(models.OCRResult.ocr_id == ocr_id).first()
+    ocr_text = load_ocr_text(db, ocr_result)
+    
+    extracted_data = extract_po_data(ocr_text)
+    ocr_result.extracted_data = json.dumps(extracted_data)
+    ocr_result.extractor_version = EXTRACTOR_VERSION
+    db.commit()
+    
+    logger.info(f"抽出結果を保存しました: ID={ocr_id}, バージョン={EXTRACTOR_VERSION}")
+    return extracted_data
@@ -0,0 +1,253 @@
+# ocr_worker.py - OCR処理専用のプロセスプール
+import json
+import logging
+import os
+import importlib.util
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, Future, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+
+import config
+from ocr_progress import set_progress_sink, report_progress
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_pending_jobs = 0
+# ワーカーから親プロセスへ進捗イベントを送るキュー
+_progress_queue = None
+
+class OCRQueueFullError(Exception):
+    """OCRジョブの受付上限に達した場合に送出される例外"""
+
+def _init_worker(progress_queue):
+    """
+    ワーカープロセスの初期化処理
+
+    :param progress_queue: 進捗イベントを親プロセスへ送るキュー
+    """
+    # ページ単位で並列にtesseractを起動するため、tesseract内部のOpenMPスレッドは1本に制限する
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    # 親プロセスから引き継いだコネクションプールは使わず、ワーカー専用の接続を張り直す
+    from database import engine
+    engine.dispose(close=False)
+    
+    # 言語モデルを読み込み済みのOCRエンジンを用意しておき、ページごとの初期化コストをなくす
+    from ocr_engine import warm_up_ocr_engine
+    warm_up_ocr_engine()
+    set_progress_sink(progress_queue)
+    logger.info("OCRワーカープロセス起動")
+
+def run_ocr_job(file_path: str, ocr_id: int):
+    """
+    ワーカープロセス内でOCRジョブを実行します（OCRと発注書データの抽出まで行う）。
+    リクエストのセッションは使わず、ジョブ専用のセッションを開いて閉じます。
+
+    :param file_path: 処理するファイルのパス
+    :param ocr_id: OCR結果のID
+    """
+    from database import SessionLocal
+    from ocr_service import process_ocr_with_enhanced_extraction
+    from ocr_progress import report_progress
+
+    # 待機中だったジョブの処理が始まったことを通知する
+    report_progress(ocr_id, "processing", 0)
+    db = SessionLocal()
+    try:
+        process_ocr_with_enhanced_extraction(file_path, ocr_id, db)
+    finally:
+        db.close()
+
+def start_ocr_pool():
+    """
+    OCRプロセスプールを起動します（起動済みの場合は何もしない）
+    """
+    global _executor, _progress_queue
+    with _executor_lock:
+        if _executor is None:
+            # Webワーカーのスレッドやイベントループを引き継がないよう spawn で起動する
+            mp_context = multiprocessing.get_context("spawn")
+            # 進捗の受信スレッドが読み続けるキューのため、プールを作り直しても同じものを使う
+            if _progress_queue is None:
+                _progress_queue = mp_context.Queue()
+                # 親プロセスで記録するジョブの失敗も、ワーカーの進捗と同じ経路で通知する
+                set_progress_sink(_progress_queue)
+            _executor = ProcessPoolExecutor(
+                max_workers=config.OCR_MAX_WORKERS,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(_progress_queue,)
+            )
+            logger.info(f"OCRプロセスプール起動: ワーカー数={config.OCR_MAX_WORKERS}")
+            if config.OCR_ENGINE != "pytesseract" and importlib.util.find_spec("tesserocr") is None:
+                # ワーカープロセスは最初のジョブまで起動しないため、エンジンの切り替えはここで知らせる
+                logger.warning("tesserocrがインストールされていないため、OCRワーカーはpytesseractを使用します")
+            tesseract_slots = config.WEB_WORKERS * config.OCR_MAX_WORKERS * config.OCR_PAGE_WORKERS
+            if tesseract_slots > (os.cpu_count() or 1):
+                logger.warning(
+                    f"同時に動くtesseractの上限（{tesseract_slots}）がCPUコア数（{os.cpu_count()}）を超えています。"
+                    "WEB_WORKERS・OCR_MAX_WORKERS・OCR_PAGE_WORKERSを確認してください"
+                )
+    return _executor
+
+def get_progress_queue():
+    """
+    ワーカーの進捗イベントが届くキューを返します（プール起動前はNone）
+    """
+    return _progress_queue
+
+def shutdown_ocr_pool():
+    """
+    OCRプロセスプールを停止します。
+    実行待ちのジョブはキャンセルされ、失敗として記録されます。
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+        logger.info("OCRプロセスプール停止")
+
+def _discard_broken_pool(executor: ProcessPoolExecutor):
+    """
+    ワーカープロセスの異常終了（OOMによる強制終了など）で使えなくなったプールを破棄します。
+    次のジョブ投入時に start_ocr_pool で新しいプールが作られます。
+
+    :param executor: 使えなくなったプール
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not executor:
+            # 別のジョブの完了通知などで既に作り直されている
+            return
+        _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+    logger.error("OCRワーカープロセスが異常終了したため、プロセスプールを作り直します")
+
+def _submit(file_path: str, ocr_id: int) -> Tuple[ProcessPoolExecutor, Future]:
+    """
+    ジョブをプールに投入します。プールが使えなくなっていた場合は作り直して1回だけ再投入します。
+    """
+    executor = start_ocr_pool()
+    try:
+        return executor, executor.submit(run_ocr_job, file_path, ocr_id)
+    except BrokenProcessPool:
+        _discard_broken_pool(executor)
+        executor = start_ocr_pool()
+        return executor, executor.submit(run_ocr_job, file_path, ocr_id)
+
+def _mark_job_failed(ocr_id: int, error_message: str):
+    """
+    ワーカーで処理できなかったジョブを失敗状態にします
+    """
+    from database import SessionLocal
+    import models
+
+    db = SessionLocal()
+    try:
+        ocr_result = db.query(models.OCRResult).filter(models.OCRResult.ocr_id == ocr_id).first()
+        if ocr_result and ocr_result.status == "processing":
+            processed_data = json.loads(ocr_result.processed_data) if ocr_result.processed_data else {}
+            processed_data["error"] = error_message
+            ocr_result.processed_data = json.dumps(processed_data)
+            ocr_result.status = "failed"
+            db.commit()
+            report_progress(ocr_id, "failed")
+    except Exception as e:
+        logger.error(f"OCRジョブ失敗の記録エラー: ID={ocr_id}, {str(e)}")
+    finally:
+        db.close()
+
+def _on_job_done(executor: ProcessPoolExecutor, ocr_id: int, future: Future):
+    global _pending_jobs
+    with _executor_lock:
+        _pending_jobs -= 1
+
+    try:
+        future.result()
+    except CancelledError:
+        logger.warning(f"OCRジョブがキャンセルされました: ID={ocr_id}")
+        _mark_job_failed(ocr_id, "サーバー停止またはジョブ投入の失敗によりOCR処理がキャンセルされました")
+    except BrokenProcessPool as e:
+        # 以降のジョブが投入できなくならないよう、使えなくなったプールを破棄する
+        logger.error(f"OCRワーカープロセスの異常終了: ID={ocr_id}, {str(e)}")
+        _discard_broken_pool(executor)
+        _mark_job_failed(ocr_id, f"OCRワーカーが異常終了しました: {str(e)}")
+    except Exception as e:
+        # ワーカープロセスの異常終了など、process_document内で記録できなかったエラー
+        logger.error(f"OCRジョブ実行エラー: ID={ocr_id}, {str(e)}")
+        _mark_job_failed(ocr_id, f"OCRワーカーエラー: {str(e)}")
+
+def submit_ocr_job(file_path: str, ocr_id: int) -> Future:
+    """
+    OCRジョブをプロセスプールに投入します
+
+    :param file_path: 処理するファイルのパス
+    :param ocr_id: OCR結果のID
+    :return: ジョブのFuture
+    :raises OCRQueueFullError: 受付上限に達している場合
+    """
+    global _pending_jobs
+    with _executor_lock:
+        if _pending_jobs >= config.OCR_MAX_PENDING_JOBS:
+            raise OCRQueueFullError(f"OCRジョブの受付上限（{config.OCR_MAX_PENDING_JOBS}件）に達しています")
+        _pending_jobs += 1
+
+    try:
+        executor, future = _submit(file_path, ocr_id)
+    except Exception:
+        with _executor_lock:
+            _pending_jobs -= 1
+        raise
+
+    future.add_done_callback(lambda f: _on_job_done(executor, ocr_id, f))
+    logger.info(f"OCRジョブ投入: ID={ocr_id}, 待機中ジョブ数={_pending_jobs}")
+    return future
+
+def submit_ocr_jobs(jobs: List[Tuple[str, int]]) -> List[Future]:
+    """
+    複数のOCRジョブをまとめてプロセスプールに投入します。
+    受付枠は全件分を一度に確保し、一部だけが投入されることはありません。
+
+    :param jobs: (処理するファイルのパス, OCR結果のID) のリスト
+    :return: ジョブのFutureのリスト
+    :raises OCRQueueFullError: 全件分の受付枠がない場合
+    """
+    global _pending_jobs
+    if not jobs:
+        return []
+
+    with _executor_lock:
+        if _pending_jobs + len(jobs) > config.OCR_MAX_PENDING_JOBS:
+            raise OCRQueueFullError(
+                f"OCRジョブの受付上限（{config.OCR_MAX_PENDING_JOBS}件）を超えるため{len(jobs)}件を受け付けできません"
+            )
+        _pending_jobs += len(jobs)
+
+    futures = []
+    for index, (file_path, ocr_id) in enumerate(jobs):
+        try:
+            executor, future = _submit(file_path, ocr_id)
+        except Exception as e:
+            # 一部だけが処理されないよう、投入済みのジョブは取り消す（完了通知で失敗として記録される）
+            for submitted in futures:
+                submitted.cancel()
+            # 投入できなかった残りのジョブの受付枠を戻し、失敗として記録する
+            with _executor_lock:
+                _pending_jobs -= len(jobs) - index
+            for _, failed_ocr_id in jobs[index:]:
+                _mark_job_failed(failed_ocr_id, f"OCRジョブの投入に失敗しました: {str(e)}")
+            raise
+        future.add_done_callback(lambda f, executor=executor, ocr_id=ocr_id: _on_job_done(executor, ocr_id, f))
+        futures.append(future)
+
+    logger.info(f"OCRジョブ一括投入: 件数={len(jobs)}, 待機中ジョブ数={_pending_jobs}")
+    return futures
@@ -0,0 +1,107 @@
+# po_service.py - PO一覧用の集計データ（POSummaries）の更新処理
+import logging
+from decimal import Decimal
+from typing import List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+import models
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+def apply_po_summary(
+    summary: models.POSummary,
+    items: List[models.OrderItem],
+    total_quantity: Decimal,
+    input_info: Optional[models.Input],
+    shipping_info: Optional[models.ShippingSchedule]
+):
+    """
+    製品・入力情報・出荷情報から、PO一覧に表示する集計値を設定します
+
+    :param summary: 更新するPO集計データ
+    :param items: POの製品（登録順、product_name と unit_price を持つもの）
+    :param total_quantity: SQLで集計した製品の数量の合計
+    :param input_info: POの入力情報
+    :param shipping_info: POの出荷情報
+    """
+    summary.product_names = ", ".join([item.product_name for item in items])
+    summary.total_quantity = total_quantity
+    summary.first_unit_price = items[0].unit_price if items else None
+    summary.has_invoice = bool(input_info and input_info.invoice_number)
+    summary.payment_completed = bool(input_info and input_info.payment_status == "completed")
+    summary.has_booking = shipping_info is not None
+
+async def refresh_po_summary(db: AsyncSession, po_id: int) -> models.POSummary:
+    """
+    POの集計データを再計算します。呼び出し元の更新と同じトランザクションで反映するため、コミットは呼び出し側で行います。
+
+    :param db: データベースセッション
+    :param po_id: POのID
+    :return: 更新したPO集計データ
+    """
+    # 未反映の変更（新しい製品や入力情報など）を集計の読み込みに含める
+    await db.flush()
+    items = (await db.execute(
+        select(models.OrderItem.product_name, models.OrderItem.unit_price)
+        .where(models.OrderItem.po_id == po_id)
+        .order_by(models.OrderItem.item_id)
+    )).all()
+    # 数量は登録時に数値に正規化済みのため、合計はSQLで計算する
+    total_quantity = await db.scalar(
+        select(func.coalesce(func.sum(models.OrderItem.quantity), 0)).where(models.OrderItem.po_id == po_id)
+    )
+    input_info = (await db.execute(select(models.Input).where(models.Input.po_id == po_id))).scalars().first()
+    shipping_info = (await db.execute(
+        select(models.ShippingSchedule).where(models.ShippingSchedule.po_id == po_id)
+    )).scalars().first()
+
+    summary = await db.get(models.POSummary, po_id)
+    if summary is None:
+        summary = models.POSummary(po_id=po_id)
+        db.add(summary)
+    apply_po_summary(summary, items, total_quantity, input_info, shipping_info)
+    return summary
+
+async def backfill_po_summaries(db: AsyncSession, batch_size: int = 500) -> int:
+    """
+    集計データのないPO（POSummaries導入前に登録されたPOなど）の集計データを作成してコミットします。
+    関連データは selectinload でまとめて読み込み、batch_size件ごとにコミットします。
+
+    :param db: データベースセッション
+    :param batch_size: 1回に処理するPOの件数
+    :return: 作成した件数
+    """
+    created = 0
+    while True:
+        po_list = (await db.execute(
+            select(models.PurchaseOrder)
+            .outerjoin(models.POSummary, models.POSummary.po_id == models.PurchaseOrder.po_id)
+            .where(models.POSummary.po_id.is_(None))
+            .options(
+                selectinload(models.PurchaseOrder.items),
+                selectinload(models.PurchaseOrder.input_info),
+                selectinload(models.PurchaseOrder.shipping_schedule)
+            )
+            .order_by(models.PurchaseOrder.po_id)
+            .limit(batch_size)
+        )).scalars().all()
+        if not po_list:
+            break
+        quantities = dict((await db.execute(
+            select(models.OrderItem.po_id, func.sum(models.OrderItem.quantity))
+            .where(models.OrderItem.po_id.in_([po.po_id for po in po_list]))
+            .group_by(models.OrderItem.po_id)
+        )).all())
+        for po in po_list:
+            summary = models.POSummary(po_id=po.po_id)
+            apply_po_summary(summary, po.items, quantities.get(po.po_id) or 0, po.input_info, po.shipping_schedule)
+            db.add(summary)
+        await db.commit()
+        created += len(po_list)
+    if created:
+        logger.info(f"PO集計データを作成しました: {created}件")
+    return created
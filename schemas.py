@@ -59,6 +59,10 @@ class OCRResponse(BaseModel):
     ocrId: str
     status: str
 
+# OCRステータス一括取得リクエスト
+class OCRStatusBatchRequest(BaseModel):
+    ocrIds: List[int]
+
 # OCR抽出データレスポンス
 class OCRExtractResponse(BaseModel):
     ocrId: int
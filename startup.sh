@@ -2,7 +2,14 @@
 
 # システムライブラリのインストール (必要に応じて)
 apt-get update
-apt-get install -y poppler-utils tesseract-ocr
+apt-get install -y poppler-utils tesseract-ocr libtesseract-dev libleptonica-dev pkg-config
+
+# tesserocr（言語モデルを読み込み済みのTesseract APIを使い回すOCRエンジン）
+# libtesseract-devに対してビルドするため、requirements.txtではなくシステムライブラリのインストール後に入れる
+pip install tesserocr==2.6.2
+
+# スキーマの更新とPO集計データの作成（Webワーカーの起動前に1回だけ実行）
+python migrations.py
 
 # アプリケーション起動
-gunicorn app:app --workers 2 --worker-class uvicorn.workers.UvicornWorker --bind 0.0.0.0:8000 --timeout 120
+gunicorn app:app --workers ${WEB_WORKERS:-2} --worker-class uvicorn.workers.UvicornWorker --bind 0.0.0.0:8000 --timeout 120
@@ -1,16 +1,22 @@
 # test_ocr_format.py
 import os
+import csv
 import json
+import time
+import hashlib
 import argparse
 import logging
-from typing import Dict, Any, List
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional, Tuple
 import pytesseract
 from PIL import Image
 from pdf2image import convert_from_path
 
 # プロジェクトのモジュールをインポート
-from ocr_extractors import identify_po_format, extract_format1_data, extract_format2_data, extract_format3_data, extract_generic_data
+from ocr_extractors import identify_po_format, score_po_formats, extract_format1_data, extract_format2_data, extract_format3_data, extract_generic_data
 from ocr_service import validate_and_clean_result, analyze_extraction_quality, get_extraction_stats
+from benchmarks.run_benchmarks import percentile
 
 # ロギング設定
 logging.basicConfig(
@@ -19,6 +25,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger("ocr_test")
 
+# 分析対象のファイル形式
+SUPPORTED_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg")
+
+# OCRテキストをファイル内容のSHA-256ごとに保存するディレクトリ（出力ディレクトリ内）
+OCR_CACHE_DIRNAME = "ocr_cache"
+
+# バッチレポート（CSV）の列
+BATCH_CSV_FIELDS = [
+    "file", "sha256", "text_length", "format", "format_confidence", "best_extractor", "best_confidence",
+    "ocr_cached", "duplicate_of", "ocr_ms", "extraction_ms", "total_ms", "error"
+]
+
 def extract_text_from_file(file_path: str) -> str:
     """
     ファイルからOCRテキストを抽出します
@@ -58,16 +76,7 @@ def test_format_identification(ocr_text: str) -> Dict[str, float]:
     logger.info(f"主要フォーマット: {format_name}, 信頼度: {confidence:.2f}")
     
     # 各フォーマットの信頼度を計算
-    formats = ["format1", "format2", "format3"]
-    format_confidences = {}
-    
-    for fmt in formats:
-        # 仮実装: 実際は各フォーマットごとに確率を計算すべき
-        if fmt == format_name:
-            format_confidences[fmt] = confidence
-        else:
-            # 単純化のため0を設定
-            format_confidences[fmt] = 0.0
+    format_confidences = score_po_formats(ocr_text)
     
     return format_confidences
 
@@ -164,86 +173,310 @@ def compare_extraction_results(results: Dict[str, Dict[str, Any]]) -> Dict[str,
     
     return comparison
 
-def run_test(file_path: str, output_dir: str = None):
+def file_sha256(file_path: str) -> str:
     """
-    OCRフォーマットテストを実行します
+    ファイル内容のSHA-256を計算します
+    
+    :param file_path: ファイルパス
+    :return: SHA-256（16進文字列）
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def load_or_extract_text(file_path: str, cache_dir: Optional[str], content_hash: Optional[str] = None) -> Tuple[str, str, bool]:
+    """
+    OCRテキストを取得します。同じ内容（SHA-256が一致）のファイルのOCRテキストが保存済みであれば、OCRを実行せずにそれを使います。
+    
+    :param file_path: ファイルパス
+    :param cache_dir: OCRテキストの保存先（Noneならキャッシュを使わない）
+    :param content_hash: 計算済みのファイルのSHA-256（省略時はここで計算する）
+    :return: (OCRテキスト, ファイルのSHA-256, キャッシュを使ったか)
+    """
+    content_hash = content_hash or file_sha256(file_path)
+    cache_path = os.path.join(cache_dir, f"{content_hash}.txt") if cache_dir else None
+    
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return f.read(), content_hash, True
+    
+    ocr_text = extract_text_from_file(file_path)
+    
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        # 書き込み途中のファイルを他のプロセスが読まないよう、一時ファイルに書いてから置き換える
+        temp_path = f"{cache_path}.{os.getpid()}.part"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(ocr_text)
+        os.replace(temp_path, cache_path)
+    
+    return ocr_text, content_hash, False
+
+def analyze_file(
+    file_path: str,
+    output_dir: str = None,
+    use_cache: bool = True,
+    content_hash: Optional[str] = None,
+    output_name: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    1ファイルのOCRテキストに対してフォーマット識別と全抽出機能を実行し、結果のサマリーを返します
     
     :param file_path: テスト対象のファイルパス
     :param output_dir: 結果出力ディレクトリ（オプション）
+    :param use_cache: 保存済みのOCRテキストを再利用するか
+    :param content_hash: 計算済みのファイルのSHA-256（オプション）
+    :param output_name: 結果ファイル名の元にするパス（省略時はファイル名。バッチでは対象ディレクトリからの相対パス）
+    :return: 結果サマリー
     """
-    logger.info(f"OCRフォーマットテスト開始: {file_path}")
+    start = time.perf_counter()
+    cache_dir = os.path.join(output_dir, OCR_CACHE_DIRNAME) if output_dir and use_cache else None
     
-    try:
-        # OCRテキスト抽出
-        ocr_text = extract_text_from_file(file_path)
-        logger.info(f"テキスト抽出完了: {len(ocr_text)} 文字")
-        
-        # フォーマット識別テスト
-        format_confidences = test_format_identification(ocr_text)
-        
-        # 各抽出機能のテスト
-        extraction_results = test_all_extractors(ocr_text)
+    # OCRテキスト抽出
+    ocr_text, content_hash, cached = load_or_extract_text(file_path, cache_dir, content_hash)
+    ocr_ms = (time.perf_counter() - start) * 1000
+    logger.info(f"テキスト抽出完了: {len(ocr_text)} 文字{'（保存済みのOCRテキストを使用）' if cached else ''}")
+    
+    # フォーマット識別テスト
+    format_name, format_confidence = identify_po_format(ocr_text)
+    format_confidences = test_format_identification(ocr_text)
+    
+    # 各抽出機能のテスト
+    extraction_results = test_all_extractors(ocr_text)
+    
+    # 結果比較
+    comparison = compare_extraction_results(extraction_results)
+    extraction_ms = (time.perf_counter() - start) * 1000 - ocr_ms
+    
+    # 結果サマリー
+    summary = {
+        "file": file_path,
+        "sha256": content_hash,
+        "text_length": len(ocr_text),
+        "format": format_name,
+        "format_confidence": format_confidence,
+        "format_identification": format_confidences,
+        "best_extractor": comparison["best_extractor"],
+        "best_confidence": comparison["best_quality"],
+        "recommendation": f"{comparison['best_extractor']}抽出機能を使用してください" if comparison["best_extractor"] else "フォーマットを特定できませんでした",
+        "ocr_cached": cached,
+        "ocr_ms": round(ocr_ms, 1),
+        "extraction_ms": round(extraction_ms, 1),
+        "total_ms": round(ocr_ms + extraction_ms, 1)
+    }
+    
+    logger.info(f"テスト結果: {json.dumps(summary, indent=2, ensure_ascii=False)}")
+    
+    # 結果の保存
+    if output_dir:
+        # 別のフォルダにある同名のファイルの結果を上書きしないよう、相対パスのフォルダ構成で保存する
+        base_name, _ = os.path.splitext(os.path.join(output_dir, output_name or os.path.basename(file_path)))
+        os.makedirs(os.path.dirname(base_name), exist_ok=True)
         
-        # 結果比較
-        comparison = compare_extraction_results(extraction_results)
+        # テキスト保存
+        with open(f"{base_name}_ocr.txt", "w", encoding="utf-8") as f:
+            f.write(ocr_text)
         
-        # 結果サマリー
-        summary = {
-            "file": file_path,
-            "text_length": len(ocr_text),
-            "format_identification": format_confidences,
-            "best_extractor": comparison["best_extractor"],
-            "best_confidence": comparison["best_quality"],
-            "recommendation": f"{comparison['best_extractor']}抽出機能を使用してください" if comparison["best_extractor"] else "フォーマットを特定できませんでした"
+        # 詳細結果保存
+        detailed_results = {
+            "summary": summary,
+            "ocr_text_sample": ocr_text[:1000] + "..." if len(ocr_text) > 1000 else ocr_text,
+            "format_confidences": format_confidences,
+            "extraction_results": {
+                name: result.get("data", {}) 
+                for name, result in extraction_results.items() 
+                if "data" in result
+            },
+            "quality_assessment": {
+                name: result.get("quality", {}) 
+                for name, result in extraction_results.items() 
+                if "quality" in result
+            },
+            "comparison": comparison
         }
         
-        logger.info(f"テスト結果: {json.dumps(summary, indent=2)}")
-        
-        # 結果の保存
-        if output_dir:
-            os.makedirs(output_dir, exist_ok=True)
-            filename = os.path.basename(file_path)
-            base_name, _ = os.path.splitext(filename)
-            
-            # テキスト保存
-            with open(os.path.join(output_dir, f"{base_name}_ocr.txt"), "w", encoding="utf-8") as f:
-                f.write(ocr_text)
-            
-            # 詳細結果保存
-            detailed_results = {
-                "summary": summary,
-                "ocr_text_sample": ocr_text[:1000] + "..." if len(ocr_text) > 1000 else ocr_text,
-                "format_confidences": format_confidences,
-                "extraction_results": {
-                    name: result.get("data", {}) 
-                    for name, result in extraction_results.items() 
-                    if "data" in result
-                },
-                "quality_assessment": {
-                    name: result.get("quality", {}) 
-                    for name, result in extraction_results.items() 
-                    if "quality" in result
-                },
-                "comparison": comparison
-            }
-            
-            with open(os.path.join(output_dir, f"{base_name}_result.json"), "w", encoding="utf-8") as f:
-                json.dump(detailed_results, f, indent=2, ensure_ascii=False)
-            
-            logger.info(f"結果をディレクトリに保存しました: {output_dir}")
+        with open(f"{base_name}_result.json", "w", encoding="utf-8") as f:
+            json.dump(detailed_results, f, indent=2, ensure_ascii=False)
         
+        logger.info(f"結果をディレクトリに保存しました: {output_dir}")
+    
+    return summary
+
+def run_test(file_path: str, output_dir: str = None, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    OCRフォーマットテストを実行します
+    
+    :param file_path: テスト対象のファイルパス
+    :param output_dir: 結果出力ディレクトリ（オプション）
+    :param use_cache: 保存済みのOCRテキストを再利用するか
+    :return: 結果サマリー
+    """
+    logger.info(f"OCRフォーマットテスト開始: {file_path}")
+    
+    try:
+        return analyze_file(file_path, output_dir, use_cache)
     except Exception as e:
         logger.error(f"テスト実行エラー: {str(e)}")
         raise
 
+def _init_batch_worker():
+    """
+    バッチ用ワーカープロセスの初期化。ファイル単位で並列化するため、tesseract内部のスレッドは1つに制限します。
+    """
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    logging.getLogger().setLevel(logging.WARNING)
+
+def _run_batch_item(file_path: str, output_dir: str, use_cache: bool, content_hash: str, output_name: str) -> Dict[str, Any]:
+    """
+    バッチの1ファイルを処理します（ワーカープロセスで実行）。エラーは結果として返します。
+    """
+    try:
+        return analyze_file(file_path, output_dir, use_cache, content_hash, output_name)
+    except Exception as e:
+        logger.error(f"テスト実行エラー: {file_path}: {str(e)}")
+        return {"file": file_path, "error": str(e)}
+
+def find_target_files(directory: str) -> List[str]:
+    """
+    ディレクトリ以下のPDF・画像ファイルを列挙します（アップロード中の一時ファイルは除く）
+    """
+    targets = []
+    for root, _, files in os.walk(directory):
+        for filename in sorted(files):
+            if filename.startswith("."):
+                continue
+            if os.path.splitext(filename)[1].lower() in SUPPORTED_EXTENSIONS:
+                targets.append(os.path.join(root, filename))
+    return sorted(targets)
+
+def group_by_content(targets: List[str]) -> Dict[str, List[str]]:
+    """
+    ファイルを内容のSHA-256ごとにまとめます（同じ内容のファイルは1回だけ分析するため）
+    
+    :param targets: ファイルパスのリスト
+    :return: SHA-256 -> ファイルパスのリスト（先頭が代表のファイル）
+    """
+    groups: Dict[str, List[str]] = {}
+    for path in targets:
+        groups.setdefault(file_sha256(path), []).append(path)
+    return groups
+
+def _duplicate_result(result: Dict[str, Any], file_path: str) -> Dict[str, Any]:
+    """
+    代表のファイルの分析結果を、同じ内容の別のファイルの結果として複製します（OCR・抽出は実行していないため時間は0）
+    """
+    duplicate = dict(result, file=file_path, duplicate_of=result["file"])
+    if "error" not in duplicate:
+        duplicate.update({"ocr_cached": True, "ocr_ms": 0.0, "extraction_ms": 0.0, "total_ms": 0.0})
+    return duplicate
+
+def build_batch_report(results: List[Dict[str, Any]], elapsed_sec: float) -> Dict[str, Any]:
+    """
+    バッチ結果を集計します
+    
+    :param results: ファイルごとの結果サマリー
+    :param elapsed_sec: バッチ全体の処理時間（秒）
+    :return: 集計レポート
+    """
+    succeeded = [r for r in results if "error" not in r]
+    # 時間の集計は実際に分析したファイルだけで行う
+    total_ms = [r["total_ms"] for r in succeeded if not r.get("duplicate_of")]
+    
+    return {
+        "files": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "ocr_cache_hits": sum(1 for r in succeeded if r["ocr_cached"] and not r.get("duplicate_of")),
+        "duplicates": sum(1 for r in results if r.get("duplicate_of")),
+        "format_distribution": dict(Counter(r["format"] for r in succeeded)),
+        "best_extractor_distribution": dict(Counter(r["best_extractor"] or "none" for r in succeeded)),
+        "timing": {
+            "elapsed_sec": round(elapsed_sec, 1),
+            "ocr_ms_total": round(sum(r["ocr_ms"] for r in succeeded), 1),
+            "extraction_ms_total": round(sum(r["extraction_ms"] for r in succeeded), 1),
+            "file_ms_p50": round(percentile(total_ms, 50), 1),
+            "file_ms_p95": round(percentile(total_ms, 95), 1),
+            "file_ms_max": round(max(total_ms), 1) if total_ms else 0.0
+        },
+        "results": results
+    }
+
+def write_batch_report(report: Dict[str, Any], output_dir: str):
+    """
+    集計レポートをJSONとCSV（ファイルごとの1行）で保存します
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    
+    with open(os.path.join(output_dir, "batch_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    
+    with open(os.path.join(output_dir, "batch_report.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=BATCH_CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for result in report["results"]:
+            writer.writerow(result)
+    
+    logger.info(f"バッチレポートを保存しました: {output_dir}")
+
+def run_batch(directory: str, output_dir: str, workers: int = None, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    ディレクトリ以下のファイルをプロセスプールで並列に分析し、集計レポートを作成します
+    
+    :param directory: 対象ディレクトリ（例: uploads/）
+    :param output_dir: 結果出力ディレクトリ
+    :param workers: ワーカープロセス数（省略時はCPUコア数）
+    :param use_cache: 保存済みのOCRテキストを再利用するか
+    :return: 集計レポート
+    """
+    targets = find_target_files(directory)
+    start = time.perf_counter()
+    # 同じ内容のファイルを同時にOCRしないよう、内容ごとに代表の1ファイルだけを分析する
+    groups = group_by_content(targets)
+    logger.info(f"バッチテスト開始: {directory}, 対象ファイル数: {len(targets)}, 内容の異なるファイル数: {len(groups)}")
+    
+    results = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_batch_worker) as executor:
+        futures = {
+            executor.submit(
+                _run_batch_item, paths[0], output_dir, use_cache, content_hash, os.path.relpath(paths[0], directory)
+            ): paths
+            for content_hash, paths in groups.items()
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            results.extend(_duplicate_result(result, path) for path in futures[future][1:])
+            status = "エラー" if "error" in result else f"{result['format']} / {result['best_extractor'] or '-'}"
+            logger.info(f"[{i}/{len(groups)}] {result['file']}: {status}（同じ内容のファイル {len(futures[future])} 件）")
+    
+    results.sort(key=lambda r: r["file"])
+    report = build_batch_report(results, time.perf_counter() - start)
+    write_batch_report(report, output_dir)
+    
+    logger.info(
+        f"バッチテスト完了: {report['succeeded']}/{report['files']} 件成功, "
+        f"OCRキャッシュ利用 {report['ocr_cache_hits']} 件, 重複ファイル {report['duplicates']} 件, "
+        f"{report['timing']['elapsed_sec']} 秒"
+    )
+    logger.info(f"フォーマット分布: {report['format_distribution']}")
+    logger.info(f"最適な抽出機能: {report['best_extractor_distribution']}")
+    return report
+
 def main():
     parser = argparse.ArgumentParser(description="OCRフォーマット分析テスト")
-    parser.add_argument("file", help="分析対象のPDFまたは画像ファイル")
+    parser.add_argument("file", help="分析対象のPDFまたは画像ファイル（ディレクトリを指定するとバッチモードで実行）")
     parser.add_argument("--output", "-o", help="結果出力ディレクトリ", default="./test_results")
+    parser.add_argument("--workers", "-w", type=int, help="バッチモードのワーカープロセス数（省略時はCPUコア数）")
+    parser.add_argument("--no-cache", action="store_true", help="保存済みのOCRテキストを使わず、必ずOCRを実行する")
     
     args = parser.parse_args()
     
-    run_test(args.file, args.output)
+    if os.path.isdir(args.file):
+        run_batch(args.file, args.output, args.workers, not args.no_cache)
+    else:
+        run_test(args.file, args.output, not args.no_cache)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,214 @@
+# upload_service.py - アップロードファイルの保存処理
+import os
+import uuid
+import hashlib
+import logging
+import zipfile
+from typing import Dict, List, Tuple
+
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+import config
+
+# ロギング設定
+logger = logging.getLogger(__name__)
+
+# OCRで処理できるファイル形式
+SUPPORTED_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg')
+
+# 拡張子ごとのファイル先頭のシグネチャ（マジックバイト）
+FILE_SIGNATURES = {
+    '.pdf': (b'%PDF-',),
+    '.png': (b'\x89PNG\r\n\x1a\n',),
+    '.jpg': (b'\xff\xd8\xff',),
+    '.jpeg': (b'\xff\xd8\xff',),
+    '.zip': (b'PK\x03\x04', b'PK\x05\x06'),
+}
+# シグネチャの判定に必要な先頭のバイト数
+SIGNATURE_LENGTH = max(len(signature) for signatures in FILE_SIGNATURES.values() for signature in signatures)
+
+class UploadRejectedError(Exception):
+    """アップロードファイルの内容やサイズが受け付けられない場合に送出される例外"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+def _check_signature(head: bytes, file_ext: str):
+    """
+    ファイル先頭のバイト列が拡張子の形式と一致するか確認します
+
+    :raises UploadRejectedError: 一致しない場合
+    """
+    if not head.startswith(FILE_SIGNATURES[file_ext]):
+        raise UploadRejectedError(f"ファイルの内容が拡張子（{file_ext}）の形式と一致しません")
+
+class _UploadSink:
+    """
+    チャンクを受け取りながら、シグネチャの確認・サイズ上限の確認・SHA-256の計算をまとめて行います
+    """
+
+    def __init__(self, file_ext: str, max_size: int):
+        self.file_ext = file_ext
+        self.max_size = max_size
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self._head = b""
+
+    def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise UploadRejectedError(f"ファイルサイズが上限（{self.max_size}バイト）を超えています", status_code=413)
+        if len(self._head) < SIGNATURE_LENGTH:
+            self._head += chunk[:SIGNATURE_LENGTH - len(self._head)]
+            if len(self._head) >= SIGNATURE_LENGTH:
+                _check_signature(self._head, self.file_ext)
+        self.sha256.update(chunk)
+
+    def finish(self) -> str:
+        """
+        :return: 内容のSHA-256
+        """
+        # シグネチャより短いファイルはここで確認する
+        if len(self._head) < SIGNATURE_LENGTH:
+            _check_signature(self._head, self.file_ext)
+        return self.sha256.hexdigest()
+
+async def _stream_to_temp_file(file: UploadFile, file_ext: str, max_size: int) -> Tuple[str, str]:
+    """
+    アップロードファイルをチャンク単位で一時ファイルに書き出しながら検証とハッシュ計算を行います。
+    ファイルの書き込みはaiofilesでイベントループを止めずに行います。
+
+    :param max_size: サイズ上限（バイト）
+    :return: (一時ファイルのパス, 内容のSHA-256)
+    """
+    sink = _UploadSink(file_ext, max_size)
+    temp_location = os.path.join(config.UPLOAD_FOLDER, f".{uuid.uuid4()}{file_ext}.part")
+
+    try:
+        async with aiofiles.open(temp_location, "wb") as buffer:
+            while True:
+                chunk = await file.read(config.UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                sink.feed(chunk)
+                await buffer.write(chunk)
+        return temp_location, sink.finish()
+
+    except Exception:
+        if await aiofiles.os.path.exists(temp_location):
+            await aiofiles.os.remove(temp_location)
+        raise
+
+async def save_upload_file(file: UploadFile, file_ext: str) -> Tuple[str, str]:
+    """
+    アップロードファイルをチャンク単位で読み込みながら検証・SHA-256の計算を行って保存します。
+    同じ内容のファイルが既に保存されている場合は、新しいファイルを作らず既存のファイルを使います。
+
+    :param file: アップロードファイル
+    :param file_ext: ファイル拡張子（例: ".pdf"）
+    :return: (保存先のファイルパス, 内容のSHA-256)
+    :raises UploadRejectedError: 内容が拡張子と一致しない場合やサイズ上限を超えた場合
+    """
+    temp_location, content_hash = await _stream_to_temp_file(file, file_ext, config.MAX_UPLOAD_SIZE)
+    try:
+        return await run_in_threadpool(_store_by_hash, temp_location, content_hash, file_ext), content_hash
+    except Exception:
+        if await aiofiles.os.path.exists(temp_location):
+            await aiofiles.os.remove(temp_location)
+        raise
+
+def _store_by_hash(temp_location: str, content_hash: str, file_ext: str) -> str:
+    """
+    一時ファイルを内容のハッシュをファイル名にして配置します（同一ファイルはディスク上に1つだけ保存する）
+
+    :param temp_location: 書き込み済みの一時ファイルのパス
+    :param content_hash: ファイル内容のSHA-256
+    :param file_ext: ファイル拡張子
+    :return: 保存先のファイルパス
+    """
+    file_location = os.path.join(config.UPLOAD_FOLDER, f"{content_hash}{file_ext}")
+    if os.path.exists(file_location):
+        logger.info(f"同一内容のファイルが保存済みです: {file_location}")
+        os.remove(temp_location)
+    else:
+        os.replace(temp_location, file_location)
+    return file_location
+
+async def spool_upload_file(file: UploadFile, file_ext: str) -> str:
+    """
+    アップロードファイルをチャンク単位で検証しながら一時ファイルに書き出します（ZIPアーカイブの展開前の保存用）
+
+    :param file: アップロードファイル
+    :param file_ext: ファイル拡張子
+    :return: 一時ファイルのパス（削除は呼び出し側で行う）
+    :raises UploadRejectedError: 内容が拡張子と一致しない場合やサイズ上限を超えた場合
+    """
+    # アーカイブ自体のサイズは展開後の合計サイズの上限で制限する
+    temp_location, _ = await _stream_to_temp_file(file, file_ext, config.BULK_UPLOAD_MAX_EXTRACTED_BYTES)
+    return temp_location
+
+def save_zip_members(zip_path: str, max_files: int) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """
+    ZIPアーカイブ内のサポート対象ファイルを、ハッシュを計算しながら1つずつ保存します。
+    ブロッキング処理のため、イベントループからはスレッドプールで呼び出してください。
+    内容が拡張子と一致しないファイルやサイズ上限を超えるファイルは対象外のリストに入れます。
+
+    :param zip_path: ZIPアーカイブのパス
+    :param max_files: 保存するファイル数の上限
+    :return: (保存したファイルのリスト [{"filename", "file_path", "content_hash"}],
+              対象外としたファイルのリスト [{"filename", "reason"}])
+    """
+    saved = []
+    rejected = []
+
+    with zipfile.ZipFile(zip_path) as archive:
+        members = []
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            # ディレクトリやmacOSが付加するメタデータ、隠しファイルは黙って読み飛ばす
+            if info.is_dir() or not name or name.startswith(".") or info.filename.startswith("__MACOSX/"):
+                continue
+            file_ext = os.path.splitext(name)[1].lower()
+            if file_ext not in SUPPORTED_EXTENSIONS:
+                rejected.append({"filename": info.filename, "reason": "サポートされていないファイル形式です"})
+                continue
+            members.append((info, file_ext))
+
+        if len(members) > max_files:
+            raise ValueError(f"ZIPアーカイブ内のファイルが多すぎます（上限{max_files}件）")
+        # 展開後のサイズはヘッダーの値で事前に確認する（ZipExtFileはこのサイズを超えて読み出さない）
+        total_size = sum(info.file_size for info, _ in members)
+        if total_size > config.BULK_UPLOAD_MAX_EXTRACTED_BYTES:
+            raise ValueError(f"ZIPアーカイブの展開後のサイズが上限（{config.BULK_UPLOAD_MAX_EXTRACTED_BYTES}バイト）を超えています")
+
+        for info, file_ext in members:
+            sink = _UploadSink(file_ext, config.MAX_UPLOAD_SIZE)
+            temp_location = os.path.join(config.UPLOAD_FOLDER, f".{uuid.uuid4()}{file_ext}.part")
+            try:
+                with archive.open(info) as source, open(temp_location, "wb") as buffer:
+                    while True:
+                        chunk = source.read(config.UPLOAD_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        sink.feed(chunk)
+                        buffer.write(chunk)
+                content_hash = sink.finish()
+                saved.append({
+                    "filename": info.filename,
+                    "file_path": _store_by_hash(temp_location, content_hash, file_ext),
+                    "content_hash": content_hash
+                })
+            except UploadRejectedError as e:
+                # 形式やサイズが不正なファイルはアーカイブ全体を拒否せず、そのファイルだけを対象外にする
+                os.remove(temp_location)
+                rejected.append({"filename": info.filename, "reason": str(e)})
+            except Exception:
+                if os.path.exists(temp_location):
+                    os.remove(temp_location)
+                raise
+
+    return saved, rejected